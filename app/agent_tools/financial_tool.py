@@ -8,6 +8,7 @@ from app.agent_tools.helpers.load_sql_credentials import DATABASE_URL_FINANCIALS
 from app.agent_tools.helpers.custom_table_info import CUSTOM_TABLE_INFO_FINANCIALS
 
 from app.core.llm_state import LLM
+from app.core.metrics import instrument_sql_engine
 
 
 def set_connection():
@@ -18,6 +19,7 @@ def set_connection():
             sample_rows_in_table_info=3,
             include_tables=list(CUSTOM_TABLE_INFO_FINANCIALS.keys())
         )
+        instrument_sql_engine(db_fin._engine, "fin")
         return db_fin
     except Exception as e:
         logging.error(f"Error al conectar a la base de datos financiera: {e}")
@@ -38,3 +40,17 @@ def get_financial_tool():
 
     return db_tools_fin
 
+
+# Marca de agua de los datos: cambia cuando se cargan datos nuevos. La usa la
+# caché de resultados de herramientas (tool_cache.py) para invalidar consultas.
+DATA_WATERMARK_QUERY = "SELECT count(*), max(date_key) FROM fact_transactions"
+_watermark_db = None
+
+
+def get_data_watermark():
+    global _watermark_db
+    if _watermark_db is None:
+        _watermark_db = set_connection()
+    if _watermark_db is None:
+        raise RuntimeError("Sin conexión a la base de datos financiera.")
+    return _watermark_db.run(DATA_WATERMARK_QUERY)
@@ -5,8 +5,8 @@ from langchain.tools import Tool, BaseTool
 # ============== RAG ==============
 """
 Inicialización del contexto hotelero (RAG) siguiendo la misma lógica
-que semantic_search_find: se carga una sola vez, y las funciones
-comprueban que el retriever esté disponible.
+que semantic_search_find: se carga una sola vez (en la primera llamada,
+no al importar), y las funciones comprueban que el retriever esté disponible.
 """
 
 from langchain.tools.retriever import create_retriever_tool
@@ -16,10 +16,11 @@ import logging
 # Estado interno del módulo
 _hotel_context_tool = None
 _retriever_ready = False
+_tool_retriever = None  # retriever con el que se construyó la tool
 
 def _init_hotel_context_tool():
     """Inicializa la herramienta de contexto hotelero si el retriever está disponible."""
-    global _hotel_context_tool, _retriever_ready
+    global _hotel_context_tool, _retriever_ready, _tool_retriever
     try:
         retriever = get_global_retriever()
         if retriever is None:
@@ -33,6 +34,7 @@ def _init_hotel_context_tool():
             ),
         )
         _retriever_ready = True
+        _tool_retriever = retriever
         logging.info("SUCCESS: Tool hotel_context_search inicializada correctamente.")
         return _hotel_context_tool
     except Exception as e:
@@ -42,13 +44,13 @@ def _init_hotel_context_tool():
         return None
 
 def get_hotel_context_tool():
-    """Devuelve la tool hotel_context_search, inicializándola si no existe."""
+    """
+    Devuelve la tool hotel_context_search, inicializándola si no existe
+    o si el retriever global cambió (p. ej. tras /contextrebuild).
+    """
     global _hotel_context_tool, _retriever_ready
     if _hotel_context_tool is None or not _retriever_ready:
         return _init_hotel_context_tool()
+    if get_global_retriever() is not _tool_retriever:
+        return _init_hotel_context_tool()
     return _hotel_context_tool
-
-# Inicialización automática (una sola vez al importar)
-hotel_context_tool = get_hotel_context_tool()
-if hotel_context_tool is None:
-    logging.warning("La herramienta hotel_context_search no está disponible.")
\ No newline at end of file
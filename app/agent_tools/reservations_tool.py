@@ -8,6 +8,7 @@ from app.agent_tools.helpers.load_sql_credentials import DATABASE_URL_RESERVATIO
 from app.agent_tools.helpers.custom_table_info import CUSTOM_TABLE_INFO_RESERVATIONS
 
 from app.core.llm_state import LLM
+from app.core.metrics import instrument_sql_engine
 
 def set_connection():
     try: # Cargar credenciales
@@ -17,6 +18,7 @@ def set_connection():
             sample_rows_in_table_info=3,
             include_tables=list(CUSTOM_TABLE_INFO_RESERVATIONS.keys())
         )
+        instrument_sql_engine(db_res._engine, "res")
         return db_res
     except Exception as e:
         logging.error(f"Error al conectar a la base de datos de reservas: {e}")
@@ -35,4 +37,19 @@ def get_reservations_tool():
     for tool in db_tools_res:
         tool.name = f"res_{tool.name}"
 
-    return db_tools_res
\ No newline at end of file
+    return db_tools_res
+
+
+# Marca de agua de los datos: cambia cuando se cargan datos nuevos. La usa la
+# caché de resultados de herramientas (tool_cache.py) para invalidar consultas.
+DATA_WATERMARK_QUERY = "SELECT (SELECT max(loaded_at) FROM reservations), (SELECT max(loaded_at) FROM daily_rates)"
+_watermark_db = None
+
+
+def get_data_watermark():
+    global _watermark_db
+    if _watermark_db is None:
+        _watermark_db = set_connection()
+    if _watermark_db is None:
+        raise RuntimeError("Sin conexión a la base de datos de reservas.")
+    return _watermark_db.run(DATA_WATERMARK_QUERY)
@@ -1,17 +1,34 @@
 # app/agent_tools/sandbox_tool.py
-from langchain_experimental.utilities import PythonREPL
 from langchain.tools import Tool
 
 
 # ============== PYTHON SANDBOX ==============
-python_repl = PythonREPL()
+# El REPL se crea en el proceso que ejecuta el código: la herramienta declara
+# la política "process" (ver app/streaming/tool_executors.py), así que corre
+# en un proceso hijo y no bloquea el servidor. Todas las ejecuciones de un
+# request van al mismo proceso, que conserva las variables del REPL hasta
+# que el request termina; requests distintos no comparten estado.
+_python_repl = None
+
+
+def run_python_code(code: str) -> str:
+    """Ejecuta código en el PythonREPL del proceso actual (función de módulo, picklable)."""
+    global _python_repl
+    if _python_repl is None:
+        from langchain_experimental.utilities import PythonREPL
+        _python_repl = PythonREPL()
+    return _python_repl.run(code)
+
+
 python_sandbox_tool = Tool(
     name="python_sandbox",
-    func=python_repl.run,
+    func=run_python_code,
     description=(
         "Ejecuta código Python con pandas, matplotlib, numpy. "
-        "Permite análisis estadístico y visualizaciones."
-        "Si creas graficos, guardalos en el disco. La imagen embedida en markdown sera mostrada automaticamente si hay una. No intentes mostrarla tu mismo."
+        "Permite análisis estadístico y visualizaciones. "
+        "Las variables e imports se conservan entre ejecuciones de una misma respuesta, no entre mensajes distintos. "
+        "Si creas graficos, guardalos en el disco. La imagen embedida en markdown sera mostrada automaticamente si hay una. No intentes mostrarla tu mismo. "
         "Nunca uses .plt.show(). Unicamente usa plt.savefig('nombre.png') para guardar la imagen."
     ),
-)
\ No newline at end of file
+    metadata={"execution": "process", "live_data": True},
+)
@@ -4,7 +4,11 @@ import logging
 from pydantic import BaseModel, Field
 from langchain.tools import Tool
 
-from app.semantic.semantic_search_find import semantic_search
+ACCOUNT_SEARCH_DESCRIPTION = (
+    "Busca nombres de cuentas contables similares usando búsqueda semántica FAISS + Cohere. "
+    "Úsala cuando el usuario mencione un término de cuenta financiera y necesites el nombre exacto. "
+    "Devuelve hasta 5 coincidencias relevantes."
+)
 
 
 class AccountSearchInput(BaseModel):
@@ -12,6 +16,7 @@ class AccountSearchInput(BaseModel):
 
 def account_search_tool(input):
     """Permite manejar tanto objetos Pydantic como strings simples"""
+    from app.semantic.semantic_search_find import semantic_search
     try:
         query = getattr(input, "query", input)  # Si es objeto, toma .query; si es string, usa directo
         results = semantic_search(query, k=5)
@@ -25,11 +30,7 @@ def get_semantic_tool():
     account_search = Tool(
         name="account_search",
         func=account_search_tool,
-        description=(
-            "Busca nombres de cuentas contables similares usando búsqueda semántica FAISS + Cohere. "
-            "Úsala cuando el usuario mencione un término de cuenta financiera y necesites el nombre exacto. "
-            "Devuelve hasta 5 coincidencias relevantes."
-        ),
+        description=ACCOUNT_SEARCH_DESCRIPTION,
         args_schema=AccountSearchInput
     )
 
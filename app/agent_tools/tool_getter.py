@@ -1,11 +1,14 @@
 # app/agent_tools/tool_getter.py
 
-from app.agent_tools.rag_tool import get_hotel_context_tool
-from app.agent_tools.websearch_tool import internet_search
+# Las herramientas se registran como LazyTool (ver tool_registry.py): importar
+# este módulo y llamar a get_agent_tools() no carga índices ni crea clientes.
+from app.agent_tools.tool_registry import (
+    lazy_hotel_context_tool,
+    lazy_web_search_tool,
+    lazy_account_search_tool,
+    lazy_sql_tools,
+)
 from app.agent_tools.sandbox_tool import python_sandbox_tool
-from app.agent_tools.financial_tool import get_financial_tool
-from app.agent_tools.reservations_tool import get_reservations_tool
-from app.agent_tools.semanticsearch_tool import get_semantic_tool
 
 import logging
 
@@ -18,7 +21,7 @@ logger = logging.getLogger(__name__)
 def get_agent_tools():
     tools = []
     try:  # hotel context tool
-        hotel_tool = get_hotel_context_tool()
+        hotel_tool = lazy_hotel_context_tool()
         if hotel_tool is not None:
             tools.append(hotel_tool)
             logger.info("hotel_context_search tool añadida a la lista de herramientas.")
@@ -26,7 +29,7 @@ def get_agent_tools():
         logger.error(f"Error al obtener hotel_context_search tool: {e}")
 
     try: # internet search tool
-        web_tool = internet_search
+        web_tool = lazy_web_search_tool()
         if web_tool is not None:
             tools.append(web_tool)
             logger.info("internet_search tool añadida a la lista de herramientas.")
@@ -41,7 +44,7 @@ def get_agent_tools():
         logger.error(f"Error al obtener python_sandbox tool: {e}")
 
     """try: # financial tool
-        financial_tools = get_financial_tool()
+        financial_tools = lazy_sql_tools("fin")
         if financial_tools:
             tools.extend(financial_tools)
             logger.info("financial tools añadidas a la lista de herramientas.")
@@ -49,7 +52,7 @@ def get_agent_tools():
         logger.error(f"Error al obtener financial tools: {e}")
 
     try: # reservations tool
-        reservations_tools = get_reservations_tool()
+        reservations_tools = lazy_sql_tools("res")
         if reservations_tools:
             tools.extend(reservations_tools)
             logger.info("reservations tools añadidas a la lista de herramientas.")
@@ -57,7 +60,7 @@ def get_agent_tools():
         logger.error(f"Error al obtener reservations tools: {e}")
 
     try: # semantic search tool
-        semantic_tool = get_semantic_tool()
+        semantic_tool = lazy_account_search_tool()
         if semantic_tool is not None:
             tools.append(semantic_tool)
             logger.info("semantic_search tool añadida a la lista de herramientas.")
@@ -66,5 +69,5 @@ def get_agent_tools():
 
     tools_map = {tool.name: tool for tool in tools if tool is not None}
     tool_names = ", ".join(tools_map.keys()) if tools_map else "ninguna"
-    
-    return tools
\ No newline at end of file
+
+    return tools
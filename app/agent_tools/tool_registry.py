@@ -0,0 +1,210 @@
+# app/agent_tools/tool_registry.py
+
+"""
+Registro perezoso de herramientas.
+
+Cada herramienta se describe con metadatos baratos (name, description,
+args_schema, política de ejecución, `live_data` si consulta datos vivos,
+política de caché de resultados) suficientes para `bind_tools`. El backend
+pesado (índice FAISS, cliente Tavily, conexión SQL...) se construye en la
+primera llamada o en `warm_up_tools()` desde el lifespan de la app.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, List
+
+from pydantic import BaseModel, Field, PrivateAttr
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+# Vigencia de los resultados memoizados (ver app/streaming/tool_cache.py)
+WEB_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "10800"))
+ACCOUNT_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("ACCOUNT_SEARCH_CACHE_TTL_SECONDS", "86400"))
+
+
+class LazyTool(BaseTool):
+    """Herramienta cuyo backend real se crea al primer uso."""
+
+    factory: Callable[[], Any] = Field(exclude=True)
+    # False → se pide el backend a `factory` en cada llamada (la factory cachea por su cuenta)
+    reuse_backend: bool = True
+
+    _backend: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._backend is not None
+
+    def get_backend(self):
+        if self._backend is not None and self.reuse_backend:
+            return self._backend
+        with self._lock:
+            if self._backend is not None and self.reuse_backend:
+                return self._backend
+            started = time.perf_counter()
+            backend = self.factory()
+            if backend is None:
+                raise RuntimeError(f"La herramienta '{self.name}' no está disponible.")
+            if self._backend is None:
+                logger.info(f"Tool {self.name} inicializada en {(time.perf_counter() - started) * 1000:.0f}ms")
+            self._backend = backend
+            return backend
+
+    @staticmethod
+    def _backend_input(args, kwargs):
+        if kwargs:
+            return kwargs
+        return args[0] if args else ""
+
+    def _run(self, *args, **kwargs):
+        kwargs.pop("run_manager", None)
+        return self.get_backend().invoke(self._backend_input(args, kwargs))
+
+    async def _arun(self, *args, **kwargs):
+        kwargs.pop("run_manager", None)
+        backend = await asyncio.to_thread(self.get_backend)
+        return await backend.ainvoke(self._backend_input(args, kwargs))
+
+
+# ==========================
+# FACTORIES
+# ==========================
+def _hotel_context_backend():
+    from app.agent_tools.rag_tool import get_hotel_context_tool
+    return get_hotel_context_tool()
+
+
+def _web_search_backend():
+    from app.agent_tools.websearch_tool import get_web_search_tool
+    return get_web_search_tool()
+
+
+def _account_search_backend():
+    from app.agent_tools.semanticsearch_tool import get_semantic_tool
+    return get_semantic_tool()
+
+
+_toolkit_cache = {}
+_toolkit_lock = threading.Lock()
+
+
+def _sql_backend(prefix: str, tool_name: str):
+    """Factory de una herramienta del SQLDatabaseToolkit; el toolkit se crea una vez por prefijo."""
+    def factory():
+        with _toolkit_lock:
+            if prefix not in _toolkit_cache:
+                if prefix == "fin":
+                    from app.agent_tools.financial_tool import get_financial_tool
+                    _toolkit_cache[prefix] = {t.name: t for t in get_financial_tool()}
+                else:
+                    from app.agent_tools.reservations_tool import get_reservations_tool
+                    _toolkit_cache[prefix] = {t.name: t for t in get_reservations_tool()}
+        return _toolkit_cache[prefix].get(tool_name)
+    return factory
+
+
+def _fin_watermark():
+    from app.agent_tools.financial_tool import get_data_watermark
+    return get_data_watermark()
+
+
+def _res_watermark():
+    from app.agent_tools.reservations_tool import get_data_watermark
+    return get_data_watermark()
+
+
+_SQL_WATERMARKS = {"fin": _fin_watermark, "res": _res_watermark}
+
+
+# ==========================
+# ESPECIFICACIONES
+# ==========================
+class QueryInput(BaseModel):
+    query: str = Field(description="Consulta de búsqueda")
+
+
+def lazy_sql_tools(prefix: str) -> List[LazyTool]:
+    """Metadatos de las herramientas del SQLDatabaseToolkit sin conectarse a la base."""
+    from langchain_community.tools.sql_database.tool import (
+        QuerySQLDatabaseTool,
+        InfoSQLDatabaseTool,
+        ListSQLDatabaseTool,
+        QuerySQLCheckerTool,
+    )
+
+    tools = []
+    for cls in (QuerySQLDatabaseTool, InfoSQLDatabaseTool, ListSQLDatabaseTool, QuerySQLCheckerTool):
+        fields = cls.model_fields
+        name = f"{prefix}_{fields['name'].default}"
+        tools.append(LazyTool(
+            name=name,
+            description=fields["description"].default,
+            args_schema=fields["args_schema"].default,
+            factory=_sql_backend(prefix, name),
+            metadata={
+                "execution": "thread",
+                "live_data": True,
+                "cache": {"policy": "watermark", "watermark": _SQL_WATERMARKS[prefix]},
+            },
+        ))
+    return tools
+
+
+def lazy_hotel_context_tool() -> LazyTool:
+    return LazyTool(
+        name="hotel_context_search",
+        description="Busca información sobre Itzana Resorts: servicios, amenidades, políticas, contexto del hotel.",
+        args_schema=QueryInput,
+        factory=_hotel_context_backend,
+        reuse_backend=False,  # se reconstruye si cambia el retriever global
+        metadata={"execution": "thread", "cache": {"policy": "index", "casefold": True}},
+    )
+
+
+def lazy_web_search_tool() -> LazyTool:
+    from app.agent_tools.websearch_tool import WEB_SEARCH_NAME, WEB_SEARCH_DESCRIPTION, TavilySearchInput
+    return LazyTool(
+        name=WEB_SEARCH_NAME,
+        description=WEB_SEARCH_DESCRIPTION,
+        args_schema=TavilySearchInput,
+        factory=_web_search_backend,
+        metadata={
+            "execution": "async",
+            "live_data": True,
+            "cache": {"policy": "ttl", "ttl": WEB_SEARCH_CACHE_TTL_SECONDS, "casefold": True},
+        },
+    )
+
+
+def lazy_account_search_tool() -> LazyTool:
+    from app.agent_tools.semanticsearch_tool import AccountSearchInput, ACCOUNT_SEARCH_DESCRIPTION
+    return LazyTool(
+        name="account_search",
+        description=ACCOUNT_SEARCH_DESCRIPTION,
+        args_schema=AccountSearchInput,
+        factory=_account_search_backend,
+        metadata={
+            "execution": "thread",
+            "cache": {"policy": "ttl", "ttl": ACCOUNT_SEARCH_CACHE_TTL_SECONDS, "casefold": True},
+        },
+    )
+
+
+def warm_up_tools(tools: List[BaseTool]):
+    """Construye de antemano los backends de las LazyTool (lifespan). Los errores solo se registran."""
+    for tool in tools:
+        if not isinstance(tool, LazyTool):
+            continue
+        try:
+            tool.get_backend()
+        except Exception as e:
+            logger.warning(f"Warm-up de {tool.name} falló: {e}")
@@ -1,20 +1,28 @@
 # app/agent_tools/websearch_tool.py
 
-from langchain_tavily import TavilySearch
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 load_dotenv()  # Cargar variables de entorno desde el archivo .env
 
 # ============== WEB SEARCH ==============
-internet_search = TavilySearch()
-internet_search.name = "strategic_web_search"
-internet_search.description = (
+WEB_SEARCH_NAME = "strategic_web_search"
+WEB_SEARCH_DESCRIPTION = (
     "Busca información externa, benchmarks, tendencias del sector hotelero, mejores prácticas."
 )
 
+
 class TavilySearchInput(BaseModel):
     query: str = Field(description="Query para investigación estratégica")
 
-# Actualizar el uso de Pydantic para evitar advertencias
-internet_search.args_schema = TavilySearchInput.model_json_schema()
\ No newline at end of file
+
+def get_web_search_tool():
+    """Construye la herramienta de búsqueda (se llama en el primer uso, no al importar)."""
+    from app.core.providers import get_web_search
+
+    internet_search = get_web_search()
+    internet_search.name = WEB_SEARCH_NAME
+    internet_search.description = WEB_SEARCH_DESCRIPTION
+    # Actualizar el uso de Pydantic para evitar advertencias
+    internet_search.args_schema = TavilySearchInput.model_json_schema()
+    return internet_search
@@ -0,0 +1,185 @@
+# app/core/embedding_cache.py
+
+"""
+Caché persistente de embeddings de documentos.
+
+Los mismos textos se embeben una y otra vez: cada /contextrebuild con
+rebuild=True, cada build_index() de cuentas contables y cada arranque de
+SQLExampleSelector. CachedEmbeddings envuelve un cliente de embeddings y
+guarda cada vector en disco, con clave (proveedor:modelo, sha256 del texto):
+
+    - SQLite (EMBEDDING_CACHE_PATH) con el vector como BLOB float32: compacto
+      (4 bytes por dimensión), seguro entre procesos y sin dependencias;
+    - solo se llama al proveedor con los textos que faltan (deduplicados);
+    - desalojo LRU aproximado cuando se superan EMBEDDING_CACHE_MAX_ENTRIES.
+
+Solo cachea embed_documents: los embeddings de consulta (input_type
+search_query en Cohere) son distintos y no se guardan aquí. Los textos que
+faltan se calculan con el pipeline por lotes de app/core/embedding_pipeline.py
+y cada lote se guarda al terminar.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_PATH = Path(os.getenv(
+    "EMBEDDING_CACHE_PATH", str(Path(__file__).parent.parent / "data" / "embedding_cache.sqlite")
+))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Al desalojar se baja hasta esta fracción del máximo (evita desalojar en cada escritura)
+_EVICT_TO = 0.9
+# last_used se actualiza en lecturas como mucho con esta resolución (segundos)
+_TOUCH_RESOLUTION = 3600
+# Máximo de variables por sentencia de SQLite
+_SQL_BATCH = 500
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:16]
+
+
+class EmbeddingStore:
+    """Tabla (modelo, clave) → vector float32 en SQLite."""
+
+    def __init__(self, path: Path = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, key BLOB NOT NULL, dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL, last_used INTEGER NOT NULL,"
+                " PRIMARY KEY (model, key)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        found: Dict[bytes, List[float]] = {}
+        now = int(time.time())
+        with self._lock:
+            conn = self._connect()
+            stale = []
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE model = ? "
+                    f"AND key IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    if now - last_used > _TOUCH_RESOLUTION:
+                        stale.append((now, model, key))
+            if stale:
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?", stale)
+                conn.commit()
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Dict[bytes, List[float]]):
+        if not items:
+            return
+        now = int(time.time())
+        rows = [
+            (model, key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if total <= self.max_entries:
+            return
+        excess = total - int(self.max_entries * _EVICT_TO)
+        conn.execute(
+            "DELETE FROM embeddings WHERE (model, key) IN "
+            "(SELECT model, key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        conn.commit()
+        self.evicted += excess
+        logger.info(f"Caché de embeddings: {excess} entradas desalojadas (máximo {self.max_entries}).")
+
+    def stats(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings de documentos para los indexadores: pasan por el pipeline por
+    lotes (app/core/embedding_pipeline.py) y, si hay `store`, por la caché
+    persistente, que hace también de checkpoint. embed_query pasa directo.
+    """
+
+    def __init__(self, inner: Embeddings, model: str, store: Optional[EmbeddingStore]):
+        self.inner = inner
+        self.model = model  # espacio de claves: "proveedor:modelo"
+        self.store = store
+        self.last_report: Optional[Dict[str, float]] = None
+        # progress(hechos, total) durante embed_documents (p. ej. jobs de reindexación)
+        self.progress: Optional[Callable[[int, int], None]] = None
+
+    def _lookup(self, texts: List[str]) -> Dict[str, List[float]]:
+        keys = {text_key(t): t for t in texts}
+        return {keys[key]: vector for key, vector in self.store.get_many(self.model, list(keys)).items()}
+
+    def _save(self, vectors: Dict[str, List[float]]):
+        self.store.put_many(self.model, {text_key(t): v for t, v in vectors.items()})
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        from app.core.embedding_pipeline import EmbeddingPipeline
+
+        pipeline = EmbeddingPipeline(self.inner, name=f"Embeddings {self.model}")
+        vectors, self.last_report = pipeline.run(
+            texts,
+            lookup=self._lookup if self.store is not None else None,
+            save=self._save if self.store is not None else None,
+            progress=self.progress,
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.inner.aembed_query(text)
+
+
+EMBEDDING_STORE = EmbeddingStore()
+REGISTRY.register_collector("kaana_embedding_cache", EMBEDDING_STORE.stats)
@@ -0,0 +1,230 @@
+# app/core/embedding_pipeline.py
+
+"""
+Pipeline de embeddings para corpus grandes.
+
+Reemplaza la llamada única y síncrona a embed_documents() con:
+    - lotes de EMBED_BATCH_SIZE textos (Cohere acepta hasta 96 por request);
+    - como mucho EMBED_MAX_CONCURRENCY lotes en vuelo (hilos);
+    - reintentos por lote con backoff exponencial y jitter ante errores
+      transitorios (429, 5xx, red); un 4xx distinto de 408/429 falla enseguida;
+    - un token bucket compartido por proceso (EMBED_REQUESTS_PER_MINUTE) para
+      no pasar el rate limit del proveedor;
+    - checkpoint: cada lote terminado se guarda al momento (en la caché
+      persistente de app/core/embedding_cache.py), así una reconstrucción
+      fallida retoma desde el último lote guardado en vez de empezar de cero.
+
+Al terminar informa el throughput en chunks por segundo.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import EMBEDDING_BATCH_SECONDS, EMBEDDING_BATCHES
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_RETRY_BASE_SECONDS = float(os.getenv("EMBED_RETRY_BASE_SECONDS", "1"))
+EMBED_RETRY_MAX_SECONDS = float(os.getenv("EMBED_RETRY_MAX_SECONDS", "30"))
+# 0 = sin límite
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "0"))
+
+# Cada cuántos lotes se registra el progreso en el log
+_PROGRESS_EVERY = 20
+
+
+class EmbeddingPipelineError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """Token bucket bloqueante y seguro entre hilos: `rate` fichas por segundo, ráfaga de `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0) -> float:
+        """Espera hasta tener `cost` fichas; devuelve los segundos esperados."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return waited
+                delay = (cost - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Vacía el bucket (tras un 429: el proveedor dice que vamos demasiado rápido)."""
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+_BUCKET = TokenBucket(EMBED_REQUESTS_PER_MINUTE / 60, EMBED_MAX_CONCURRENCY)
+
+
+def _status_code(err: Exception) -> Optional[int]:
+    status = getattr(err, "status_code", None)
+    if status is None:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(err: Exception) -> bool:
+    """429, 408 y 5xx se reintentan; otros 4xx no. Sin código (red, timeout) → sí."""
+    status = _status_code(err)
+    if status is None:
+        return True
+    return status in (408, 429) or status >= 500
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = EMBED_MAX_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        bucket: Optional[TokenBucket] = None,
+        name: str = "embeddings"
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.bucket = bucket or _BUCKET
+        self.name = name
+        self.retries = 0
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                EMBEDDING_BATCHES.inc(status="ok")
+                EMBEDDING_BATCH_SECONDS.observe(time.perf_counter() - started)
+                return vectors
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    EMBEDDING_BATCHES.inc(status="failed")
+                    raise
+                if _status_code(e) == 429:
+                    self.bucket.drain()
+                attempt += 1
+                self.retries += 1
+                EMBEDDING_BATCHES.inc(status="retry")
+                delay = random.uniform(0, min(EMBED_RETRY_MAX_SECONDS, EMBED_RETRY_BASE_SECONDS * 2 ** attempt))
+                logger.warning(
+                    f"{self.name}: lote de {len(texts)} falló ({e}); reintento {attempt}/{self.max_retries} "
+                    f"en {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def run(
+        self,
+        texts: List[str],
+        lookup: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None,
+        save: Optional[Callable[[Dict[str, List[float]]], None]] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[List[List[float]], Dict[str, float]]:
+        """
+        Embebe `texts` y devuelve (vectores en el mismo orden, reporte).
+
+        `lookup(textos)` devuelve los vectores ya guardados (checkpoint/caché);
+        `save(vectores)` se llama con cada lote terminado;
+        `progress(hechos, total)` cuenta textos únicos.
+        """
+        started = time.perf_counter()
+        unique = list(dict.fromkeys(texts))
+        done: Dict[str, List[float]] = lookup(unique) if lookup else {}
+        missing = [t for t in unique if t not in done]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        if progress:
+            progress(len(done), len(unique))
+
+        completed = 0
+        error: Optional[Exception] = None
+        if batches:
+            executor = ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches)),
+                                          thread_name_prefix="embed")
+            pending: Dict[Future, List[str]] = {}
+            queue = iter(batches)
+            try:
+                # Como mucho max_concurrency lotes en vuelo; el siguiente sale cuando termina uno
+                for batch in queue:
+                    pending[executor.submit(self._embed_batch, batch)] = batch
+                    if len(pending) >= self.max_concurrency:
+                        break
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        batch = pending.pop(future)
+                        try:
+                            vectors = future.result()
+                        except Exception as e:
+                            # no se lanzan lotes nuevos; los que están en vuelo se guardan igual
+                            error = error or e
+                            continue
+                        result = dict(zip(batch, vectors))
+                        if save:
+                            save(result)
+                        done.update(result)
+                        completed += 1
+                        if progress:
+                            progress(len(done), len(unique))
+                        if completed % _PROGRESS_EVERY == 0:
+                            logger.info(f"{self.name}: {completed}/{len(batches)} lotes")
+                        next_batch = None if error else next(queue, None)
+                        if next_batch is not None:
+                            pending[executor.submit(self._embed_batch, next_batch)] = next_batch
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        if error is not None:
+            raise EmbeddingPipelineError(
+                f"{self.name}: falló un lote ({error}); {completed}/{len(batches)} lotes guardados, "
+                f"al reintentar se retoma desde ahí"
+            ) from error
+
+        elapsed = time.perf_counter() - started
+        report = {
+            "texts": len(texts),
+            "cached": len(unique) - len(missing),
+            "computed": len(missing),
+            "batches": len(batches),
+            "retries": self.retries,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info(
+            f"{self.name}: {report['texts']} textos ({report['cached']} guardados, {report['computed']} "
+            f"calculados en {report['batches']} lotes, {report['retries']} reintentos) en "
+            f"{elapsed:.2f}s → {report['chunks_per_second']} chunks/s"
+        )
+        return [done[t] for t in texts], report
@@ -0,0 +1,248 @@
+# app/core/embedding_service.py
+
+"""
+Servicio de embeddings compartido por el proceso.
+
+get_embeddings() (app/core/providers.py) devuelve siempre el mismo
+EmbeddingService por modelo, en lugar de un cliente nuevo en cada módulo
+(rag_store, rag_indexer, semantic_search_*, few_shot_selector, answer_cache).
+Los embeddings de documentos pasan directo al proveedor; los de consulta
+(embed_query, lo que piden hotel_context_search y account_search en cada
+llamada) pasan por:
+
+    - una caché LRU en memoria de QUERY_EMBEDDING_CACHE_SIZE vectores con
+      clave la consulta normalizada (NFKC, espacios colapsados, casefold):
+      "¿Horario del Spa? " y "¿horario del spa?" son el mismo vector;
+    - un micro-batcher: las consultas que llegan a la vez desde distintos
+      streams de /ask se juntan durante QUERY_EMBEDDING_BATCH_WAIT_MS y van
+      en una sola llamada al proveedor (hasta QUERY_EMBEDDING_MAX_BATCH
+      textos, QUERY_EMBEDDING_MAX_INFLIGHT llamadas en vuelo). Si no hay
+      ninguna otra consulta esperando ni llamadas en vuelo, la consulta sale
+      sin esperar la ventana. Una consulta igual a otra que ya está en vuelo
+      espera ese mismo resultado.
+
+La forma normalizada solo es la clave de la caché y de la deduplicación: al
+proveedor se envía el texto original de la primera consulta que llegó.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))  # 0 = sin caché
+QUERY_EMBEDDING_BATCH_WAIT_MS = float(os.getenv("QUERY_EMBEDDING_BATCH_WAIT_MS", "5"))  # 0 = sin espera
+QUERY_EMBEDDING_MAX_BATCH = int(os.getenv("QUERY_EMBEDDING_MAX_BATCH", "96"))
+QUERY_EMBEDDING_MAX_INFLIGHT = int(os.getenv("QUERY_EMBEDDING_MAX_INFLIGHT", "4"))
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+class QueryBatcher:
+    """
+    Junta textos pedidos desde varios hilos en llamadas por lotes a `embed_batch`.
+    Los pedidos con la misma clave comparten resultado; `on_result(clave, vector)`
+    corre antes de resolverlos (p. ej. para guardarlo en una caché).
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]], name: str = "embeddings",
+                 wait_ms: float = QUERY_EMBEDDING_BATCH_WAIT_MS, max_batch: int = QUERY_EMBEDDING_MAX_BATCH,
+                 max_inflight: int = QUERY_EMBEDDING_MAX_INFLIGHT,
+                 on_result: Optional[Callable[[str, List[float]], None]] = None):
+        self.embed_batch = embed_batch
+        self.on_result = on_result
+        self.name = name
+        self.wait_seconds = wait_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.max_inflight = max(1, max_inflight)
+        self._futures: Dict[str, Future] = {}  # clave → resultado, hasta que se resuelve
+        self._texts: Dict[str, str] = {}  # clave → texto que se envía (el del primer pedido)
+        self._queue: List[str] = []  # claves aún no enviadas
+        self._inflight = 0  # llamadas al proveedor en curso
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(self.max_inflight)
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, key: str, text: Optional[str] = None) -> Future:
+        """Vector de `text` (por defecto `key`); pedidos con la misma `key` comparten la llamada."""
+        with self._cond:
+            future = self._futures.get(key)
+            if future is None:
+                future = Future()
+                self._futures[key] = future
+                self._texts[key] = key if text is None else text
+                self._queue.append(key)
+                self._start()
+                self._cond.notify()
+            return future
+
+    def _start(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(self.max_inflight, thread_name_prefix=f"{self.name}-batch")
+            self._thread = threading.Thread(target=self._loop, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                # Una consulta sola sin llamadas en vuelo no tiene con quién juntarse
+                alone = len(self._queue) == 1 and not self._inflight
+            # Ventana para que se sumen las consultas de otros streams
+            if self.wait_seconds and not alone:
+                time.sleep(self.wait_seconds)
+            # Con todas las llamadas en vuelo, la cola sigue creciendo mientras tanto
+            self._slots.acquire()
+            with self._cond:
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                texts = [self._texts.pop(key) for key in batch]
+                self._inflight += 1
+            self._executor.submit(self._call, batch, texts)
+
+    def _call(self, batch: List[str], texts: List[str]):
+        vectors, error = None, None
+        try:
+            vectors = self.embed_batch(texts)
+            if self.on_result is not None:
+                for key, vector in zip(batch, vectors):
+                    self.on_result(key, vector)
+        except Exception as e:
+            error = e
+        finally:
+            self._slots.release()
+        with self._cond:
+            self._inflight -= 1
+            futures = [self._futures.pop(key) for key in batch]
+        for position, future in enumerate(futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[position])
+
+
+class EmbeddingService(Embeddings):
+    """Cliente de embeddings compartido: documentos directo, consultas con LRU + micro-batching."""
+
+    def __init__(self, inner: Embeddings, model: str, cache_size: int = QUERY_EMBEDDING_CACHE_SIZE, **batching):
+        self.inner = inner
+        self.model = model  # "proveedor:modelo"
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._batcher = QueryBatcher(self._embed_queries, name=model.split(":")[-1],
+                                     on_result=self._remember, **batching)
+        self.hits = 0
+        self.misses = 0
+        self.provider_calls = 0
+        self.provider_texts = 0
+
+    # ---------- documentos ----------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    # ---------- consultas ----------
+    def _cached(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return vector
+
+    def _remember(self, key: str, vector: List[float]):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Una llamada al proveedor con input_type de consulta para todo el lote."""
+        self.provider_calls += 1
+        self.provider_texts += len(texts)
+        if hasattr(self.inner, "embed_queries"):  # proveedores falsos
+            vectors = self.inner.embed_queries(texts)
+        elif hasattr(self.inner, "embed"):  # CohereEmbeddings
+            vectors = self.inner.embed(texts, input_type="search_query")
+        else:
+            vectors = [self.inner.embed_query(text) for text in texts]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._cached(key)
+        if vector is not None:
+            return vector
+        return self._batcher.submit(key, text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._cached(key)
+        if vector is not None:
+            return vector
+        return await asyncio.wrap_future(self._batcher.submit(key, text))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "provider_calls": self.provider_calls,
+            "provider_texts": self.provider_texts,
+            "cached": len(self._cache),
+        }
+
+
+# ==========================
+# INSTANCIAS COMPARTIDAS
+# ==========================
+_SERVICES: Dict[Tuple[str, str], EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def shared_embeddings(provider: str, model: str,
+                      create: Callable[[str], Tuple[Embeddings, str]]) -> EmbeddingService:
+    """El EmbeddingService de (proveedor, modelo); `create(model)` → (cliente, espacio de claves)."""
+    with _services_lock:
+        service = _SERVICES.get((provider, model))
+        if service is None:
+            client, namespace = create(model)
+            service = EmbeddingService(client, namespace)
+            _SERVICES[(provider, model)] = service
+        return service
+
+
+def stats() -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for service in list(_SERVICES.values()):
+        for name, value in service.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    totals["services"] = len(_SERVICES)
+    return totals
+
+
+REGISTRY.register_collector("kaana_query_embeddings", stats)
@@ -0,0 +1,289 @@
+# app/core/fake_providers.py
+
+"""
+Proveedores locales deterministas (sin red ni claves).
+
+Sustituyen a OpenAI, Cohere y Tavily cuando se eligen en
+app/core/providers.py (FAKE_PROVIDERS=1 o LLM_PROVIDER=fake, ...). Cada uno
+tiene una latencia inyectada configurable, así se puede medir el costo
+propio de la app por separado de la latencia del proveedor:
+
+    - FakeChatModel : emite la respuesta token a token a
+      FAKE_LLM_TOKENS_PER_SECOND, con FAKE_LLM_LATENCY_MS antes del primer
+      token. Un guion (FAKE_LLM_SCRIPT, JSON) decide qué preguntas disparan
+      tool calls y con qué argumentos.
+    - FakeEmbeddings: embeddings por hashing de palabras y trigramas;
+      textos parecidos dan vectores parecidos y el mismo texto siempre da el
+      mismo vector (entre procesos).
+    - FakeWebSearch : resultados enlatados con el formato de Tavily.
+
+Formato del guion (lista de reglas, gana la primera cuyo `match` coincide
+con la última pregunta del usuario):
+
+    [{"match": "reserva|ocupación",
+      "tool_calls": [{"name": "res_sql_db_query", "args": {"query": "SELECT 1"}}],
+      "response": "texto de la respuesta final"}]
+
+En los args, "{question}" se reemplaza por la pregunta.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_LLM_SCRIPT = os.getenv("FAKE_LLM_SCRIPT", "")
+FAKE_EMBEDDINGS_DIM = int(os.getenv("FAKE_EMBEDDINGS_DIM", "384"))
+FAKE_EMBEDDINGS_LATENCY_MS = float(os.getenv("FAKE_EMBEDDINGS_LATENCY_MS", "0"))
+FAKE_SEARCH_LATENCY_MS = float(os.getenv("FAKE_SEARCH_LATENCY_MS", "0"))
+FAKE_SEARCH_RESULTS = os.getenv("FAKE_SEARCH_RESULTS", "")
+
+DEFAULT_RESPONSE = "Respuesta de prueba generada localmente por el modelo falso."
+
+# Guion por defecto: las preguntas sobre el entorno del hotel pasan por la
+# búsqueda web (que con SEARCH_PROVIDER=fake tampoco sale a la red).
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {
+        "match": r"cerca|tendencia|benchmark|competencia|aeropuerto",
+        "tool_calls": [{"name": "strategic_web_search", "args": {"query": "{question}"}}],
+        "response": "Según la búsqueda, hay varias opciones cerca del hotel. " + DEFAULT_RESPONSE,
+    },
+]
+
+DEFAULT_SEARCH_RESULTS: List[Dict[str, Any]] = [
+    {
+        "title": "Guía de viaje: {query}",
+        "url": "https://example.com/guia",
+        "content": "Resultado de prueba sobre {query}. Información general para huéspedes.",
+        "score": 0.92,
+    },
+    {
+        "title": "Tendencias del sector hotelero",
+        "url": "https://example.com/tendencias",
+        "content": "Ocupación, tarifas promedio y preferencias de los viajeros en la región.",
+        "score": 0.81,
+    },
+    {
+        "title": "Opiniones de viajeros",
+        "url": "https://example.com/opiniones",
+        "content": "Comentarios de huéspedes sobre restaurantes, traslados y actividades cercanas.",
+        "score": 0.74,
+    },
+]
+
+
+def _load_json(path: str, default: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not path:
+        return default
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ==========================
+# CHAT MODEL
+# ==========================
+class FakeChatModel(BaseChatModel):
+    """Chat model con streaming a ritmo fijo y tool calls según un guion."""
+
+    response: str = DEFAULT_RESPONSE
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    script: List[Dict[str, Any]] = DEFAULT_SCRIPT
+    # Herramientas enlazadas con bind_tools (None = sin filtrar)
+    tool_names: Optional[List[str]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: list, **kwargs: Any):
+        names = [t.name if hasattr(t, "name") else t.get("name") for t in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    # ---------- guion ----------
+    def _rule(self, question: str) -> Optional[Dict[str, Any]]:
+        for rule in self.script:
+            if re.search(rule.get("match", ""), question, re.IGNORECASE):
+                return rule
+        return None
+
+    def _plan(self, messages: List[BaseMessage]) -> List[AIMessageChunk]:
+        """Chunks de la respuesta: tool calls si es el primer turno de la pregunta, si no texto."""
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        question = str(messages[last_human].content) if last_human >= 0 else ""
+        answered_tools = any(isinstance(m, ToolMessage) for m in messages[last_human + 1:])
+        rule = self._rule(question)
+
+        chunks = []
+        calls = [] if rule is None or answered_tools else [
+            c for c in rule.get("tool_calls", [])
+            if self.tool_names is None or c["name"] in self.tool_names
+        ]
+        if calls:
+            for index, call in enumerate(calls):
+                args = json.dumps({
+                    k: v.replace("{question}", question) if isinstance(v, str) else v
+                    for k, v in call.get("args", {}).items()
+                }, ensure_ascii=False)
+                call_id = "call_" + hashlib.sha1(f"{question}|{index}".encode()).hexdigest()[:12]
+                chunks.append(AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[{"name": call["name"], "args": args, "id": call_id, "index": index}],
+                ))
+        else:
+            text = (rule or {}).get("response", self.response)
+            words = text.split(" ")
+            chunks = [AIMessageChunk(content=w + " ") for w in words[:-1]] + [AIMessageChunk(content=words[-1])]
+
+        prompt_tokens = sum(_estimate_tokens(str(m.content)) for m in messages)
+        chunks.append(AIMessageChunk(content="", usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(chunks),
+            "total_tokens": prompt_tokens + len(chunks),
+        }))
+        return chunks
+
+    def _delays(self, count: int) -> Iterator[float]:
+        """Espera antes de cada chunk; el último (usage) sale sin espera."""
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i in range(count - 1):
+            yield (self.latency_ms / 1000 if i == 0 else 0.0) + per_token
+        yield 0.0
+
+    # ---------- interfaz de BaseChatModel ----------
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        response = None
+        for chunk in self._stream(messages, stop, run_manager, **kwargs):
+            response = chunk.message if response is None else response + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        chunks = self._plan(messages)
+        for chunk, delay in zip(chunks, self._delays(len(chunks))):
+            if delay:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        chunks = self._plan(messages)
+        for chunk, delay in zip(chunks, self._delays(len(chunks))):
+            if delay:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=chunk)
+
+
+# ==========================
+# EMBEDDINGS
+# ==========================
+_WORD_RE = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings deterministas por hashing (palabras + trigramas de caracteres)."""
+
+    def __init__(self, dim: int = FAKE_EMBEDDINGS_DIM, latency_ms: float = FAKE_EMBEDDINGS_LATENCY_MS):
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def _features(self, text: str) -> Iterator[tuple]:
+        for word in _WORD_RE.findall(_normalize(text)):
+            yield word, 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                yield "#" + padded[i:i + 3], 0.5
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dim] += sign * weight
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Varias consultas en una llamada (una sola latencia, como un lote de Cohere)."""
+        return self.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+# ==========================
+# BÚSQUEDA WEB
+# ==========================
+class FakeWebSearch(BaseTool):
+    """Búsqueda web con resultados enlatados (formato de respuesta de Tavily)."""
+
+    name: str = "fake_web_search"
+    description: str = "Búsqueda web local de prueba."
+    latency_ms: float = FAKE_SEARCH_LATENCY_MS
+    results: List[Dict[str, Any]] = []
+
+    def _response(self, query: str) -> Dict[str, Any]:
+        canned = self.results or _load_json(FAKE_SEARCH_RESULTS, DEFAULT_SEARCH_RESULTS)
+        return {
+            "query": query,
+            "results": [
+                {k: v.replace("{query}", query) if isinstance(v, str) else v for k, v in r.items()}
+                for r in canned
+            ],
+            "response_time": self.latency_ms / 1000,
+        }
+
+    def _run(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._response(query)
+
+    async def _arun(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._response(query)
+
+
+def load_fake_script() -> List[Dict[str, Any]]:
+    """Guion del FakeChatModel: FAKE_LLM_SCRIPT si está definido, si no el guion por defecto."""
+    return _load_json(FAKE_LLM_SCRIPT, DEFAULT_SCRIPT)
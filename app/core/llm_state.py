@@ -1,14 +1,8 @@
 # app/core/llm_state.py
 
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
-load_dotenv()
+from app.core.providers import get_chat_model
 
-LLM = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.5,
-    streaming=True,
-    max_retries=3
-)
+# OpenAI o el modelo local falso según LLM_PROVIDER (ver app/core/providers.py)
+LLM = get_chat_model()
 
 TOOLS = None
@@ -0,0 +1,311 @@
+# app/core/metrics.py
+
+"""
+Métricas en proceso (contadores e histogramas) expuestas en GET /metrics.
+
+Sin dependencias externas: el formato de texto es compatible con Prometheus
+y `snapshot()` devuelve lo mismo como JSON. Los valores son por proceso
+(con varios workers de uvicorn cada uno expone los suyos).
+
+Fuentes:
+    - streaming.py / request_metrics.py: TTFT, duración del request, tiempo
+      de LLM y de herramientas por iteración, tokens.
+    - tool_execution.py: duración y estado de cada herramienta.
+    - RetrieverMetricsHandler: callback de LangChain registrado como hook
+      global, mide cada llamada a un retriever (hotel_context_search).
+    - instrument_sql_engine(): eventos de SQLAlchemy, mide cada sentencia SQL
+      (y abre su span, ver tracing.py).
+    - admission.py: resultado de la admisión a /ask y tiempo en cola.
+    - Colectores: estado de la caché de respuestas y de herramientas, runs
+      activos y profundidad de la cola de admisión.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """Escapa \\, " y saltos de línea como pide el formato de texto de Prometheus."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+# ==========================
+# PRIMITIVAS
+# ==========================
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[_LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in items]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # por etiqueta: [conteos por bucket (+Inf al final), suma, total]
+        self._series: Dict[_LabelKey, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        result = []
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()]
+        for key, (counts, total, count) in items:
+            result.append({
+                "labels": dict(key),
+                "count": count,
+                "sum": round(total, 6),
+                "avg": round(total / count, 6) if count else 0.0,
+                "p50": self._quantile(counts, count, 0.50),
+                "p95": self._quantile(counts, count, 0.95),
+                "p99": self._quantile(counts, count, 0.99),
+            })
+        return result
+
+    def _quantile(self, counts: List[int], count: int, q: float) -> Optional[float]:
+        """Cuantil aproximado: límite superior del bucket que lo contiene."""
+        if not count:
+            return None
+        target = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        # colectores: funciones que devuelven {nombre: valor} para gauges calculados al leer
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, float]]]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(name, documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, float]]):
+        self._collectors.append((prefix, collect))
+
+    def _collected(self) -> Dict[str, float]:
+        values = {}
+        for prefix, collect in self._collectors:
+            try:
+                for name, value in collect().items():
+                    if isinstance(value, (int, float)):
+                        values[f"{prefix}_{name}"] = float(value)
+            except Exception:
+                continue
+        return values
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for name, value in self._collected().items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {metric.name: metric.snapshot() for metric in self._metrics}
+        data.update(self._collected())
+        return data
+
+
+REGISTRY = Registry()
+
+# ==========================
+# CATÁLOGO
+# ==========================
+REQUESTS = REGISTRY.counter(
+    "kaana_requests_total", "Requests /ask por resultado (completed, failed, cancelled, cache_hit).")
+REQUEST_SECONDS = REGISTRY.histogram(
+    "kaana_request_seconds", "Duración total del stream de /ask.")
+TTFT_SECONDS = REGISTRY.histogram(
+    "kaana_ttft_seconds", "Tiempo hasta el primer evento answer.")
+ITERATIONS = REGISTRY.histogram(
+    "kaana_iterations_per_request", "Iteraciones ReAct por request.", COUNT_BUCKETS)
+LLM_SECONDS = REGISTRY.histogram(
+    "kaana_llm_call_seconds", "Duración de cada llamada en streaming al LLM (phase=iteration|final).")
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "kaana_llm_first_chunk_seconds", "Tiempo hasta el primer chunk de cada llamada al LLM.")
+TOOL_PHASE_SECONDS = REGISTRY.histogram(
+    "kaana_iteration_tool_seconds", "Tiempo de pared de las herramientas de una iteración.")
+TOOL_SECONDS = REGISTRY.histogram(
+    "kaana_tool_seconds", "Duración de cada herramienta (tool, execution).")
+TOOL_CALLS = REGISTRY.counter(
+    "kaana_tool_calls_total", "Llamadas a herramientas por estado (completed, error, timeout).")
+PROMPT_TOKENS = REGISTRY.histogram(
+    "kaana_prompt_tokens", "Tokens de entrada por llamada al LLM.", TOKEN_BUCKETS)
+TOKENS = REGISTRY.counter(
+    "kaana_tokens_total", "Tokens consumidos (kind=prompt|completion).")
+RETRIEVER_SECONDS = REGISTRY.histogram(
+    "kaana_retriever_seconds", "Duración de cada consulta a un retriever.")
+RETRIEVALS = REGISTRY.counter(
+    "kaana_retrievals_total", "Búsquedas en el contexto del hotel por modo (vector, lexical, hybrid, fast_path).")
+ADMISSIONS = REGISTRY.counter(
+    "kaana_admissions_total", "Resultado de la admisión a /ask (admitted, queued, timeout, rejected_full, ...).")
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "kaana_admission_wait_seconds", "Tiempo de espera en la cola de admisión de /ask.")
+SINGLE_FLIGHT = REGISTRY.counter(
+    "kaana_single_flight_total", "Preguntas idénticas simultáneas (role=leader ejecuta, follower se une).")
+EMBEDDING_BATCHES = REGISTRY.counter(
+    "kaana_embedding_batches_total", "Lotes enviados al proveedor de embeddings (status=ok|retry|failed).")
+EMBEDDING_BATCH_SECONDS = REGISTRY.histogram(
+    "kaana_embedding_batch_seconds", "Duración de cada lote de embeddings (incluye reintentos).")
+INDEX_REBUILDS = REGISTRY.counter(
+    "kaana_index_rebuild_jobs_total", "Jobs de /contextrebuild (status=activated|unchanged|failed) y rollbacks.")
+SQL_SECONDS = REGISTRY.histogram(
+    "kaana_sql_statement_seconds", "Duración de cada sentencia SQL (db, status).")
+
+
+# ==========================
+# RETRIEVER (callbacks de LangChain)
+# ==========================
+class RetrieverMetricsHandler(BaseCallbackHandler):
+    """Mide on_retriever_start → on_retriever_end/error de cualquier retriever."""
+
+    def __init__(self):
+        self._started: Dict[Any, float] = {}
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def _finish(self, run_id, status: str):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            RETRIEVER_SECONDS.observe(time.perf_counter() - started, status=status)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._finish(run_id, "ok")
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+
+_retriever_handler_var: ContextVar[Optional[BaseCallbackHandler]] = ContextVar(
+    "kaana_retriever_metrics", default=RetrieverMetricsHandler()
+)
+
+
+def _register_langchain_hook():
+    from langchain_core.tracers.context import register_configure_hook
+    register_configure_hook(_retriever_handler_var, inheritable=True)
+
+
+_register_langchain_hook()
+
+
+# ==========================
+# SQL (eventos de SQLAlchemy)
+# ==========================
+def instrument_sql_engine(engine, db_name: str):
+    """Registra la duración de cada sentencia ejecutada por `engine` (métrica + span `sql`)."""
+    from sqlalchemy import event
+    from app.core.tracing import start_span
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        sql_span = start_span("sql", "sql", db=db_name, statement=statement)
+        conn.info.setdefault("kaana_sql_started", []).append((time.perf_counter(), sql_span))
+
+    def _finish(conn, status: str, error: Optional[str] = None):
+        started = conn.info.get("kaana_sql_started") if conn is not None else None
+        if not started:
+            return
+        perf_start, sql_span = started.pop()
+        SQL_SECONDS.observe(time.perf_counter() - perf_start, db=db_name, status=status)
+        if sql_span is not None:
+            if error:
+                sql_span.set(error=error)
+            sql_span.finish(status)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn, "ok")
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        _finish(exception_context.connection, "error", str(exception_context.original_exception))
@@ -0,0 +1,96 @@
+# app/core/providers.py
+
+"""
+Selección de proveedores externos: LLM, embeddings y búsqueda web.
+
+Todo el código pide sus clientes aquí en lugar de construir ChatOpenAI,
+CohereEmbeddings o TavilySearch directamente. Con FAKE_PROVIDERS=1 (o
+LLM_PROVIDER / EMBEDDINGS_PROVIDER / SEARCH_PROVIDER = fake por separado)
+se usan los proveedores locales de app/core/fake_providers.py: la app corre
+sin red ni claves, útil para medir su rendimiento sin costo ni latencia de
+terceros.
+"""
+
+import logging
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+FAKE_PROVIDERS = os.getenv("FAKE_PROVIDERS", "0") == "1"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "fake" if FAKE_PROVIDERS else "openai")
+EMBEDDINGS_PROVIDER = os.getenv("EMBEDDINGS_PROVIDER", "fake" if FAKE_PROVIDERS else "cohere")
+SEARCH_PROVIDER = os.getenv("SEARCH_PROVIDER", "fake" if FAKE_PROVIDERS else "tavily")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+
+
+def _unknown(kind: str, provider: str):
+    return ValueError(f"Proveedor de {kind} desconocido: '{provider}'")
+
+
+def get_chat_model():
+    """LLM de chat del agente (streaming, con usage_metadata en el último chunk)."""
+    if LLM_PROVIDER == "fake":
+        from app.core.fake_providers import FakeChatModel, load_fake_script
+        logger.info("LLM: proveedor local falso (sin red).")
+        return FakeChatModel(script=load_fake_script())
+    if LLM_PROVIDER == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=LLM_MODEL,
+            temperature=0.5,
+            streaming=True,
+            stream_usage=True,  # el último chunk trae usage_metadata (métricas de tokens)
+            max_retries=3
+        )
+    raise _unknown("LLM", LLM_PROVIDER)
+
+
+def _embeddings_client(model: str):
+    """(cliente del proveedor, espacio de claves "proveedor:modelo")."""
+    if EMBEDDINGS_PROVIDER == "fake":
+        from app.core.fake_providers import FakeEmbeddings
+        embeddings = FakeEmbeddings()
+        return embeddings, f"fake{embeddings.dim}:{model}"
+    if EMBEDDINGS_PROVIDER == "cohere":
+        from langchain_cohere import CohereEmbeddings
+        return CohereEmbeddings(model=model), f"cohere:{model}"
+    raise _unknown("embeddings", EMBEDDINGS_PROVIDER)
+
+
+def get_embeddings(model: str, cached: bool = False):
+    """
+    Cliente de embeddings para `model` (nombre del modelo de Cohere), el
+    mismo para todo el proceso: las consultas pasan por la caché LRU y el
+    micro-batching de app/core/embedding_service.py. Con `cached=True` los
+    embeddings de documentos pasan además por el pipeline por lotes y la
+    caché persistente (app/core/embedding_cache.py); úsalo en los indexadores.
+    """
+    from app.core.embedding_service import shared_embeddings
+
+    embeddings = shared_embeddings(EMBEDDINGS_PROVIDER, model, _embeddings_client)
+    if cached:
+        from app.core.embedding_cache import EMBEDDING_CACHE_ENABLED, EMBEDDING_STORE, CachedEmbeddings
+        return CachedEmbeddings(embeddings, embeddings.model, EMBEDDING_STORE if EMBEDDING_CACHE_ENABLED else None)
+    return embeddings
+
+
+def get_web_search():
+    """Herramienta de búsqueda web (el nombre y la descripción los pone websearch_tool)."""
+    if SEARCH_PROVIDER == "fake":
+        from app.core.fake_providers import FakeWebSearch
+        return FakeWebSearch()
+    if SEARCH_PROVIDER == "tavily":
+        from langchain_tavily import TavilySearch
+        return TavilySearch()
+    raise _unknown("búsqueda web", SEARCH_PROVIDER)
+
+
+def describe() -> dict:
+    return {"llm": LLM_PROVIDER, "embeddings": EMBEDDINGS_PROVIDER, "search": SEARCH_PROVIDER}
@@ -0,0 +1,89 @@
+# app/core/request_context.py
+
+"""
+Contexto por request de /ask.
+
+Guarda el id del request y contadores del trabajo hecho (iteraciones,
+llamadas al LLM, herramientas). Se propaga con un ContextVar, así que
+tool_execution y los ejecutores lo ven sin tener que pasarlo como argumento.
+"""
+
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+_current: ContextVar[Optional["RequestContext"]] = ContextVar("request_context", default=None)
+
+
+class RequestContext:
+    def __init__(self, request_id: Optional[str] = None, question: str = ""):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.question = question
+        self.started_at = time.perf_counter()
+        self.cancelled = False
+        self.max_iterations = 0
+        self.iterations = 0
+        self.llm_calls = 0
+        self.tool_calls_started = 0
+        self.tool_calls_completed = 0
+        self.tool_calls_cancelled = 0
+        self.tool_cache_hits = 0
+        self.tools_used: List[str] = []
+        self.live_data_used = False  # alguna herramienta con metadata["live_data"]
+        self.failed = False
+        self.answer_parts: List[str] = []
+        self.answer_cache: Optional[str] = None  # "hit" | "miss" | None (no aplica)
+        self.single_flight: Optional[str] = None  # "leader" | "follower" | None (no aplica)
+        self.history: Dict[str, int] = {}  # informe de HistoryManager (tokens del prompt / ahorrados)
+        # Métricas del request (ver app/core/metrics.py y request_metrics.py)
+        self.ttft_ms: Optional[float] = None
+        self.iteration_timings: List[Dict[str, Any]] = []
+        self.tool_timings: List[Dict[str, Any]] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
+
+    @property
+    def answer(self) -> str:
+        return "".join(self.answer_parts)
+
+    def saved_work(self) -> Dict[str, Any]:
+        """Resumen del trabajo que se evitó al cancelar (para el log de abandono)."""
+        return {
+            "iterations_done": self.iterations,
+            "iterations_skipped": max(0, self.max_iterations - self.iterations),
+            "llm_calls_done": self.llm_calls,
+            "tool_calls_cancelled": self.tool_calls_cancelled,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+    def metrics_summary(self) -> Dict[str, Any]:
+        """Resumen de tiempos y tokens del request (evento SSE `metrics`)."""
+        return {
+            "request_id": self.request_id,
+            "ttft_ms": self.ttft_ms,
+            "total_ms": self.elapsed_ms,
+            "iterations": self.iteration_timings,
+            "tools": self.tool_timings,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_saved": self.history.get("tokens_saved", 0),
+            "answer_cache": self.answer_cache,
+            "single_flight": self.single_flight,
+            "tool_cache_hits": self.tool_cache_hits,
+        }
+
+
+def set_current(ctx: Optional[RequestContext]):
+    """Fija el contexto del request actual. Devuelve el token para reset()."""
+    return _current.set(ctx)
+
+
+def get_current() -> Optional[RequestContext]:
+    """Devuelve el contexto del request actual (o None fuera de /ask)."""
+    return _current.get()
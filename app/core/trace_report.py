@@ -0,0 +1,172 @@
+# app/core/trace_report.py
+
+"""
+Muestra la traza de un request de /ask y su camino crítico.
+
+Lee los JSONL de app/core/tracing.py (el de cada worker, incluidos los
+archivos rotados) y
+dibuja el árbol de spans con una barra de tiempo. Los spans marcados con
+`*` forman el camino crítico: la cadena de spans que determina la duración
+total (con herramientas en paralelo, solo cuenta la que termina última).
+
+Uso:
+    uv run python -m app.core.trace_report <request_id>
+    uv run python -m app.core.trace_report --list            # últimos requests
+    uv run python -m app.core.trace_report <id> --file logs/traces.jsonl
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.tracing import TRACE_FILE
+
+_BAR_WIDTH = 40
+_EPSILON = 1e-6
+
+
+def _with_rotations(path: Path) -> List[Path]:
+    """El archivo y sus rotaciones (traces.jsonl.1, .2, ...), del más viejo al más nuevo."""
+    rotated = [p for p in path.parent.glob(path.name + ".*") if p.suffix[1:].isdigit()]
+    rotated.sort(key=lambda p: int(p.suffix[1:]), reverse=True)
+    return rotated + ([path] if path.exists() else [])
+
+
+def _trace_files(path: Path) -> List[Path]:
+    """`path` y los archivos por proceso que salen de él (traces.<pid>.jsonl), con sus rotaciones."""
+    prefix, suffix = path.stem + ".", path.suffix
+    per_process = sorted(
+        p for p in path.parent.glob(f"{prefix}*{suffix}")
+        if p.name[len(prefix):len(p.name) - len(suffix)].isdigit()
+    )
+    return [file for base in [path] + per_process for file in _with_rotations(base)]
+
+
+def load_spans(path: Path) -> List[Dict[str, Any]]:
+    spans = []
+    for file in _trace_files(path):
+        with open(file, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return spans
+
+
+def critical_path(span: Dict[str, Any], children: Dict[str, List[Dict[str, Any]]]) -> List[str]:
+    """
+    Span ids del camino crítico bajo `span`: partiendo del final del span se
+    toma el hijo que termina último, luego el que termina último antes de que
+    ese empezara, y así hacia atrás (recursivamente en cada hijo elegido).
+    """
+    path = [span["span_id"]]
+    cursor = span["end"]
+    for child in sorted(children.get(span["span_id"], []), key=lambda s: s["end"], reverse=True):
+        if child["end"] <= cursor + _EPSILON:
+            path.extend(critical_path(child, children))
+            cursor = child["start"]
+    return path
+
+
+def _label(span: Dict[str, Any]) -> str:
+    attrs = span.get("attributes", {})
+    detail = attrs.get("tool") or attrs.get("phase") or attrs.get("db") or ""
+    if span["name"] == "iteration":
+        detail = str(attrs.get("iteration", ""))
+    text = f"{span['name']}" + (f" [{detail}]" if detail else "")
+    if span.get("status") not in (None, "ok"):
+        text += f" ({span['status']})"
+    return text
+
+
+def render(request_id: str, spans: List[Dict[str, Any]]) -> str:
+    selected = [s for s in spans if (s.get("request_id") or "").startswith(request_id) and s.get("end")]
+    if not selected:
+        return f"No hay spans para el request {request_id}."
+
+    # los spans sin request_id (retriever, sql, embedding) se unen por trace_id
+    trace_ids = {s["trace_id"] for s in selected}
+    selected = [s for s in spans if s["trace_id"] in trace_ids and s.get("end")]
+    by_id = {s["span_id"]: s for s in selected}
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    roots = []
+    for s in selected:
+        if s.get("parent_id") in by_id:
+            children.setdefault(s["parent_id"], []).append(s)
+        else:
+            roots.append(s)
+    root = max(roots, key=lambda s: s["end"] - s["start"])
+    total = max(root["end"] - root["start"], _EPSILON)
+    critical = set(critical_path(root, children))
+
+    lines = [
+        f"Request {root.get('request_id')}  traza {root['trace_id']}  total {total * 1000:.1f} ms",
+        "",
+    ]
+
+    def walk(span: Dict[str, Any], depth: int):
+        offset = span["start"] - root["start"]
+        duration = span["end"] - span["start"]
+        begin = int(offset / total * _BAR_WIDTH)
+        width = max(1, int(round(duration / total * _BAR_WIDTH)))
+        bar = " " * begin + "█" * min(width, _BAR_WIDTH - begin)
+        mark = "*" if span["span_id"] in critical else " "
+        name = ("  " * depth + _label(span))[:48]
+        lines.append(f"{mark} {name:<48} {offset * 1000:>9.1f} {duration * 1000:>9.1f} ms |{bar:<{_BAR_WIDTH}}|")
+        for child in sorted(children.get(span["span_id"], []), key=lambda s: s["start"]):
+            walk(child, depth + 1)
+
+    lines.append(f"  {'span':<48} {'inicio':>9} {'duración':>12} |")
+    walk(root, 0)
+
+    # Resumen: tiempo propio de cada span del camino crítico (su duración
+    # menos la de sus hijos críticos); la suma es la duración total
+    lines += ["", "Camino crítico (tiempo propio):"]
+    for span_id in sorted(critical, key=lambda i: by_id[i]["start"]):
+        current = by_id[span_id]
+        own = (current["end"] - current["start"]) - sum(
+            c["end"] - c["start"] for c in children.get(span_id, []) if c["span_id"] in critical
+        )
+        lines.append(f"  {_label(current):<40} {own * 1000:>9.1f} ms  {own / total * 100:5.1f}%")
+    return "\n".join(lines)
+
+
+def list_requests(spans: List[Dict[str, Any]], limit: int) -> str:
+    requests = [s for s in spans if s["name"] == "request" and s.get("end")]
+    requests.sort(key=lambda s: s["start"], reverse=True)
+    lines = [f"{'request_id':<18} {'duración':>10} {'resultado':<10} pregunta"]
+    for s in requests[:limit]:
+        attrs = s.get("attributes", {})
+        lines.append(
+            f"{s.get('request_id', ''):<18} {s['duration_ms']:>8.0f}ms {str(attrs.get('outcome', '')):<10} "
+            f"{str(attrs.get('question', ''))[:60]}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("request_id", nargs="?", help="Id del request (cabecera X-Request-Id); admite prefijo")
+    parser.add_argument("--file", type=Path, default=TRACE_FILE)
+    parser.add_argument("--list", action="store_true", help="Lista los últimos requests trazados")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.file)
+    if args.list or not args.request_id:
+        print(list_requests(spans, args.limit))
+        return
+    output = render(args.request_id, spans)
+    print(output)
+    if output.startswith("No hay spans"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# app/core/tracing.py
+
+"""
+Trazas por spans del bucle ReAct.
+
+Cada request de /ask es una traza con spans anidados:
+
+    request → answer_cache / iteration → llm_call / tool_call
+                                           tool_call → retriever / embedding / sql
+
+El span actual se propaga con un ContextVar, así que las tareas creadas con
+asyncio.create_task y los hilos de tool_executors (que copian el contexto)
+cuelgan sus spans del padre correcto.
+
+Exportación (en un hilo aparte, nunca en el event loop):
+    - JSONL rotativo por proceso (una línea por span): cada worker de
+      uvicorn escribe en su propio archivo, TRACE_FILE con el PID antes de
+      la extensión (logs/traces.<pid>.jsonl), así la rotación de uno no
+      pisa el archivo que tiene abierto otro;
+    - opcional: colector OTLP/HTTP local (OTLP_TRACES_ENDPOINT, p. ej.
+      http://localhost:4318), con el JSON de OTLP y sin dependencias extra.
+
+Para ver el camino crítico de un request:
+    uv run python -m app.core.trace_report <request_id>
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_FILE = Path(os.getenv("TRACE_FILE", str(Path(__file__).parent.parent.parent / "logs" / "traces.jsonl")))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+OTLP_TRACES_ENDPOINT = os.getenv("OTLP_TRACES_ENDPOINT", "")
+SERVICE_NAME = "kaana-data-agent"
+
+# Tamaño máximo de los atributos de texto (sentencias SQL, consultas...)
+_MAX_ATTR_CHARS = 500
+_OTLP_BATCH = 256
+_OTLP_FLUSH_SECONDS = 2.0
+
+
+def trace_file_for(pid: int, base: Path = TRACE_FILE) -> Path:
+    """Archivo de trazas del proceso `pid`: traces.jsonl → traces.<pid>.jsonl."""
+    return base.with_name(f"{base.stem}.{pid}{base.suffix}")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "request_id", "name", "kind",
+                 "start", "end", "attributes", "status", "_perf_start")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], request_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.request_id = request_id or (parent.request_id if parent else None)
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = {k: _attr(v) for k, v in attributes.items()}
+        self.status = "ok"
+
+    def set(self, **attributes):
+        for key, value in attributes.items():
+            self.attributes[key] = _attr(value)
+
+    def finish(self, status: Optional[str] = None):
+        if self.end is not None:
+            return
+        if status:
+            self.status = status
+        self.end = self.start + (time.perf_counter() - self._perf_start)
+        _export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": round(self.start, 6),
+            "end": round(self.end, 6) if self.end else None,
+            "duration_ms": round((self.end - self.start) * 1000, 3) if self.end else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def _attr(value: Any) -> Any:
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return text if len(text) <= _MAX_ATTR_CHARS else text[:_MAX_ATTR_CHARS] + "…"
+
+
+# ==========================
+# API
+# ==========================
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, kind: str = "internal", request_id: Optional[str] = None,
+               parent: Optional[Span] = None, **attributes) -> Optional[Span]:
+    """Crea un span hijo del actual sin activarlo (para callbacks y eventos). Hay que llamar a finish()."""
+    if not TRACE_ENABLED:
+        return None
+    return Span(name, kind, parent or _current_span.get(), request_id, attributes)
+
+
+def record_span(name: str, kind: str, perf_start: float, perf_end: Optional[float] = None,
+                status: str = "ok", **attributes) -> Optional[Span]:
+    """Registra un span ya terminado (medido con time.perf_counter) como hijo del actual."""
+    finished = start_span(name, kind, **attributes)
+    if finished is None:
+        return None
+    perf_end = perf_end if perf_end is not None else time.perf_counter()
+    finished.start = time.time() - (time.perf_counter() - perf_start)
+    finished._perf_start = perf_start
+    finished.status = status
+    finished.end = finished.start + (perf_end - perf_start)
+    _export(finished)
+    return finished
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", request_id: Optional[str] = None, **attributes):
+    """Span activo durante el bloque; los spans creados dentro cuelgan de él."""
+    current = start_span(name, kind, request_id, **attributes)
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as err:
+        current.set(error=f"{type(err).__name__}: {err}")
+        current.finish("cancelled" if type(err).__name__ in ("CancelledError", "GeneratorExit") else "error")
+        raise
+    finally:
+        current.finish()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # el generador se cerró desde otro contexto (aclose en otra tarea)
+            pass
+
+
+# ==========================
+# EXPORTACIÓN
+# ==========================
+class _Exporter:
+    """Escribe los spans desde un hilo propio: el event loop solo encola."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file_handler: Optional[RotatingFileHandler] = None
+        self._otlp_batch: List[Dict[str, Any]] = []
+        self._otlp_last_flush = time.monotonic()
+        self.dropped = 0
+
+    def submit(self, record: Dict[str, Any]):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _open_file(self):
+        if self._file_handler is None:
+            path = trace_file_for(os.getpid())
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file_handler = RotatingFileHandler(
+                path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8"
+            )
+            self._file_handler.setFormatter(logging.Formatter("%(message)s"))
+        return self._file_handler
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=_OTLP_FLUSH_SECONDS)
+            except queue.Empty:
+                record = False
+            if record is None:
+                self._flush_otlp()
+                return
+            if record:
+                try:
+                    self._open_file().emit(logging.makeLogRecord({"msg": json.dumps(record, ensure_ascii=False)}))
+                except Exception as e:
+                    logger.warning(f"No se pudo escribir la traza: {e}")
+                if OTLP_TRACES_ENDPOINT:
+                    self._otlp_batch.append(record)
+            if OTLP_TRACES_ENDPOINT and (
+                len(self._otlp_batch) >= _OTLP_BATCH
+                or time.monotonic() - self._otlp_last_flush >= _OTLP_FLUSH_SECONDS
+            ):
+                self._flush_otlp()
+
+    def _flush_otlp(self):
+        self._otlp_last_flush = time.monotonic()
+        if not self._otlp_batch:
+            return
+        batch, self._otlp_batch = self._otlp_batch, []
+        body = json.dumps(_to_otlp(batch)).encode("utf-8")
+        request = urllib.request.Request(
+            OTLP_TRACES_ENDPOINT.rstrip("/") + "/v1/traces",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning(f"Colector OTLP no disponible ({e}); se descartan {len(batch)} spans.")
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+
+_EXPORTER = _Exporter()
+
+
+def _export(finished: Span):
+    _EXPORTER.submit(finished.to_dict())
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": "" if value is None else str(value)}
+
+
+def _to_otlp(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    spans = []
+    for record in records:
+        attributes = dict(record["attributes"])
+        attributes["kaana.request_id"] = record["request_id"]
+        attributes["kaana.kind"] = record["kind"]
+        spans.append({
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            **({"parentSpanId": record["parent_id"]} if record["parent_id"] else {}),
+            "name": record["name"],
+            "kind": 3 if record["kind"] in ("llm", "embedding", "sql", "retriever") else 1,
+            "startTimeUnixNano": str(int(record["start"] * 1e9)),
+            "endTimeUnixNano": str(int((record["end"] or record["start"]) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            "status": {"code": 2 if record["status"] == "error" else 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+# ==========================
+# INSTRUMENTACIÓN
+# ==========================
+class RetrieverTraceHandler(BaseCallbackHandler):
+    """Span `retriever` por cada consulta a un retriever de LangChain."""
+
+    def __init__(self):
+        self._spans: Dict[Any, Span] = {}
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        started = start_span("retriever", "retriever", query=query)
+        if started is not None:
+            self._spans[run_id] = started
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        started = self._spans.pop(run_id, None)
+        if started is not None:
+            started.set(documents=len(documents))
+            started.finish()
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        started = self._spans.pop(run_id, None)
+        if started is not None:
+            started.set(error=str(error))
+            started.finish("error")
+
+
+_retriever_trace_var: ContextVar[Optional[BaseCallbackHandler]] = ContextVar(
+    "kaana_retriever_trace", default=RetrieverTraceHandler() if TRACE_ENABLED else None
+)
+
+
+def _register_langchain_hook():
+    from langchain_core.tracers.context import register_configure_hook
+    register_configure_hook(_retriever_trace_var, inheritable=True)
+
+
+_register_langchain_hook()
+
+
+class TracedEmbeddings(Embeddings):
+    """Envuelve un modelo de embeddings y registra un span `embedding` por llamada."""
+
+    def __init__(self, inner: Embeddings, model: str = ""):
+        self.inner = inner
+        self.model = model or getattr(inner, "model", "")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed_documents", "embedding", model=self.model, texts=len(texts)):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embed_query", "embedding", model=self.model, chars=len(text)):
+            return self.inner.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed_documents", "embedding", model=self.model, texts=len(texts)):
+            return await self.inner.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with span("embed_query", "embedding", model=self.model, chars=len(text)):
+            return await self.inner.aembed_query(text)
@@ -0,0 +1,268 @@
+# app/core/vector_index.py
+
+"""
+Tipos de índice FAISS configurables para los índices vectoriales.
+
+FAISS.from_documents de LangChain crea siempre un IndexFlatL2: búsqueda
+exacta con los vectores float32 completos (4 bytes por dimensión). Con
+muchos documentos conviene un índice aproximado o cuantizado:
+
+    flat     : exacto, float32 (por defecto)
+    sq8      : exacto sobre vectores cuantizados a 8 bits (4x menos memoria)
+    ivf_flat : IVF (nlist listas, busca en nprobe), vectores float32
+    ivf_sq8  : IVF + vectores de 8 bits
+    ivf_pq   : IVF + product quantization (pq_m bytes por vector con 8 bits)
+    hnsw     : grafo HNSW (M vecinos, efSearch en búsqueda), vectores float32
+
+Los índices con entrenamiento (IVF, PQ, SQ) se entrenan con una muestra de
+FAISS_TRAIN_SAMPLE vectores. Si el corpus es demasiado chico para entrenar
+el tipo pedido se usa flat (y se informa).
+
+LangChain borra vectores por posición, lo que solo es correcto en un índice
+plano; por eso los indexadores trabajan sobre un IndexFlat (to_flat) y
+convierten al tipo configurado al guardar (convert_vectorstore).
+
+read_vectorstore() carga un índice guardado con save_local, opcionalmente
+mapeado en memoria (solo lectura): los vectores quedan en el page cache del
+sistema operativo y los workers que abren el mismo archivo comparten esas
+páginas en lugar de tener cada uno su copia.
+"""
+
+import logging
+import math
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))  # 0 = 4·√n
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))  # 0 = dim/8 (1 byte cada 8 dimensiones)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+
+INDEX_TYPES = ("flat", "sq8", "ivf_flat", "ivf_sq8", "ivf_pq", "hnsw")
+
+# k-means de FAISS pide al menos 39 puntos por centroide
+_POINTS_PER_CENTROID = 39
+
+
+def _auto_nlist(n: int) -> int:
+    return max(1, int(4 * math.sqrt(n)))
+
+
+def _pq_m(dim: int, requested: int) -> int:
+    """Subcuantizadores de PQ: el mayor divisor de dim que no pasa de lo pedido."""
+    target = requested or max(1, dim // 8)
+    return max(m for m in range(1, min(target, dim) + 1) if dim % m == 0)
+
+
+def factory_string(index_type: str, dim: int, n: int, nlist: int = FAISS_NLIST,
+                   hnsw_m: int = FAISS_HNSW_M, pq_m: int = FAISS_PQ_M,
+                   pq_nbits: int = FAISS_PQ_NBITS) -> Tuple[str, Optional[str]]:
+    """
+    Cadena de faiss.index_factory para `index_type` con n vectores. Devuelve
+    (cadena, motivo); si el corpus no alcanza para entrenarlo, la cadena es
+    "Flat" y motivo explica por qué.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice FAISS desconocido: '{index_type}' (válidos: {', '.join(INDEX_TYPES)})")
+    if index_type == "flat":
+        return "Flat", None
+    if index_type == "sq8":
+        return "SQ8", None
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}", None
+
+    nlist = min(nlist or _auto_nlist(n), n // _POINTS_PER_CENTROID)
+    if nlist < 2:
+        return "Flat", f"{n} vectores no alcanzan para entrenar IVF"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat", None
+    if index_type == "ivf_sq8":
+        return f"IVF{nlist},SQ8", None
+    if n < (2 ** pq_nbits) * _POINTS_PER_CENTROID:
+        return "Flat", f"{n} vectores no alcanzan para entrenar PQ de {pq_nbits} bits"
+    return f"IVF{nlist},PQ{_pq_m(dim, pq_m)}x{pq_nbits}", None
+
+
+def configure_search(index: faiss.Index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """Parámetros de búsqueda (no se guardan en el índice: se aplican al cargar)."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # no es IVF
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def memory_bytes(index: faiss.Index) -> int:
+    """Tamaño serializado del índice (≈ lo que ocupa en memoria y en disco)."""
+    return int(faiss.serialize_index(index).size)
+
+
+def build_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE,
+                train_sample: int = FAISS_TRAIN_SAMPLE,
+                ef_construction: int = FAISS_EF_CONSTRUCTION, seed: int = 0,
+                **params) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Construye un índice del tipo pedido con `vectors` (n × dim, float32) en
+    el mismo orden (posición i = vector i). Devuelve (índice, reporte).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    spec, fallback = factory_string(index_type, dim, n, **params)
+    if fallback:
+        logger.warning(f"Índice FAISS {index_type}: {fallback}; se usa flat.")
+
+    started = time.perf_counter()
+    index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+    train_seconds = 0.0
+    if not index.is_trained:
+        sample = vectors
+        if n > train_sample:
+            sample = vectors[np.random.default_rng(seed).choice(n, size=train_sample, replace=False)]
+        index.train(sample)
+        train_seconds = time.perf_counter() - started
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = ef_construction
+    index.add(vectors)
+    configure_search(index)
+
+    report = {
+        "type": index_type if not fallback else "flat",
+        "requested": index_type,
+        "factory": spec,
+        "vectors": n,
+        "dim": dim,
+        "bytes": memory_bytes(index),
+        "flat_bytes": n * dim * 4,
+        "train_seconds": round(train_seconds, 3),
+        "build_seconds": round(time.perf_counter() - started, 3),
+    }
+    if fallback:
+        report["fallback"] = fallback
+    return index, report
+
+
+def _all_vectors(index: faiss.Index) -> np.ndarray:
+    return index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+
+
+def is_flat(index: faiss.Index) -> bool:
+    return isinstance(index, faiss.IndexFlat)
+
+
+def convert_vectorstore(vectorstore, index_type: str = FAISS_INDEX_TYPE) -> Dict[str, Any]:
+    """
+    Reemplaza el IndexFlat de un vectorstore de LangChain por uno del tipo
+    pedido (mismas posiciones, así index_to_docstore_id sigue valiendo).
+    """
+    if not is_flat(vectorstore.index):
+        raise ValueError("convert_vectorstore espera un IndexFlat (usa to_flat antes)")
+    index, report = build_index(_all_vectors(vectorstore.index), index_type)
+    vectorstore.index = index
+    logger.info(
+        f"Índice FAISS {report['factory']}: {report['vectors']} vectores, "
+        f"{report['bytes'] / 1e6:.1f} MB (flat: {report['flat_bytes'] / 1e6:.1f} MB), "
+        f"{report['build_seconds']}s"
+    )
+    return report
+
+
+def _exact_vectors(index: faiss.Index) -> Optional[np.ndarray]:
+    """
+    Vectores originales del índice si los guarda sin pérdida (flat, IVF-Flat
+    y HNSW-Flat); None si solo guarda una aproximación (SQ8, PQ).
+    """
+    if is_flat(index):
+        return _all_vectors(index)
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None  # no es IVF
+    if ivf is not None:
+        if not isinstance(faiss.downcast_index(ivf), faiss.IndexIVFFlat):
+            return None
+        ivf.make_direct_map()  # reconstruct en IVF necesita el mapa posición → lista
+        return _all_vectors(index)
+    if hasattr(index, "hnsw") and is_flat(faiss.downcast_index(index.storage)):
+        return _all_vectors(index)
+    return None
+
+
+def to_flat(vectorstore, embeddings) -> bool:
+    """
+    Deja el vectorstore sobre un IndexFlatL2 para poder añadir y borrar. Si
+    el índice guarda los vectores completos (flat, IVF-Flat, HNSW) se
+    reconstruyen de él; en SQ8/PQ el índice solo guarda una aproximación y
+    se vuelven a pedir a `embeddings` (con la caché persistente de
+    embeddings son lecturas locales). Devuelve True si hubo que convertir.
+    """
+    if is_flat(vectorstore.index) and vectorstore.index.metric_type == faiss.METRIC_L2:
+        return False
+    vectors = _exact_vectors(vectorstore.index)
+    if vectors is None:
+        ids: List[str] = [vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))]
+        docs = vectorstore.docstore.mget(ids) if hasattr(vectorstore.docstore, "mget") else {
+            cid: vectorstore.docstore.search(cid) for cid in ids
+        }
+        vectors = np.asarray(embeddings.embed_documents([docs[cid].page_content for cid in ids]), dtype=np.float32)
+    flat = faiss.IndexFlatL2(vectorstore.index.d)
+    if len(vectors):
+        flat.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    vectorstore.index = flat
+    return True
+
+
+# ==========================
+# CARGA
+# ==========================
+def _mmap_flags(path: Path) -> int:
+    """
+    Flags de faiss.read_index para mapear `path`. En IVF (fourcc "Iw..") el
+    grueso son las listas invertidas, que mapea IO_FLAG_MMAP; en Flat, SQ y
+    HNSW son los arrays de vectores, que mapea IO_FLAG_MMAP_IFC.
+    """
+    with open(path, "rb") as f:
+        fourcc = f.read(4)
+    flag = faiss.IO_FLAG_MMAP if fourcc.startswith(b"Iw") else faiss.IO_FLAG_MMAP_IFC
+    return flag | faiss.IO_FLAG_READ_ONLY
+
+
+def read_index(path: Path, mmap: bool = False) -> faiss.Index:
+    """Lee un índice FAISS; con mmap, mapeado y de solo lectura (no admite add/remove)."""
+    if mmap:
+        try:
+            return faiss.read_index(str(path), _mmap_flags(Path(path)))
+        except (RuntimeError, AttributeError) as e:
+            logger.warning(f"No se pudo mapear {path} ({e}); se carga en memoria.")
+    return faiss.read_index(str(path))
+
+
+def read_vectorstore(index_dir: Path, embeddings, mmap: bool = False):
+    """
+    Equivalente a FAISS.load_local (index.faiss + index.pkl) con carga mapeada
+    opcional y los parámetros de búsqueda del entorno (nprobe / efSearch).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    index_dir = Path(index_dir)
+    index = read_index(index_dir / "index.faiss", mmap)
+    with open(index_dir / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    configure_search(index)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
@@ -0,0 +1,217 @@
+# app/core/vector_registry.py
+
+"""
+Registro de índices vectoriales del proceso.
+
+Cada índice (contexto del hotel, cuentas contables) se registra una vez con
+cómo encontrar su directorio actual y cómo cargarlo; el resto del código lo
+pide por nombre con VECTOR_INDEXES.get(nombre) y recibe siempre la misma
+instancia, en lugar de llamar a FAISS.load_local por su cuenta:
+
+    - se carga una sola vez por proceso (la primera vez que se pide);
+    - con VECTOR_INDEX_MMAP=1 el índice se mapea en memoria de solo lectura:
+      los N workers de uvicorn comparten las páginas del page cache en lugar
+      de tener N copias privadas;
+    - cada VECTOR_INDEX_CHECK_SECONDS se comprueba si en disco hay otra
+      versión (otro directorio, o index.faiss/index.pkl reescritos) y se
+      recarga sin reiniciar el proceso. La comprobación y la recarga corren
+      en un hilo aparte: get() devuelve al instante la copia anterior, que
+      se sigue usando hasta que la nueva está cargada (o para siempre si la
+      recarga falla). Solo la primera carga, sin copia anterior, se espera.
+
+Los jobs de reindexación de este proceso instalan la versión que acaban de
+cargar (install), así que no se vuelve a leer del disco.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+VECTOR_INDEX_MMAP = os.getenv("VECTOR_INDEX_MMAP", "1") == "1"
+# Cada cuánto se mira si hay una versión nueva en disco (0 = en cada get)
+VECTOR_INDEX_CHECK_SECONDS = float(os.getenv("VECTOR_INDEX_CHECK_SECONDS", "5"))
+
+_INDEX_FILES = ("index.faiss", "index.pkl")
+
+# (directorio, (mtime_ns, tamaño) de cada archivo del índice)
+VersionKey = Tuple[str, Tuple[Tuple[int, int], ...]]
+
+
+def version_key(index_dir: Path) -> VersionKey:
+    """Identifica el contenido en disco de un índice sin leerlo."""
+    stats = tuple((s.st_mtime_ns, s.st_size) for s in (Path(index_dir, name).stat() for name in _INDEX_FILES))
+    return str(Path(index_dir).resolve()), stats
+
+
+class _Entry:
+    def __init__(self, name: str, resolve: Callable[[], Optional[Path]],
+                 loader: Callable[..., Any], embeddings: Callable[[], Any]):
+        self.name = name
+        self.resolve = resolve  # directorio actual del índice (None si no hay)
+        self.loader = loader  # loader(index_dir, embeddings, mmap=...) → vectorstore
+        self.embeddings_factory = embeddings
+        self.embeddings = None
+        self.vectorstore = None
+        self.key: Optional[VersionKey] = None
+        self.checked_at = 0.0
+        self.error: Optional[Exception] = None
+        # Una carga/comprobación a la vez; si ya hay copia se hace en un hilo aparte
+        # (que libera el lock al terminar) y los lectores no la esperan
+        self.lock = threading.Lock()
+        # Solo para cambiar la copia instalada (vectorstore, key, error): nunca se
+        # sostiene mientras se carga, así install() no espera a una recarga en curso
+        self.swap_lock = threading.Lock()
+
+
+class VectorIndexRegistry:
+    def __init__(self, mmap: bool = VECTOR_INDEX_MMAP, check_seconds: float = VECTOR_INDEX_CHECK_SECONDS):
+        self.mmap = mmap
+        self.check_seconds = check_seconds
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reloads = 0
+        self.checks = 0
+        self.failures = 0
+
+    def register(self, name: str, resolve: Callable[[], Optional[Path]],
+                 loader: Callable[..., Any], embeddings: Callable[[], Any]):
+        """Registra un índice (idempotente: la primera registración gana)."""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name, resolve, loader, embeddings)
+
+    def _entry(self, name: str) -> _Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Índice vectorial no registrado: '{name}'") from None
+
+    def _open(self, entry: _Entry, index_dir: Path):
+        if entry.embeddings is None:
+            entry.embeddings = entry.embeddings_factory()
+        return entry.loader(index_dir, entry.embeddings, mmap=self.mmap)
+
+    # ---------- lectura ----------
+    def get(self, name: str):
+        """
+        Vectorstore actual de `name`. Lanza FileNotFoundError si no hay índice
+        (o la excepción de la última carga fallida) y no hay copia anterior.
+        """
+        entry = self._entry(name)
+        vectorstore = entry.vectorstore
+        if vectorstore is not None:
+            if time.monotonic() - entry.checked_at >= self.check_seconds and entry.lock.acquire(blocking=False):
+                # comprobación en segundo plano; mientras tanto, la copia actual
+                entry.checked_at = time.monotonic()
+                try:
+                    threading.Thread(
+                        target=self._refresh_in_background, args=(entry,),
+                        name=f"vector-index-{entry.name}", daemon=True
+                    ).start()
+                except Exception:
+                    entry.lock.release()
+                    raise
+            return vectorstore
+
+        entry.lock.acquire()
+        try:
+            if time.monotonic() - entry.checked_at < self.check_seconds:
+                if entry.vectorstore is not None:
+                    return entry.vectorstore
+                if entry.error is not None:
+                    raise entry.error
+            self._refresh(entry)
+            if entry.vectorstore is None:
+                raise entry.error
+            return entry.vectorstore
+        finally:
+            entry.lock.release()
+
+    def _refresh_in_background(self, entry: _Entry):
+        try:
+            self._refresh(entry)
+        except Exception as e:  # _refresh ya captura los errores de carga
+            logger.error(f"ERROR al comprobar el índice '{entry.name}': {e}")
+        finally:
+            entry.lock.release()
+
+    def _refresh(self, entry: _Entry):
+        entry.checked_at = time.monotonic()
+        self.checks += 1
+        # Si install() cambia la copia mientras se carga, lo cargado aquí ya no vale
+        base_key = entry.key
+        try:
+            index_dir = entry.resolve()
+            if index_dir is None or not Path(index_dir, _INDEX_FILES[0]).exists():
+                raise FileNotFoundError(f"No hay índice '{entry.name}' en disco")
+            key = version_key(index_dir)
+            if key == entry.key:
+                return
+            started = time.perf_counter()
+            vectorstore = self._open(entry, Path(index_dir))
+        except Exception as e:
+            self.failures += 1
+            with entry.swap_lock:
+                if entry.key == base_key:
+                    entry.error = e
+            if entry.vectorstore is not None:
+                logger.error(f"ERROR al recargar el índice '{entry.name}'; se sigue con la versión cargada: {e}")
+            return
+        with entry.swap_lock:
+            if entry.key != base_key:
+                logger.info(f"Índice '{entry.name}': se descarta la recarga de {Path(index_dir).name}, se instaló otra versión mientras cargaba.")
+                return
+            reloaded = entry.vectorstore is not None
+            entry.vectorstore, entry.key, entry.error = vectorstore, key, None
+        if reloaded:
+            self.reloads += 1
+        else:
+            self.loads += 1
+        logger.info(
+            f"Índice '{entry.name}' {'recargado' if reloaded else 'cargado'} desde {Path(index_dir).name} "
+            f"({'mmap' if self.mmap else 'en memoria'}, {time.perf_counter() - started:.2f}s)."
+        )
+
+    # ---------- carga explícita ----------
+    def load(self, name: str, index_dir: Path):
+        """Carga `index_dir` con el loader de `name` sin instalarlo (p. ej. una versión por activar)."""
+        entry = self._entry(name)
+        vectorstore = self._open(entry, Path(index_dir))
+        self.loads += 1
+        return vectorstore
+
+    def install(self, name: str, index_dir: Path, vectorstore):
+        """
+        Hace de `vectorstore` (ya cargado desde `index_dir`) la copia actual de
+        `name`. No espera a una recarga en curso: esa descarta su resultado.
+        """
+        entry = self._entry(name)
+        key = version_key(index_dir)
+        with entry.swap_lock:
+            entry.vectorstore, entry.key, entry.error = vectorstore, key, None
+            entry.checked_at = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "loaded": sum(1 for e in self._entries.values() if e.vectorstore is not None),
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "checks": self.checks,
+            "failures": self.failures,
+            "mmap": int(self.mmap),
+        }
+
+
+VECTOR_INDEXES = VectorIndexRegistry()
+REGISTRY.register_collector("kaana_vector_indexes", VECTOR_INDEXES.stats)
@@ -4,7 +4,7 @@ Selector semántico de ejemplos few-shot para SQL queries
 Encuentra los ejemplos más relevantes basándose en similitud de la pregunta
 """
 
-from langchain_cohere import CohereEmbeddings
+from app.core.providers import get_embeddings
 from langchain_community.vectorstores import FAISS
 from langchain.prompts.example_selector import SemanticSimilarityExampleSelector
 from app.fshot.sql_examples import SQL_EXAMPLES
@@ -23,7 +23,7 @@ class SQLExampleSelector:
         """
         self.examples = examples or SQL_EXAMPLES
         self.k = k
-        self.embeddings = CohereEmbeddings(model="large")
+        self.embeddings = get_embeddings("large", cached=True)
         
         # Crear el selector semántico
         self.selector = SemanticSimilarityExampleSelector.from_examples(
@@ -2,6 +2,11 @@
 
 from app.fshot.few_shot_selector import get_example_selector
 import logging
+import os
+
+# Versión del prompt del agente: súbela al cambiar get_enhanced_prompt() para
+# que las respuestas compartidas (single-flight) no mezclen versiones.
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "1")
 
 
 def check_for_tools(tools: bool) -> bool:
@@ -0,0 +1,309 @@
+# app/rag/chunk_store.py
+
+"""
+chunk_store.py
+----------------------------------
+Almacén de chunks del índice de contexto en SQLite (chunks.sqlite en cada
+versión del índice).
+
+Sustituye a chunk_store.json y al InMemoryDocstore que FAISS guardaba en
+index.pkl con el texto de todos los chunks. ChunkStore implementa la
+interfaz Docstore de LangChain, así que FAISS lo usa tal cual:
+
+    - no carga nada en memoria al abrir: el retriever pide cada chunk por id
+      (search) solo para los k resultados de la consulta;
+    - add() es un upsert en bloque y delete() un borrado en bloque;
+    - índices por source, section y hash del texto (lookups por archivo y
+      sección, y chunks con el mismo texto en varios archivos);
+    - índice léxico FTS5 (BM25) de la jerarquía de encabezados y el texto,
+      actualizado en el mismo add()/delete() que los chunks: lo usa la
+      búsqueda híbrida (app/rag/hybrid_retriever.py);
+    - index.pkl guarda solo el mapa posición → id y una referencia al
+      almacén, que open_vectorstore() vuelve a enlazar con su archivo.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import hashlib
+import json
+import logging
+import re
+import shutil
+import sqlite3
+import threading
+import unicodedata
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.core.vector_index import read_vectorstore
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+CHUNK_DB_FILE = "chunks.sqlite"
+
+# Máximo de variables por sentencia de SQLite
+_SQL_BATCH = 500
+# Peso de cada columna de chunks_fts en bm25(): chunk_id, hierarchy, text
+_BM25_WEIGHTS = (0.0, 2.0, 1.0)
+# Palabras vacías (español e inglés) que no se buscan en el índice léxico
+_STOPWORDS = frozenset("""
+    a al algo con cual cuales cuando de del desde donde el ella en entre es esta este hay la las le lo los
+    mas me mi mis muy no o para pero por que se si sin sobre su sus te tiene tienen un una unas uno unos y ya
+    an and are at be can do does for how i in is it of on or the to what when where which with you
+""".split())
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def _fts_rowid(chunk_id: str) -> int:
+    """rowid de chunks_fts derivado del id (borrado por clave primaria, sin tabla intermedia)."""
+    return int(hashlib.sha256(chunk_id.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def lexical_query(text: str) -> Optional[str]:
+    """
+    Consulta FTS5 para `text`: términos sin tildes ni palabras vacías unidos
+    con OR, los de 4 letras o más como prefijo ("mascota" encuentra "mascotas").
+    """
+    terms = []
+    folded = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    for word in _WORD_RE.findall(folded):
+        if word in _STOPWORDS or word in terms:
+            continue
+        terms.append(word)
+    if not terms:
+        return None
+    return " OR ".join(f'"{t}"*' if len(t) >= 4 else f'"{t}"' for t in terms)
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """Docstore de FAISS sobre SQLite: chunk_id → texto + metadata."""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = Path(path) if path is not None else None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts = False  # chunks_fts disponible (se sabe al conectar)
+        self._lock = threading.Lock()
+
+    # index.pkl guarda solo la referencia; open_vectorstore() enlaza la ruta
+    def __getstate__(self):
+        return {"path": None}
+
+    def __setstate__(self, state):
+        self.__init__(state.get("path"))
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path is None:
+                raise RuntimeError("ChunkStore sin archivo: ábrelo con open_vectorstore()")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " chunk_id TEXT PRIMARY KEY, source TEXT NOT NULL, section TEXT,"
+                " hierarchy TEXT, content_hash TEXT NOT NULL, text TEXT NOT NULL,"
+                " metadata TEXT NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_section ON chunks (section)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_content_hash ON chunks (content_hash)")
+            conn.commit()
+            self._fts = self._init_fts(conn)
+            self._conn = conn
+        return self._conn
+
+    def _init_fts(self, conn: sqlite3.Connection) -> bool:
+        """Crea chunks_fts (y lo llena si el almacén es anterior a él). False si SQLite no trae FTS5."""
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+                " chunk_id UNINDEXED, hierarchy, text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite sin FTS5 ({e}); la búsqueda léxica queda desactivada.")
+            return False
+        conn.execute("BEGIN IMMEDIATE")
+        if (conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone()
+                and not conn.execute("SELECT 1 FROM chunks_fts LIMIT 1").fetchone()):
+            rows = conn.execute("SELECT chunk_id, COALESCE(hierarchy, ''), text FROM chunks").fetchall()
+            conn.executemany(
+                "INSERT INTO chunks_fts (rowid, chunk_id, hierarchy, text) VALUES (?, ?, ?, ?)",
+                [(_fts_rowid(cid), cid, hierarchy, text) for cid, hierarchy, text in rows],
+            )
+            logger.info(f"Índice léxico de {self.path.name} creado: {len(rows)} chunks.")
+        conn.commit()
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def _document(text: str, metadata: str) -> Document:
+        return Document(page_content=text, metadata=json.loads(metadata))
+
+    # ---------- interfaz Docstore / AddableMixin ----------
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT text, metadata FROM chunks WHERE chunk_id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._document(*row)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Upsert en bloque (un chunk_id que ya existe se reemplaza)."""
+        rows = []
+        for cid, doc in texts.items():
+            meta = doc.metadata
+            rows.append((
+                cid, meta.get("source", ""), meta.get("section"), meta.get("hierarchy"),
+                content_hash(doc.page_content), doc.page_content, json.dumps(meta, ensure_ascii=False),
+            ))
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            if self._fts:
+                conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", [(_fts_rowid(r[0]),) for r in rows])
+                conn.executemany(
+                    "INSERT INTO chunks_fts (rowid, chunk_id, hierarchy, text) VALUES (?, ?, ?, ?)",
+                    [(_fts_rowid(r[0]), r[0], r[3] or "", r[5]) for r in rows],
+                )
+            conn.commit()
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[i:i + _SQL_BATCH])
+                conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+            if self._fts:
+                conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", [(_fts_rowid(cid),) for cid in ids])
+            conn.commit()
+
+    # ---------- consultas ----------
+    def mget(self, ids: Iterable[str]) -> Dict[str, Document]:
+        ids = list(ids)
+        found: Dict[str, Document] = {}
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update({cid: self._document(text, meta) for cid, text, meta in rows})
+        return found
+
+    def _ids_where(self, column: str, value: str) -> List[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT chunk_id FROM chunks WHERE {column} = ?", (value,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def ids_for_source(self, source: str) -> List[str]:
+        return self._ids_where("source", source)
+
+    def ids_for_section(self, section: str) -> List[str]:
+        return self._ids_where("section", section)
+
+    def ids_for_text(self, text: str) -> List[str]:
+        """Chunks con exactamente este texto (en cualquier archivo o sección)."""
+        return self._ids_where("content_hash", content_hash(text))
+
+    def delete_sources(self, sources: Iterable[str]) -> List[str]:
+        """Borra todos los chunks de los archivos dados; devuelve sus ids."""
+        removed: List[str] = []
+        for source in sources:
+            removed.extend(self.ids_for_source(source))
+        self.delete(removed)
+        return removed
+
+    @property
+    def lexical(self) -> bool:
+        """True si hay índice léxico (FTS5)."""
+        with self._lock:
+            self._connect()
+        return self._fts
+
+    def lexical_search(self, text: str, k: int) -> List[Tuple[str, float]]:
+        """Los `k` chunks con mejor BM25 para `text`: [(chunk_id, score)], score mayor = mejor."""
+        query = lexical_query(text)
+        if query is None:
+            return []
+        with self._lock:
+            conn = self._connect()
+            if not self._fts:
+                return []
+            rows = conn.execute(
+                f"SELECT chunk_id, -bm25(chunks_fts, {', '.join(map(str, _BM25_WEIGHTS))}) AS score"
+                " FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY score DESC LIMIT ?",
+                (query, k),
+            ).fetchall()
+        return [(cid, float(score)) for cid, score in rows]
+
+    def sources(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT source, COUNT(*) FROM chunks GROUP BY source ORDER BY source"
+            ).fetchall()
+        return dict(rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+# ==========================
+# VECTORSTORE
+# ==========================
+def open_vectorstore(index_dir: Path, embeddings, mmap: bool = False) -> FAISS:
+    """
+    Carga el FAISS de `index_dir` con su ChunkStore. Un índice anterior al
+    almacén SQLite (InMemoryDocstore en index.pkl) se carga igual, en memoria.
+    Con mmap el índice es de solo lectura (para servir, no para el indexador).
+    """
+    vectorstore = read_vectorstore(index_dir, embeddings, mmap=mmap)
+    if isinstance(vectorstore.docstore, ChunkStore):
+        vectorstore.docstore = ChunkStore(Path(index_dir) / CHUNK_DB_FILE)
+    return vectorstore
+
+
+def fork_chunk_store(vectorstore: FAISS, source_dir: Optional[Path], target_dir: Path) -> ChunkStore:
+    """
+    Hace que `vectorstore` escriba en el almacén de `target_dir`: copia el de
+    `source_dir` (la versión activa no se toca) o migra un InMemoryDocstore.
+    """
+    target = Path(target_dir) / CHUNK_DB_FILE
+    current = vectorstore.docstore
+    if isinstance(current, ChunkStore):
+        if current.path == target:
+            return current
+        current.close()
+        if source_dir is not None and (Path(source_dir) / CHUNK_DB_FILE).exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(Path(source_dir) / CHUNK_DB_FILE, target)
+        store = ChunkStore(target)
+    else:
+        store = ChunkStore(target)
+        docs = {
+            cid: doc for cid in vectorstore.index_to_docstore_id.values()
+            for doc in [current.search(cid)] if isinstance(doc, Document)
+        }
+        store.add(docs)
+        logger.info(f"Chunks migrados a {CHUNK_DB_FILE}: {len(docs)}.")
+    vectorstore.docstore = store
+    return store
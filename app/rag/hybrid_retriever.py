@@ -0,0 +1,128 @@
+# app/rag/hybrid_retriever.py
+
+"""
+hybrid_retriever.py
+----------------------------------
+Búsqueda híbrida léxica + vectorial para hotel_context_search.
+
+La búsqueda vectorial pura paga un embedding de la consulta (una llamada al
+proveedor) incluso en búsquedas por palabra clave como "horario de check-in"
+o "política de mascotas". HybridRetriever combina:
+
+    - el índice léxico BM25 (FTS5) que ChunkStore mantiene junto a FAISS en
+      chunks.sqlite, con los mismos chunks y actualizado en el mismo build;
+    - la búsqueda vectorial de FAISS;
+
+con reciprocal rank fusion (RRF): cada lista aporta 1 / (RAG_RRF_K + rango)
+por chunk y se ordena por la suma.
+
+Camino rápido: si el mejor resultado léxico supera RAG_LEXICAL_FAST_PATH_SCORE
+y a la vez al segundo por un factor RAG_LEXICAL_FAST_PATH_RATIO, se responde
+solo con el índice léxico, sin embedding. Está desactivado por defecto (0);
+benchmarks/hybrid_retrieval_bench.py ayuda a elegir el umbral.
+
+RAG_RETRIEVAL_MODE: hybrid (por defecto), vector o lexical (solo BM25, sin
+embeddings; sin resultados si ninguna palabra coincide). Con un índice sin
+almacén léxico (legacy, o SQLite sin FTS5) se usa vector.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import os
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from app.core.metrics import RETRIEVALS
+from app.rag.chunk_store import ChunkStore
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+# Candidatos que aporta cada lista a la fusión
+RAG_HYBRID_FETCH_K = int(os.getenv("RAG_HYBRID_FETCH_K", "20"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Score BM25 mínimo del mejor resultado léxico para saltarse el embedding (0 = nunca)
+RAG_LEXICAL_FAST_PATH_SCORE = float(os.getenv("RAG_LEXICAL_FAST_PATH_SCORE", "0"))
+# ... y cuántas veces mejor que el segundo tiene que ser
+RAG_LEXICAL_FAST_PATH_RATIO = float(os.getenv("RAG_LEXICAL_FAST_PATH_RATIO", "1.25"))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RAG_RRF_K) -> List[str]:
+    """Ids ordenados por la suma de 1 / (k + rango) en cada lista (rango desde 1)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda cid: scores[cid], reverse=True)
+
+
+class HybridRetriever(VectorStoreRetriever):
+    """VectorStoreRetriever de FAISS + ChunkStore con fusión BM25/vectorial y camino rápido léxico."""
+
+    mode: str = RAG_RETRIEVAL_MODE
+    fetch_k: int = RAG_HYBRID_FETCH_K
+    rrf_k: int = RAG_RRF_K
+    fast_path_score: float = RAG_LEXICAL_FAST_PATH_SCORE
+    fast_path_ratio: float = RAG_LEXICAL_FAST_PATH_RATIO
+
+    def _lexical_store(self) -> Optional[ChunkStore]:
+        store = self.vectorstore.docstore
+        return store if isinstance(store, ChunkStore) and store.lexical else None
+
+    def _confident(self, lexical: List[Tuple[str, float]]) -> bool:
+        if self.fast_path_score <= 0 or not lexical:
+            return False
+        top = lexical[0][1]
+        second = lexical[1][1] if len(lexical) > 1 else 0.0
+        return top >= self.fast_path_score and top >= self.fast_path_ratio * second
+
+    def search_with_mode(self, query: str, run_manager=None) -> Tuple[List[Document], str]:
+        """Documentos para `query` y el modo con que se obtuvieron (vector, lexical, hybrid, fast_path)."""
+        if self.mode not in RETRIEVAL_MODES:
+            raise ValueError(f"RAG_RETRIEVAL_MODE desconocido: '{self.mode}' (válidos: {', '.join(RETRIEVAL_MODES)})")
+        k = self.search_kwargs.get("k", 4)
+        store = self._lexical_store()
+        if self.mode == "vector" or store is None:
+            return super()._get_relevant_documents(query, run_manager=run_manager), "vector"
+
+        lexical = store.lexical_search(query, max(self.fetch_k, k))
+        lexical_ids = [cid for cid, _ in lexical]
+        if self.mode == "lexical" or self._confident(lexical):
+            found = store.mget(lexical_ids[:k])
+            docs = [found[cid] for cid in lexical_ids[:k] if cid in found]
+            return docs, "lexical" if self.mode == "lexical" else "fast_path"
+
+        vector_docs = self.vectorstore.similarity_search(query, k=max(self.fetch_k, k))
+        by_id = {doc.metadata.get("chunk_id") or f"_vector{i}": doc for i, doc in enumerate(vector_docs)}
+        fused = reciprocal_rank_fusion([lexical_ids, list(by_id)], self.rrf_k)[:k]
+        by_id.update(store.mget([cid for cid in fused if cid not in by_id]))
+        return [by_id[cid] for cid in fused if cid in by_id], "hybrid"
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs
+    ) -> List[Document]:
+        docs, mode = self.search_with_mode(query, run_manager)
+        RETRIEVALS.inc(mode=mode)
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, **kwargs
+    ) -> List[Document]:
+        # SQLite y FAISS son síncronos: fuera del event loop
+        docs, mode = await asyncio.to_thread(self.search_with_mode, query)
+        RETRIEVALS.inc(mode=mode)
+        return docs
+
+
+def make_retriever(vectorstore, search_kwargs: Optional[Dict] = None, **options) -> HybridRetriever:
+    """Equivalente a vectorstore.as_retriever(search_kwargs=...) con búsqueda híbrida."""
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        search_kwargs=dict(search_kwargs or {}),
+        tags=vectorstore._get_retriever_tags(),
+        **options,
+    )
@@ -0,0 +1,200 @@
+# app/rag/index_versions.py
+
+"""
+index_versions.py
+----------------------------------
+Versiones del índice FAISS de contexto (despliegue blue/green).
+
+Cada reindexación escribe un directorio nuevo y nunca toca el que está
+sirviendo /ask:
+
+    hotel_context_faiss_index/
+        CURRENT                  ← id de la versión activa
+        versions/
+            20261018T101500123456-3f2a9c/   index.faiss, index.pkl, manifest.json, ...
+            ...
+
+Activar una versión es reemplazar CURRENT con os.replace (atómico): un
+lector ve la versión anterior o la nueva, nunca un índice a medio escribir.
+Se conservan las INDEX_KEEP_VERSIONS versiones anteriores para volver atrás
+al instante. Un índice con el formato antiguo (archivos directamente en
+hotel_context_faiss_index/) se sigue leyendo como versión "legacy" hasta la
+primera reindexación.
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+INDEX_ROOT = Path(os.getenv(
+    "RAG_INDEX_DIR", str(Path(__file__).parent.parent / "data" / "hotel_context_faiss_index")
+))
+VERSIONS_DIR = INDEX_ROOT / "versions"
+CURRENT_FILE = INDEX_ROOT / "CURRENT"
+# Versiones anteriores a la activa que se conservan para rollback
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+LEGACY_VERSION = "legacy"
+
+# Versiones en construcción en este proceso (prune no las toca)
+_building: Set[str] = set()
+# Un directorio sin index.faiss más viejo que esto es un build abandonado
+_STALE_BUILD_SECONDS = 6 * 3600
+
+
+class InvalidVersionId(ValueError):
+    """El id no puede ser el nombre de un directorio de versions/ (separadores, "..")."""
+
+
+class UnknownVersion(LookupError):
+    """El id no es una de las versiones conservadas."""
+
+
+def version_dir(version: str) -> Path:
+    if version == LEGACY_VERSION:
+        return INDEX_ROOT
+    # El id llega de CURRENT o de la API: solo un nombre dentro de versions/
+    if not version or version in (".", "..") or "/" in version or "\\" in version or Path(version).name != version:
+        raise InvalidVersionId(f"Id de versión inválido: {version!r}")
+    return VERSIONS_DIR / version
+
+
+def is_complete(version: str) -> bool:
+    return (version_dir(version) / "index.faiss").exists()
+
+
+def current_version() -> Optional[str]:
+    """Id de la versión activa; "legacy" si solo hay un índice con el formato antiguo."""
+    if CURRENT_FILE.exists():
+        version = CURRENT_FILE.read_text(encoding="utf-8").strip()
+        try:
+            if version and is_complete(version):
+                return version
+        except InvalidVersionId:
+            pass
+        logger.warning(f"CURRENT apunta a una versión inexistente ({version!r}); se ignora.")
+    if is_complete(LEGACY_VERSION):
+        return LEGACY_VERSION
+    return None
+
+
+def current_dir() -> Optional[Path]:
+    version = current_version()
+    return version_dir(version) if version else None
+
+
+def new_version() -> Tuple[str, Path]:
+    """Crea el directorio de una versión nueva (aún sin activar)."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    version = f"{stamp}-{uuid.uuid4().hex[:6]}"
+    path = VERSIONS_DIR / version
+    path.mkdir(parents=True)
+    _building.add(version)
+    return version, path
+
+
+def activate(version: str):
+    """Hace de `version` la versión activa (escritura atómica de CURRENT)."""
+    if not is_complete(version):
+        raise FileNotFoundError(f"La versión {version} no tiene un índice completo")
+    tmp = CURRENT_FILE.with_name(CURRENT_FILE.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, CURRENT_FILE)
+    _building.discard(version)
+    logger.info(f"Índice de contexto: versión activa {version}.")
+
+
+def discard(version: str):
+    """Borra una versión que no llegó a activarse (build fallido o sin cambios)."""
+    _building.discard(version)
+    if version != LEGACY_VERSION and version != current_version():
+        shutil.rmtree(version_dir(version), ignore_errors=True)
+
+
+def _versions() -> List[str]:
+    """Versiones completas, de la más antigua a la más nueva (el id empieza por la fecha)."""
+    if not VERSIONS_DIR.exists():
+        return []
+    return sorted(p.name for p in VERSIONS_DIR.iterdir() if p.is_dir() and is_complete(p.name))
+
+
+def _history() -> List[str]:
+    """Como _versions(), con el índice legacy (si existe) como la más antigua."""
+    return ([LEGACY_VERSION] if is_complete(LEGACY_VERSION) else []) + _versions()
+
+
+def resolve_version(version: str) -> str:
+    """
+    Valida un id recibido desde fuera: tiene que ser una de las versiones
+    conservadas (list_versions) o "legacy". Lanza InvalidVersionId o UnknownVersion.
+    """
+    version_dir(version)
+    if version not in _history():
+        raise UnknownVersion(f"La versión {version} no existe o no tiene un índice completo")
+    return version
+
+
+def previous_version(version: Optional[str] = None) -> Optional[str]:
+    """La versión inmediatamente anterior a `version` (por defecto, a la activa)."""
+    history = _history()
+    version = version or current_version()
+    if version not in history:
+        return history[-1] if history else None
+    position = history.index(version)
+    return history[position - 1] if position > 0 else None
+
+
+def list_versions() -> List[Dict]:
+    active = current_version()
+    result = []
+    for version in reversed(_history()):
+        manifest_path = version_dir(version) / "manifest.json"
+        files = chunks = None
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            files = len(manifest.get("files", {}))
+            chunks = sum(len(e.get("chunks", [])) for e in manifest.get("files", {}).values())
+        created = datetime.fromtimestamp((version_dir(version) / "index.faiss").stat().st_mtime, timezone.utc)
+        result.append({
+            "version": version,
+            "active": version == active,
+            "created_at": created.isoformat(timespec="seconds"),
+            "files": files,
+            "chunks": chunks,
+        })
+    return result
+
+
+def prune(keep: int = INDEX_KEEP_VERSIONS) -> List[str]:
+    """Borra las versiones más antiguas; quedan la activa y las `keep` más recientes además de ella."""
+    active = current_version()
+    others = [v for v in _versions() if v != active]
+    removed = others[:max(0, len(others) - keep)]
+    for version in removed:
+        shutil.rmtree(version_dir(version), ignore_errors=True)
+    # Directorios de builds interrumpidos (sin index.faiss); los recientes
+    # pueden ser de un build en curso en otro worker
+    if VERSIONS_DIR.exists():
+        for path in VERSIONS_DIR.iterdir():
+            if (path.is_dir() and not is_complete(path.name) and path.name not in _building
+                    and time.time() - path.stat().st_mtime > _STALE_BUILD_SECONDS):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path.name)
+    if removed:
+        logger.info(f"Índice de contexto: {len(removed)} versiones antiguas borradas.")
+    return removed
@@ -4,26 +4,52 @@
 rag_indexer.py
 ----------------------------------
 Builds or updates a FAISS index from uploaded Markdown files.
-Markdown files are not saved; only vector embeddings and metadata are persisted.
+Markdown files are not saved; only vector embeddings, chunk text and metadata
+are persisted (chunk text and metadata in the SQLite chunk store, chunks.sqlite).
+The chunk store also keeps a BM25 (FTS5) lexical index of the same chunks,
+updated by the same adds and deletes as FAISS, for hybrid retrieval.
 
 Each chunk stores:
   - source (file name)
   - section (nearest heading)
   - hierarchy (full path of parent headings)
-  - chunk_id (unique)
+  - chunk_id (content hash of source + hierarchy + text)
+
+Indexing is incremental. A per-file manifest (manifest.json) records the
+hash of every indexed file and the chunk ids it produced, so re-indexing:
+  - skips files whose bytes did not change,
+  - embeds only chunks whose content hash is not in the index yet,
+  - deletes the vectors of chunks that disappeared (edited sections,
+    removed files).
+
+The FAISS index type is configurable (RAG_INDEX_TYPE: flat, sq8, ivf_flat,
+ivf_sq8, ivf_pq, hnsw; see app/core/vector_index.py). Updates are applied
+on a flat index and converted to the configured type when saving.
+
+Builds never write over the index that is serving queries: the active
+version is loaded, updated in memory and saved to a new version directory
+(see index_versions.py), which the caller activates once it is complete.
 """
 
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict
-import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
 import json
 import logging
+import os
 import re
+import time
 
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_cohere import CohereEmbeddings
+
+from app.core.providers import get_embeddings
+from app.core.vector_index import FAISS_INDEX_TYPE, convert_vectorstore, to_flat
+from app.rag import index_versions
+from app.rag.chunk_store import CHUNK_DB_FILE, ChunkStore, fork_chunk_store, open_vectorstore
 
 from dotenv import load_dotenv
 load_dotenv()  # Carga variables de entorno desde .env si existe
@@ -31,14 +57,19 @@ load_dotenv()  # Carga variables de entorno desde .env si existe
 # ==========================================================
 # CONFIGURATION
 # ==========================================================
-INDEX_DIR = Path(__file__).parent.parent / "data/hotel_context_faiss_index"
-CHUNK_STORE_PATH = INDEX_DIR / "chunk_store.json"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
 EMBED_MODEL = "embed-multilingual-light-v3.0"
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 100
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", FAISS_INDEX_TYPE)
+
+# progress(phase, done, total); phases: loading, splitting, embedding, saving
+ProgressCallback = Callable[[str, int, int], None]
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-
 # ==========================================================
 # HELPER: Parse Markdown into hierarchical sections
 # ==========================================================
@@ -82,18 +113,125 @@ def parse_markdown_sections(md_text: str):
 
 
 # ==========================================================
-# CHUNK STORE UTILITIES
+# CHUNK IDS
+# ==========================================================
+def chunk_id(source: str, hierarchy: str, text: str) -> str:
+    """Content-addressed chunk id: same file, section path and text → same id."""
+    digest = hashlib.sha256("\x00".join((source, hierarchy, text)).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def file_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def split_markdown(content: bytes, fname: str) -> List[Document]:
+    """Splits one Markdown file into chunks with content-hash ids (duplicates within the file are dropped)."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks: Dict[str, Document] = {}
+
+    for sec in parse_markdown_sections(content.decode("utf-8")):
+        # Prepare LangChain Document
+        docs = [Document(
+            page_content=sec["content"],
+            metadata={
+                "source": fname,
+                "section": sec["heading"],
+                "hierarchy": " > ".join(sec["hierarchy"])
+            },
+        )]
+
+        # Split into smaller chunks
+        for c in splitter.split_documents(docs):
+            cid = chunk_id(fname, c.metadata["hierarchy"], c.page_content)
+            c.metadata["chunk_id"] = cid
+            chunks.setdefault(cid, c)
+
+    return list(chunks.values())
+
+
+# ==========================================================
+# MANIFEST UTILITIES
 # ==========================================================
-def load_chunk_store() -> Dict[str, Dict]:
-    if CHUNK_STORE_PATH.exists():
-        with open(CHUNK_STORE_PATH, "r", encoding="utf-8") as f:
+def _write_json(path: Path, data):
+    """Writes through a temp file so a crash never leaves half a JSON behind."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _empty_manifest() -> Dict:
+    return {"version": MANIFEST_VERSION, "embed_model": EMBED_MODEL, "files": {}}
+
+
+def load_manifest(index_dir: Path) -> Optional[Dict]:
+    path = index_dir / MANIFEST_FILE
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
-    return {}
+    return None
 
 
-def save_chunk_store(store: Dict[str, Dict]):
-    with open(CHUNK_STORE_PATH, "w", encoding="utf-8") as f:
-        json.dump(store, f, ensure_ascii=False, indent=2)
+def save_manifest(manifest: Dict, index_dir: Path):
+    _write_json(index_dir / MANIFEST_FILE, manifest)
+
+
+def _index_exists(index_dir: Optional[Path]) -> bool:
+    return index_dir is not None and (index_dir / "index.faiss").exists()
+
+
+def _save_index(vectorstore: FAISS, manifest: Dict, index_dir: Path):
+    """
+    Converts the flat index to RAG_INDEX_TYPE and writes the FAISS files and
+    the manifest of one index version. Chunk text lives in the chunk store,
+    which commits on every add/delete; index.pkl only keeps the position → id map.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    manifest["index"] = convert_vectorstore(vectorstore, RAG_INDEX_TYPE)
+    vectorstore.save_local(str(index_dir))
+    save_manifest(manifest, index_dir)
+
+
+def _indexed_ids(vectorstore: Optional[FAISS]) -> Set[str]:
+    return set(vectorstore.index_to_docstore_id.values()) if vectorstore is not None else set()
+
+
+def _adopt_legacy_index(vectorstore: FAISS) -> Dict:
+    """
+    Re-keys an index built before the manifest existed (random uuid4 ids) to
+    content-hash ids, drops duplicate chunks, and rebuilds the manifest from
+    the docstore. Vectors are kept, so nothing is re-embedded.
+    """
+    manifest = _empty_manifest()
+    docs: Dict[str, Document] = {}
+    mapping: Dict[int, str] = {}
+    duplicates: List[str] = []
+
+    for position, old_id in vectorstore.index_to_docstore_id.items():
+        doc = vectorstore.docstore.search(old_id)
+        if not isinstance(doc, Document):
+            continue
+        source = doc.metadata.get("source", "")
+        cid = chunk_id(source, doc.metadata.get("hierarchy", ""), doc.page_content)
+        if cid in docs:
+            duplicates.append(old_id)
+            docs[old_id], mapping[position] = doc, old_id
+            continue
+        doc.metadata["chunk_id"] = cid
+        docs[cid], mapping[position] = doc, cid
+        entry = manifest["files"].setdefault(source, {"sha256": None, "chunks": [], "indexed_at": None})
+        entry["chunks"].append(cid)
+
+    vectorstore.docstore = InMemoryDocstore(docs)
+    vectorstore.index_to_docstore_id = mapping
+    if duplicates:
+        vectorstore.delete(duplicates)
+    logger.info(
+        f"Adopted legacy index: {len(mapping) - len(duplicates)} chunks from "
+        f"{len(manifest['files'])} files ({len(duplicates)} duplicates removed)."
+    )
+    return manifest
 
 
 # ==========================================================
@@ -102,7 +240,12 @@ def save_chunk_store(store: Dict[str, Dict]):
 def index_markdown_contents(
     file_contents: List[bytes],
     filenames: List[str],
-    rebuild: bool = False
+    rebuild: bool = False,
+    full: bool = False,
+    delete: Optional[Iterable[str]] = None,
+    source_dir: Optional[Path] = None,
+    target_dir: Optional[Path] = None,
+    progress: Optional[ProgressCallback] = None
 ):
     """
     Builds or updates the FAISS index from Markdown file contents.
@@ -110,63 +253,172 @@ def index_markdown_contents(
     Parameters:
         file_contents : list of bytes for each uploaded file
         filenames     : list of filenames
-        rebuild       : if True, rebuilds index from scratch
+        rebuild       : if True, rebuilds index from scratch (re-embeds everything)
+        full          : if True, the upload is the whole corpus: indexed files
+                        that are not in it are removed
+        delete        : filenames to remove from the index
+        source_dir    : index to update (None: start empty)
+        target_dir    : where the result is written (None: source_dir, in place)
+        progress      : called as progress(phase, done, total) while building
+
+    Nothing is written when the index is unchanged, except an adopted legacy
+    index or new file hashes (result["persisted"]).
     """
-    chunk_store = load_chunk_store()
-    embeddings = CohereEmbeddings(model=EMBED_MODEL)
-    splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=100)
-    all_chunks = []
-
-    for content, fname in zip(file_contents, filenames):
-        text = content.decode("utf-8")
-        sections = parse_markdown_sections(text)
-
-        for sec in sections:
-            section_text = sec["content"]
-            section_heading = sec["heading"]
-            section_hierarchy = sec["hierarchy"]
-
-            # Prepare LangChain Document
-            docs = [Document(
-                page_content=section_text,
-                metadata={
-                    "source": fname,
-                    "section": section_heading,
-                    "hierarchy": " > ".join(section_hierarchy)
-                },
-            )]
-
-            # Split into smaller chunks
-            chunked_docs = splitter.split_documents(docs)
-            for c in chunked_docs:
-                cid = str(uuid.uuid4())
-                c.metadata["chunk_id"] = cid
-                chunk_store[cid] = {
-                    "text": c.page_content,
-                    "metadata": c.metadata
-                }
-                all_chunks.append(c)
-
-    if not all_chunks:
+    started = time.perf_counter()
+    target_dir = target_dir or source_dir
+    if target_dir is None:
+        raise ValueError("index_markdown_contents needs a source_dir or a target_dir")
+    report = progress or (lambda phase, done, total: None)
+    embeddings = get_embeddings(EMBED_MODEL, cached=True)
+    embeddings.progress = lambda done, total: report("embedding", done, total)
+    manifest = None if rebuild or source_dir is None else load_manifest(source_dir)
+    vectorstore = None
+    adopted = False
+    if not rebuild and _index_exists(source_dir):
+        report("loading", 0, 1)
+        vectorstore = open_vectorstore(source_dir, embeddings)
+        if manifest is None:
+            manifest, adopted = _adopt_legacy_index(vectorstore), True
+        elif manifest.get("embed_model") != EMBED_MODEL or manifest.get("version") != MANIFEST_VERSION:
+            logger.info("Embedding model or manifest version changed; rebuilding from scratch.")
+            vectorstore = None
+    if vectorstore is None:
+        logger.info("Building FAISS index from scratch.")
+        manifest = _empty_manifest()
+    elif to_flat(vectorstore, embeddings):
+        logger.info(f"Loaded {manifest.get('index', {}).get('factory')} index as flat for the update.")
+    # A new index type rebuilds the FAISS structure even if no chunk changed
+    index_type_changed = manifest.get("index", {}).get("requested", "flat") != RAG_INDEX_TYPE
+
+    files = manifest["files"]
+    indexed = _indexed_ids(vectorstore)
+    stats = {
+        "files_added": 0, "files_changed": 0, "files_unchanged": 0, "files_deleted": 0,
+        "chunks_added": 0, "chunks_deleted": 0, "chunks_kept": 0,
+    }
+    to_add: List[Document] = []
+    to_delete: Set[str] = set()
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    # Later uploads of the same filename win
+    uploads = dict(zip(filenames, file_contents))
+    for position, (fname, content) in enumerate(uploads.items()):
+        report("splitting", position, len(uploads))
+        digest = file_digest(content)
+        entry = files.get(fname)
+        if entry is not None and entry.get("sha256") == digest and vectorstore is not None:
+            stats["files_unchanged"] += 1
+            stats["chunks_kept"] += len(entry["chunks"])
+            continue
+
+        docs = split_markdown(content, fname)
+        new_ids = [d.metadata["chunk_id"] for d in docs]
+        to_delete |= set(entry["chunks"] if entry else []) - set(new_ids)
+        fresh = [d for d in docs if d.metadata["chunk_id"] not in indexed]
+        to_add.extend(fresh)
+        stats["files_changed" if entry is not None else "files_added"] += 1
+        stats["chunks_kept"] += len(docs) - len(fresh)
+        files[fname] = {"sha256": digest, "chunks": new_ids, "indexed_at": now}
+
+    removed = set(delete or [])
+    if full:
+        removed |= set(files) - set(uploads)
+    for fname in removed:
+        entry = files.pop(fname, None)
+        if entry is not None:
+            to_delete |= set(entry["chunks"])
+            stats["files_deleted"] += 1
+
+    # Never delete a chunk some file still references
+    referenced = {cid for entry in files.values() for cid in entry["chunks"]}
+    to_delete = (to_delete & indexed) - referenced
+
+    if not to_add and not to_delete and not index_type_changed and vectorstore is not None:
+        # Re-keyed legacy ids or new file hashes: same chunks, worth saving
+        persisted = bool(adopted or stats["files_changed"] or stats["files_added"])
+        if persisted:
+            fork_chunk_store(vectorstore, source_dir, target_dir)
+            _save_index(vectorstore, manifest, target_dir)
+        logger.info(f"FAISS index up to date ({stats['files_unchanged']} unchanged files).")
+        return {"status": "unchanged", "changed": False, "persisted": persisted, **stats}
+
+    # From here on writes go to the target version's chunk store
+    if vectorstore is not None:
+        fork_chunk_store(vectorstore, source_dir, target_dir)
+
+    if to_delete:
+        vectorstore.delete(list(to_delete))
+        stats["chunks_deleted"] = len(to_delete)
+
+    if to_add:
+        ids = [d.metadata["chunk_id"] for d in to_add]
+        if vectorstore is None:
+            (target_dir / CHUNK_DB_FILE).unlink(missing_ok=True)  # rebuild in place
+            docstore = ChunkStore(target_dir / CHUNK_DB_FILE)
+            vectorstore = FAISS.from_documents(to_add, embeddings, ids=ids, docstore=docstore)
+        else:
+            vectorstore.add_documents(to_add, ids=ids)
+        stats["chunks_added"] = len(to_add)
+
+    if vectorstore is None:
         logger.warning("No content found to index.")
-        return {"status": "empty"}
-
-    # Build or update FAISS
-    if rebuild or not INDEX_DIR.exists():
-        logger.info("Rebuilding FAISS index from scratch.")
-        vectorstore = FAISS.from_documents(all_chunks, embeddings)
-    else:
-        vectorstore = FAISS.load_local(
-            str(INDEX_DIR), embeddings, allow_dangerous_deserialization=True
+        return {"status": "empty", "changed": False, "persisted": False, **stats}
+
+    report("saving", 0, 1)
+    _save_index(vectorstore, manifest, target_dir)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Indexed {len(uploads)} markdowns in {elapsed:.2f}s: +{stats['chunks_added']} embedded, "
+        f"-{stats['chunks_deleted']} deleted, {stats['chunks_kept']} kept."
+    )
+    result = {
+        "status": "success",
+        "changed": True,
+        "persisted": True,
+        "chunks_indexed": len(vectorstore.index_to_docstore_id),
+        "seconds": round(elapsed, 3),
+        **stats,
+        "index": manifest["index"],
+    }
+    # Throughput of the embedding pipeline (batches, retries, chunks/s)
+    if to_add and getattr(embeddings, "last_report", None):
+        result["embedding"] = embeddings.last_report
+    return result
+
+
+def build_index_version(
+    file_contents: List[bytes],
+    filenames: List[str],
+    progress: Optional[ProgressCallback] = None,
+    **options
+) -> Tuple[Optional[str], Dict]:
+    """
+    Applies an update on top of the active index version and writes the
+    result to a new version directory. Returns (version, result); version is
+    None when nothing was written (the new directory is removed). The new
+    version is NOT activated: call index_versions.activate(version).
+    """
+    source_dir = index_versions.current_dir()
+    version, target_dir = index_versions.new_version()
+    try:
+        result = index_markdown_contents(
+            file_contents, filenames, source_dir=source_dir, target_dir=target_dir,
+            progress=progress, **options
         )
-        vectorstore.add_documents(all_chunks)
+    except BaseException:
+        index_versions.discard(version)
+        raise
+    if not result.get("persisted"):
+        index_versions.discard(version)
+        return None, result
+    result["version"] = version
+    return version, result
 
-    INDEX_DIR.mkdir(exist_ok=True)
-    vectorstore.save_local(str(INDEX_DIR))
-    save_chunk_store(chunk_store)
 
-    logger.info(f"Indexed {len(all_chunks)} chunks from {len(filenames)} markdowns.")
-    return {"status": "success", "chunks_indexed": len(all_chunks)}
+def delete_markdown_files(filenames: List[str], progress: Optional[ProgressCallback] = None):
+    """Removes every chunk of the given files from the index (into a new version)."""
+    return build_index_version([], [], progress=progress, delete=filenames)
 
 
 # ==========================================================
@@ -182,5 +434,7 @@ Private terrace, king bed, ocean view.
 ### Policies
 No pets allowed.
 """
-    result = index_markdown_contents([md_text], ["itzana_rooms.md"], rebuild=True)
+    version, result = build_index_version([md_text], ["itzana_rooms.md"], rebuild=True)
+    if version:
+        index_versions.activate(version)
     print(result)
@@ -5,33 +5,63 @@ rag_store.py
 ----------------------------------
 Gestiona el índice FAISS y expone un retriever global accesible
 desde cualquier parte del proyecto (por ejemplo, streaming_agent.py)
+
+El índice se carga una vez por proceso a través del registro de índices
+vectoriales (app/core/vector_registry.py), que además detecta cuando otro
+worker activa una versión nueva y la recarga. Los retrievers combinan FAISS
+con el índice léxico del ChunkStore (app/rag/hybrid_retriever.py).
 """
 
 from pathlib import Path
-import json
+from typing import Optional
 import logging
-from langchain_community.vectorstores import FAISS
-from langchain_cohere import CohereEmbeddings
 from langchain.tools.retriever import create_retriever_tool
+from app.core.providers import get_embeddings
+from app.core.tracing import TracedEmbeddings
+from app.core.vector_registry import VECTOR_INDEXES
+from app.rag import index_versions
+from app.rag.chunk_store import open_vectorstore
+from app.rag.hybrid_retriever import make_retriever
 from dotenv import load_dotenv
 load_dotenv()  # Carga variables de entorno desde .env si existe
 
-# Configuración
-INDEX_DIR = Path(__file__).parent.parent / "data/hotel_context_faiss_index" # se supone que esta bien
-CHUNK_STORE_PATH = INDEX_DIR / "chunk_store.json"
+# Configuración (el directorio del índice lo resuelve index_versions: versión activa)
 EMBED_MODEL = "embed-multilingual-light-v3.0"
+HOTEL_INDEX = "hotel_context"  # nombre en VECTOR_INDEXES
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+VECTOR_INDEXES.register(
+    HOTEL_INDEX,
+    resolve=index_versions.current_dir,
+    # Los chunks se leen del ChunkStore (SQLite) a medida que el retriever los pide
+    loader=open_vectorstore,
+    embeddings=lambda: TracedEmbeddings(get_embeddings(EMBED_MODEL), EMBED_MODEL),
+)
+
 # === Retriever global ===
 _hotel_retriever = None
+# Se incrementa cada vez que cambia el retriever; las cachés que dependen del
+# contenido del índice (respuestas, resultados de herramientas) lo comparan.
+_index_generation = 0
 
 
-def set_global_retriever(retriever):
-    """Guarda el retriever globalmente (se usa al iniciar o tras reindexar)."""
-    global _hotel_retriever
+def get_index_generation() -> int:
+    """Devuelve la generación actual del índice de contexto."""
+    return _index_generation
+
+
+def set_global_retriever(retriever, changed: bool = True):
+    """
+    Guarda el retriever globalmente (se usa al iniciar o tras reindexar).
+    changed=False: misma información que el anterior (p. ej. una versión nueva
+    sin cambios en los chunks), no invalida las cachés.
+    """
+    global _hotel_retriever, _index_generation
     _hotel_retriever = retriever
+    if changed:
+        _index_generation += 1
     try:
         from app.agent_tools.rag_tool import get_hotel_context_tool #ATTENTION
         get_hotel_context_tool()  # fuerza creación de tool si aún no existe
@@ -42,33 +72,48 @@ def set_global_retriever(retriever):
 
 
 def get_global_retriever():
-    """Devuelve el retriever global actual."""
-    global _hotel_retriever
-    # Inicialización automática del retriever global
-    if _hotel_retriever is None:
-        try:
-            _hotel_retriever = load_vectorstore().as_retriever(k=3)
-            logger.info("SUCCESS: Retriever global inicializado.")
-        except Exception as e:
+    """
+    Devuelve el retriever global actual. Si el registro cargó otra versión
+    del índice (la activó otro worker), el retriever se cambia por uno sobre
+    ella con los mismos search_kwargs.
+    """
+    try:
+        vectorstore = VECTOR_INDEXES.get(HOTEL_INDEX)
+    except Exception as e:
+        if _hotel_retriever is None:
             logger.error(f"❌ Error al inicializar el retriever global: {e}")
+        return _hotel_retriever
+    if _hotel_retriever is None:
+        set_global_retriever(make_retriever(vectorstore, {"k": 3}))
+        logger.info("SUCCESS: Retriever global inicializado.")
+    elif _hotel_retriever.vectorstore is not vectorstore:
+        set_global_retriever(make_retriever(vectorstore, _hotel_retriever.search_kwargs))
+        logger.info("SUCCESS: Retriever global actualizado a la versión nueva del índice.")
     return _hotel_retriever
 
 
 # === Carga básica del vectorstore ===
-def load_vectorstore():
-    if not INDEX_DIR.exists():
-        raise FileNotFoundError(f"FAISS index not found at {INDEX_DIR}")
-    embeddings = CohereEmbeddings(model=EMBED_MODEL)
-    logger.info("SUCCESS FAISS index cargado correctamente.")
-    return FAISS.load_local(
-        str(INDEX_DIR), embeddings, allow_dangerous_deserialization=True
-    )
+def load_vectorstore(index_dir: Optional[Path] = None):
+    """
+    Vectorstore de la versión activa (compartido en el proceso) o, con
+    `index_dir`, una carga nueva de ese directorio (p. ej. una versión por activar).
+    """
+    if index_dir is None:
+        try:
+            return VECTOR_INDEXES.get(HOTEL_INDEX)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"FAISS index not found at {index_versions.INDEX_ROOT}") from None
+    if not index_dir.exists():
+        raise FileNotFoundError(f"FAISS index not found at {index_dir}")
+    vectorstore = VECTOR_INDEXES.load(HOTEL_INDEX, index_dir)
+    logger.info(f"SUCCESS FAISS index cargado correctamente ({index_dir.name}).")
+    return vectorstore
 
 
-def get_retriever(k: int = 3):
-    """Crea un nuevo retriever a partir del vectorstore."""
-    vs = load_vectorstore()
-    return vs.as_retriever(search_kwargs={"k": k})
+def get_retriever(k: int = 3, index_dir: Optional[Path] = None):
+    """Crea un nuevo retriever a partir del vectorstore (sin volver a cargar el índice activo)."""
+    vs = load_vectorstore(index_dir)
+    return make_retriever(vs, {"k": k})
 
 
 def initialize_hotel_context_tool():
@@ -76,7 +121,7 @@ def initialize_hotel_context_tool():
     global _hotel_retriever
     try:
         if _hotel_retriever is None:
-            _hotel_retriever = load_vectorstore().as_retriever(k=3)
+            _hotel_retriever = make_retriever(load_vectorstore(), {"k": 3})
         tool = create_retriever_tool(
             retriever=_hotel_retriever,
             name="hotel_context_search",
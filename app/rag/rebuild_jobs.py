@@ -0,0 +1,232 @@
+# app/rag/rebuild_jobs.py
+
+"""
+rebuild_jobs.py
+----------------------------------
+Jobs de reindexación en segundo plano para /contextrebuild.
+
+El request ya no construye el índice: guarda los archivos subidos en disco
+(staging), encola un job y responde 202 con su id. Los jobs corren de a uno
+por proceso, porque cada build parte de la versión activa:
+
+    queued → running (loading, splitting, embedding, saving, activating) → succeeded | failed
+
+El build escribe una versión nueva del índice (app/rag/index_versions.py).
+Al terminar se carga, se activa, se instala en el registro de índices del
+proceso (app/core/vector_registry.py) y se cambia el retriever global con
+set_global_retriever: /ask sigue con la versión anterior hasta ese momento
+y nunca ve un índice a medio escribir. Los demás workers la recargan solos
+al ver el cambio de CURRENT. El rollback activa una versión anterior ya
+construida (solo hay que cargarla).
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+
+from app.core.metrics import INDEX_REBUILDS
+from app.rag import index_versions
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+# Jobs terminados que se recuerdan para GET /contextrebuild/jobs
+REBUILD_JOB_HISTORY = int(os.getenv("REBUILD_JOB_HISTORY", "50"))
+# k del retriever que se instala tras reindexar
+REBUILD_RETRIEVER_K = 3
+STAGING_DIR = index_versions.INDEX_ROOT / "staging"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class RebuildJob:
+    def __init__(self, kind: str, filenames: List[str], options: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.kind = kind  # "upload" | "delete"
+        self.filenames = filenames
+        self.options = options
+        self.status = "queued"
+        self.phase = "queued"
+        self.done = 0
+        self.total = 0
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.base_version: Optional[str] = None  # versión activa al empezar el build
+        self.version: Optional[str] = None  # versión nueva (si hubo cambios)
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.staging: Optional[Path] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def report(self, phase: str, done: int, total: int):
+        """Callback de progreso del indexador (se llama desde el hilo del build)."""
+        self.phase, self.done, self.total = phase, done, total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {
+                "phase": self.phase,
+                "done": self.done,
+                "total": self.total,
+                "fraction": round(self.done / self.total, 3) if self.total else None,
+            },
+            "files": self.filenames,
+            "options": self.options,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "base_version": self.base_version,
+            "version": self.version,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class RebuildJobs:
+    def __init__(self, history: int = REBUILD_JOB_HISTORY):
+        self.history = history
+        self._jobs: "OrderedDict[str, RebuildJob]" = OrderedDict()
+        # Un build a la vez; la activación (y el rollback) solo toman _swap_lock
+        self._build_lock = asyncio.Lock()
+        self._swap_lock = asyncio.Lock()
+        # Se llama con el retriever nuevo tras cada cambio de versión
+        self.on_swap: Optional[Callable[[Any], None]] = None
+
+    # ---------- consulta ----------
+    def get(self, job_id: str) -> Optional[RebuildJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    # ---------- alta ----------
+    async def submit_upload(self, files: List[Any], **options) -> RebuildJob:
+        """Guarda los UploadFile en staging (fuera del event loop) y encola el job."""
+        job = RebuildJob("upload", [f.filename for f in files], options)
+        job.staging = STAGING_DIR / job.job_id
+        await asyncio.to_thread(self._stage, job.staging, [f.file for f in files])
+        return self._start(job)
+
+    def submit_delete(self, filenames: List[str]) -> RebuildJob:
+        return self._start(RebuildJob("delete", list(filenames), {}))
+
+    @staticmethod
+    def _stage(staging: Path, sources: List[Any]):
+        # Por posición: el nombre original puede traer rutas
+        staging.mkdir(parents=True, exist_ok=True)
+        for position, source in enumerate(sources):
+            source.seek(0)
+            with open(staging / str(position), "wb") as out:
+                shutil.copyfileobj(source, out)
+
+    def _start(self, job: RebuildJob) -> RebuildJob:
+        self._jobs[job.job_id] = job
+        finished = [j for j in self._jobs.values() if j.finished]
+        for old in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[old.job_id]
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Reindexación {job.job_id} encolada ({job.kind}, {len(job.filenames)} archivos).")
+        return job
+
+    # ---------- ejecución ----------
+    async def _run(self, job: RebuildJob):
+        outcome = "failed"
+        async with self._build_lock:
+            job.status, job.started_at = "running", _now()
+            try:
+                job.base_version = index_versions.current_version()
+                job.version, job.result = await asyncio.to_thread(self._build, job)
+                if job.version is None:
+                    outcome = "unchanged"
+                else:
+                    job.report("activating", 0, 1)
+                    await self._activate(job.version, expected=job.base_version,
+                                         changed=bool(job.result.get("changed")))
+                    outcome = "activated"
+                job.status = "succeeded"
+                job.report("done", 1, 1)
+            except Exception as e:
+                if job.version is not None:
+                    index_versions.discard(job.version)
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+                logger.exception(f"ERROR en la reindexación {job.job_id}: {e}")
+            finally:
+                job.finished_at = _now()
+                if job.staging is not None:
+                    shutil.rmtree(job.staging, ignore_errors=True)
+                INDEX_REBUILDS.inc(status=outcome)
+        logger.info(f"Reindexación {job.job_id}: {job.status} ({outcome}).")
+
+    @staticmethod
+    def _build(job: RebuildJob):
+        from app.rag.rag_indexer import build_index_version, delete_markdown_files
+
+        if job.kind == "delete":
+            return delete_markdown_files(job.filenames, progress=job.report)
+        contents = [(job.staging / str(i)).read_bytes() for i in range(len(job.filenames))]
+        return build_index_version(contents, job.filenames, progress=job.report, **job.options)
+
+    async def _activate(self, version: str, expected: Optional[str] = None, changed: bool = True):
+        """
+        Carga `version`, la activa y cambia el retriever global. Con `expected`
+        falla si la versión activa ya no es esa (hubo un rollback durante el build).
+        changed=False: la versión nueva tiene los mismos chunks (no invalida cachés).
+        """
+        from app.core.vector_registry import VECTOR_INDEXES
+        from app.rag.rag_store import HOTEL_INDEX, get_retriever, set_global_retriever
+
+        path = index_versions.version_dir(version)
+        retriever = await asyncio.to_thread(get_retriever, REBUILD_RETRIEVER_K, path)
+        async with self._swap_lock:
+            if expected is not None and index_versions.current_version() != expected:
+                raise RuntimeError(
+                    f"La versión activa cambió durante el build ({expected} → "
+                    f"{index_versions.current_version()}); vuelve a lanzar la reindexación"
+                )
+            index_versions.activate(version)
+            # El registro del proceso pasa a esta copia (no la vuelve a leer del disco)
+            VECTOR_INDEXES.install(HOTEL_INDEX, path, retriever.vectorstore)
+            set_global_retriever(retriever, changed=changed)
+            if self.on_swap:
+                self.on_swap(retriever)
+        await asyncio.to_thread(index_versions.prune)
+
+    async def rollback(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Activa `version` (por defecto, la anterior a la activa). No espera a los
+        builds en curso. Lanza InvalidVersionId si el id no es válido y
+        UnknownVersion si no es una versión conservada.
+        """
+        previous = index_versions.current_version()
+        if version is not None:
+            # solo ids de versiones conservadas: nunca una ruta arbitraria
+            target = index_versions.resolve_version(version)
+        else:
+            target = index_versions.previous_version()
+            if target is None or not index_versions.is_complete(target):
+                raise index_versions.UnknownVersion(f"No hay una versión a la que volver ({target or 'ninguna anterior'})")
+        await self._activate(target)
+        INDEX_REBUILDS.inc(status="rollback")
+        logger.info(f"Rollback del índice de contexto: {previous} → {target}.")
+        return {"version": target, "previous": previous}
+
+
+REBUILD_JOBS = RebuildJobs()
@@ -4,8 +4,10 @@ Carga el índice FAISS existente y realiza búsqueda semántica pura.
 """
 
 import os, logging
-from langchain_community.vectorstores import FAISS
-from langchain_cohere import CohereEmbeddings
+from pathlib import Path
+from app.core.providers import get_embeddings
+from app.core.vector_index import read_vectorstore
+from app.core.vector_registry import VECTOR_INDEXES
 from dotenv import load_dotenv
 
 # ================= CONFIG =================
@@ -15,28 +17,31 @@ logging.basicConfig(level=logging.INFO)
 BASE_DIR = os.path.join(os.path.dirname(__file__), "../data/semantic_search_faiss_index")
 INDEX_NAME = "account_index"
 INDEX_PATH = os.path.join(BASE_DIR, INDEX_NAME)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+ACCOUNTS_INDEX = "accounts"  # nombre en VECTOR_INDEXES
 
-# ================= EMBEDDINGS =================
-embedding_model = CohereEmbeddings(
-    model="embed-multilingual-light-v3.0",
-    cohere_api_key=COHERE_API_KEY
+# ================= CARGA DEL ÍNDICE (perezosa) =================
+# El cliente de embeddings y el índice se crean en la primera búsqueda, no
+# al importar el módulo. El registro de índices lo comparte en el proceso y
+# lo recarga si semantic_search_load lo vuelve a generar.
+VECTOR_INDEXES.register(
+    ACCOUNTS_INDEX,
+    resolve=lambda: Path(INDEX_PATH),
+    loader=read_vectorstore,  # nprobe / efSearch (FAISS_NPROBE, FAISS_EF_SEARCH)
+    embeddings=lambda: get_embeddings("embed-multilingual-light-v3.0"),
 )
 
-# ================= CARGA DEL ÍNDICE =================
-try:
-    # Add logging to verify the exact path being used for the FAISS index.
-    logging.info(f"Verificando ruta del índice FAISS")
-    
-    vs = FAISS.load_local(INDEX_PATH, embedding_model, allow_dangerous_deserialization=True)
-    logging.info(f"Indice FAISS cargado")
-except Exception as e:
-    vs = None
-    logging.error(f"❌ No se pudo cargar el índice FAISS: {e}")
+
+def _get_vectorstore():
+    try:
+        return VECTOR_INDEXES.get(ACCOUNTS_INDEX)
+    except Exception as e:
+        logging.error(f"❌ No se pudo cargar el índice FAISS: {e}")
+        return None
 
 # ================= FUNCIONES =================
 def semantic_search(query: str, k: int = 5):
     """Busca las cuentas más similares semánticamente."""
+    vs = _get_vectorstore()
     if not vs:
         logging.error("El índice FAISS no está disponible.")
         return []
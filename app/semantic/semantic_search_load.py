@@ -7,7 +7,8 @@ Versión simplificada: conexión directa a PostgreSQL sin LangChain.
 import os, logging, shutil
 from sqlalchemy import create_engine, text
 from langchain_community.vectorstores import FAISS
-from langchain_cohere import CohereEmbeddings
+from app.core.providers import get_embeddings
+from app.core.vector_index import FAISS_INDEX_TYPE, convert_vectorstore
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 
@@ -20,19 +21,17 @@ PG_PORT = os.getenv("PG_PORT", 5432)
 PG_NAME = os.getenv("PG_DATABASE")
 PG_USER = os.getenv("PG_USER")
 PG_PASSWORD = os.getenv("PG_PASSWORD")
-COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 
 DATABASE_URL = f"postgresql+psycopg2://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_NAME}"
 
 BASE_DIR = os.path.join(os.path.dirname(__file__), "../data/semantic_search_faiss_index")
 INDEX_NAME = "account_index"
 INDEX_PATH = os.path.join(BASE_DIR, INDEX_NAME)
+# Tipo de índice FAISS (flat, sq8, ivf_flat, ivf_sq8, ivf_pq, hnsw; ver app/core/vector_index.py)
+ACCOUNTS_INDEX_TYPE = os.getenv("ACCOUNTS_INDEX_TYPE", FAISS_INDEX_TYPE)
 
 # ================= EMBEDDINGS =================
-embedding_model = CohereEmbeddings(
-    model="embed-multilingual-light-v3.0",
-    cohere_api_key=COHERE_API_KEY
-)
+embedding_model = get_embeddings("embed-multilingual-light-v3.0", cached=True)
 
 # ================= FUNCIONES =================
 def get_account_names() -> list[str]:
@@ -64,8 +63,12 @@ def build_index():
 
     # Crear vectorstore
     vectorstore = FAISS.from_documents(docs, embedding_model)
+    report = convert_vectorstore(vectorstore, ACCOUNTS_INDEX_TYPE)
     vectorstore.save_local(INDEX_PATH)
-    logging.info(f"Índice FAISS guardado en {INDEX_PATH}. Total: {len(names)} cuentas.")
+    logging.info(
+        f"Índice FAISS {report['factory']} guardado en {INDEX_PATH}. Total: {len(names)} cuentas, "
+        f"{report['bytes'] / 1e6:.1f} MB."
+    )
 
 # ================= MAIN =================
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+# app/streaming/admission.py
+
+"""
+Control de admisión para /ask (por worker).
+
+Cada run del agente ocupa un stream de gpt-4o y, según las herramientas, un
+proceso del sandbox o una conexión SQL. Sin límite, una ráfaga hace que
+todos los requests se vuelvan lentos a la vez y dispara los rate limits del
+proveedor. AdmissionController:
+
+    - permite ASK_MAX_CONCURRENT runs simultáneos;
+    - los demás esperan en una cola acotada (ASK_QUEUE_MAX) como mucho
+      ASK_QUEUE_TIMEOUT_SECONDS;
+    - la cola es justa entre clientes: round-robin por IP del peer y, dentro
+      de cada IP, por sesión (X-Session-Id o X-Client-Id), así un cliente que
+      manda muchas preguntas no adelanta a los demás. Las cabeceras solo
+      reparten el turno de su IP: rotarlas no da más plazas ni más turnos;
+    - si la cola está llena responde enseguida 503 (o 429 si es el cliente el
+      que ya tiene ASK_QUEUE_MAX_PER_CLIENT esperando) con Retry-After.
+
+La profundidad de la cola, los runs activos y el tiempo de espera se
+publican en /metrics.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from app.core.metrics import ADMISSION_WAIT_SECONDS, ADMISSIONS, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+ASK_MAX_CONCURRENT = int(os.getenv("ASK_MAX_CONCURRENT", "16"))
+ASK_QUEUE_MAX = int(os.getenv("ASK_QUEUE_MAX", "64"))
+ASK_QUEUE_MAX_PER_CLIENT = int(os.getenv("ASK_QUEUE_MAX_PER_CLIENT", "4"))
+ASK_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ASK_QUEUE_TIMEOUT_SECONDS", "15"))
+# Retry-After cuando todavía no hay duraciones medidas para estimarlo
+ASK_RETRY_AFTER_SECONDS = int(os.getenv("ASK_RETRY_AFTER_SECONDS", "5"))
+
+_MAX_RETRY_AFTER = 60
+# Peso de la última duración en la media móvil exponencial
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Plaza de ejecución concedida. release() es idempotente."""
+
+    def __init__(self, controller: "AdmissionController", key: str, waited: float):
+        self._controller = controller
+        self.key = key
+        self.waited = waited
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self.admitted_at)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = ASK_MAX_CONCURRENT,
+        queue_max: int = ASK_QUEUE_MAX,
+        queue_max_per_client: int = ASK_QUEUE_MAX_PER_CLIENT,
+        queue_timeout: float = ASK_QUEUE_TIMEOUT_SECONDS
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_max = queue_max
+        self.queue_max_per_client = queue_max_per_client
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        # IP → sesión → esperas en orden de llegada; el orden de cada dict es el turno round-robin
+        self._waiters: "OrderedDict[str, OrderedDict[str, Deque[asyncio.Future]]]" = OrderedDict()
+        # esperas por IP, para el límite por cliente
+        self._queued_by_key: Dict[str, int] = {}
+        self._queued = 0
+        self._avg_run_seconds: Optional[float] = None
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se libere una plaza para un request nuevo."""
+        if self._avg_run_seconds is None:
+            return ASK_RETRY_AFTER_SECONDS
+        estimate = self._avg_run_seconds * (self._queued + 1) / self.max_concurrent
+        return max(1, min(_MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    async def acquire(self, key: str, session: str = "") -> Ticket:
+        """Espera una plaza para `key` (la IP); `session` solo reparte el turno dentro de esa IP."""
+        started = time.monotonic()
+        if self.active < self.max_concurrent and self._queued == 0:
+            self.active += 1
+            return self._admitted(key, started, "admitted")
+
+        if self._queued >= self.queue_max:
+            ADMISSIONS.inc(result="rejected_full")
+            raise AdmissionRejected(503, "Servidor ocupado: cola de espera llena.", self.retry_after())
+        if self._queued_by_key.get(key, 0) >= self.queue_max_per_client:
+            ADMISSIONS.inc(result="rejected_client")
+            raise AdmissionRejected(429, "Demasiadas preguntas en espera para este cliente.", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, OrderedDict()).setdefault(session, deque()).append(future)
+        self._queued_by_key[key] = self._queued_by_key.get(key, 0) + 1
+        self._queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as err:
+            if future.done() and not future.cancelled():
+                # la plaza llegó justo al expirar/cancelarse: se devuelve
+                self._release(None)
+            else:
+                future.cancel()
+                self._remove(key, session, future)
+            if isinstance(err, asyncio.CancelledError):
+                ADMISSIONS.inc(result="abandoned")
+                raise
+            ADMISSIONS.inc(result="timeout")
+            ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started, result="timeout")
+            raise AdmissionRejected(503, "Tiempo de espera agotado en la cola.", self.retry_after())
+
+        return self._admitted(key, started, "queued")
+
+    def _admitted(self, key: str, started: float, result: str) -> Ticket:
+        waited = time.monotonic() - started
+        ADMISSIONS.inc(result=result)
+        ADMISSION_WAIT_SECONDS.observe(waited, result="admitted")
+        if waited > 0.5:
+            logger.info(f"Admisión de '{key}' tras {waited:.2f}s en cola")
+        return Ticket(self, key, waited)
+
+    def _remove(self, key: str, session: str, future: asyncio.Future):
+        sessions = self._waiters.get(key)
+        waiters = sessions.get(session) if sessions is not None else None
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            return
+        self._dequeued(key)
+        if not waiters:
+            del sessions[session]
+            if not sessions:
+                del self._waiters[key]
+
+    def _dequeued(self, key: str):
+        self._queued -= 1
+        if self._queued_by_key[key] <= 1:
+            del self._queued_by_key[key]
+        else:
+            self._queued_by_key[key] -= 1
+
+    def _release(self, run_seconds: Optional[float]):
+        if run_seconds is not None:
+            self._avg_run_seconds = run_seconds if self._avg_run_seconds is None else (
+                _EWMA_ALPHA * run_seconds + (1 - _EWMA_ALPHA) * self._avg_run_seconds
+            )
+        # La plaza pasa directamente al siguiente cliente en turno (round-robin por IP y luego por sesión)
+        while self._waiters:
+            key, sessions = next(iter(self._waiters.items()))
+            session, waiters = next(iter(sessions.items()))
+            future = waiters.popleft()
+            self._dequeued(key)
+            if waiters:
+                sessions.move_to_end(session)
+            else:
+                del sessions[session]
+            if sessions:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "queued": self._queued,
+            "queued_clients": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "avg_run_seconds": round(self._avg_run_seconds or 0.0, 3),
+        }
+
+
+ADMISSION = AdmissionController()
+REGISTRY.register_collector("kaana_admission", ADMISSION.stats)
+
+
+def client_key(request: Request) -> Tuple[str, str]:
+    """
+    Clave de equidad (IP del peer, sesión). El límite por cliente y el turno
+    van por IP; la sesión que declara el frontend (X-Session-Id o X-Client-Id)
+    la controla el cliente, así que solo subdivide el turno de su IP.
+    """
+    ip = request.client.host if request.client else "anon"
+    for header in ("x-session-id", "x-client-id"):
+        value = request.headers.get(header)
+        if value:
+            return ip, value[:128]
+    return ip, ""
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse que libera su plaza al terminar, incluso si el cliente corta antes del primer frame."""
+
+    def __init__(self, *args, ticket: Ticket, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
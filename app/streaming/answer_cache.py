@@ -0,0 +1,245 @@
+# app/streaming/answer_cache.py
+
+"""
+Caché semántica de respuestas delante de ask_streaming().
+
+Preguntas parafraseadas ("¿Qué amenidades tiene el hotel?" / "amenidades del
+resort") se comparan por similitud coseno de sus embeddings; si superan el
+umbral, la respuesta guardada se reproduce como un stream SSE normal sin
+ejecutar el bucle ReAct.
+
+Reglas:
+    - Solo primeras preguntas (message_history vacío): con historial la
+      respuesta depende del contexto de la conversación.
+    - No se guardan turnos que usaron herramientas con metadata["live_data"]
+      (web, SQL, sandbox), ni turnos cancelados o con error.
+    - Entradas con TTL y desalojo LRU.
+    - Se invalida sola cuando cambia la generación del índice RAG
+      (set_global_retriever tras /contextrebuild).
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.request_context import RequestContext
+from app.core.tracing import TracedEmbeddings, span
+from app.streaming.event_handler import DONE_FRAME, format_answer
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+EMBED_MODEL = "embed-multilingual-light-v3.0"
+
+# Tamaño de los frames `answer` al reproducir una respuesta guardada
+_REPLAY_CHUNK_CHARS = 64
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sin signos de puntuación y con espacios colapsados."""
+    text = re.sub(r"[¿?¡!.,;:\"']", " ", question.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _index_generation() -> int:
+    try:
+        from app.rag.rag_store import get_index_generation
+        return get_index_generation()
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("question", "vector", "answer", "created_at", "hits")
+
+    def __init__(self, question: str, vector: np.ndarray, answer: str):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.created_at = time.monotonic()
+        self.hits = 0
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        embed_fn: Optional[Callable[[str], List[float]]] = None
+    ):
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._embed_fn = embed_fn
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # clave: pregunta normalizada, orden LRU
+        # (created_at, clave) en orden de inserción, para expirar por TTL sin recorrer todo
+        self._expiry: "deque[Tuple[float, str]]" = deque()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._generation = _index_generation()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- embeddings ----------
+    def _embed(self, text: str) -> np.ndarray:
+        if self._embed_fn is None:
+            from app.core.providers import get_embeddings
+            self._embed_fn = TracedEmbeddings(get_embeddings(EMBED_MODEL), EMBED_MODEL).embed_query
+        vector = np.asarray(self._embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # ---------- mantenimiento ----------
+    def _check_generation(self):
+        generation = _index_generation()
+        if generation != self._generation:
+            if self._entries:
+                logger.info(f"Índice RAG actualizado (gen {generation}); se invalida la caché de respuestas.")
+            self.clear()
+            self._generation = generation
+
+    def _expire(self):
+        """Quita las entradas vencidas desde la más vieja; para en la primera vigente."""
+        now = time.monotonic()
+        expired = False
+        while self._expiry and now - self._expiry[0][0] > self.ttl:
+            created_at, key = self._expiry.popleft()
+            entry = self._entries.get(key)
+            # la clave pudo haberse desalojado (LRU) o reemplazado por un put() posterior
+            if entry is not None and entry.created_at == created_at:
+                del self._entries[key]
+                expired = True
+        if expired:
+            self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._expiry.clear()
+        self._matrix = None
+        self._keys = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---------- API ----------
+    def lookup(self, question: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Busca una respuesta para `question`. Devuelve (respuesta | None, vector).
+        El vector se devuelve para reutilizarlo en put() si hubo miss.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._check_generation()
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:  # coincidencia exacta: no hace falta embedding
+                return self._hit(key, entry, 1.0), entry.vector
+
+        vector = self._embed(question)
+
+        with self._lock:
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries.keys())
+                    self._matrix = np.stack([self._entries[k].vector for k in self._keys])
+                scores = self._matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._keys[best]
+                    return self._hit(key, self._entries[key], float(scores[best])), vector
+
+            self.misses += 1
+        return None, vector
+
+    def _hit(self, key: str, entry: _Entry, score: float) -> str:
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        logger.info(f"Caché de respuestas: hit (similitud {score:.3f}) para '{entry.question[:60]}'")
+        return entry.answer
+
+    def put(self, question: str, vector: np.ndarray, answer: str):
+        key = normalize_question(question)
+        with self._lock:
+            self._check_generation()
+            entry = _Entry(question, vector, answer)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._expiry.append((entry.created_at, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+ANSWER_CACHE = SemanticAnswerCache()
+
+
+def replay_answer(answer: str) -> List[bytes]:
+    """Frames SSE equivalentes a un stream normal de la respuesta guardada."""
+    frames = [
+        format_answer(answer[i:i + _REPLAY_CHUNK_CHARS])
+        for i in range(0, len(answer), _REPLAY_CHUNK_CHARS)
+    ]
+    frames.append(DONE_FRAME)
+    return frames
+
+
+async def with_answer_cache(
+    question: str,
+    message_history: List[Dict],
+    ctx: RequestContext,
+    run: Callable[[], AsyncIterator[bytes]],
+    cache: SemanticAnswerCache = ANSWER_CACHE
+) -> AsyncIterator[bytes]:
+    """Envuelve `run()` (el stream de ask_streaming) con la caché semántica."""
+    if not ANSWER_CACHE_ENABLED or message_history or not question.strip():
+        async for frame in run():
+            yield frame
+        return
+
+    with span("answer_cache") as cache_span:
+        try:
+            answer, vector = await asyncio.to_thread(cache.lookup, question)
+        except Exception as e:
+            logger.warning(f"Caché de respuestas no disponible: {e}")
+            answer, vector = None, None
+        if cache_span is not None:
+            cache_span.set(hit=answer is not None)
+
+    if answer is not None:
+        ctx.answer_cache = "hit"
+        ctx.answer_parts.append(answer)
+        for frame in replay_answer(answer):
+            yield frame
+        return
+
+    ctx.answer_cache = "miss"
+    async for frame in run():
+        yield frame
+
+    if vector is not None and not (ctx.failed or ctx.cancelled or ctx.live_data_used) and ctx.answer.strip():
+        cache.put(question, vector, ctx.answer)
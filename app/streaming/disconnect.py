@@ -0,0 +1,83 @@
+# app/streaming/disconnect.py
+
+"""
+Cancelación del trabajo de /ask cuando el cliente SSE se desconecta.
+
+El generador de ask_streaming se consume en una tarea aparte que deja los
+frames en una cola. Mientras tanto se consulta periódicamente si el cliente
+sigue conectado; si no, se cancela esa tarea. La cancelación llega al await
+en curso: el stream del LLM se cierra, las tareas de herramientas pendientes
+se cancelan (execute_tool_calls) y los procesos del sandbox se terminan
+(ProcessLane).
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator
+
+from app.core.request_context import RequestContext
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se verifica si el cliente sigue conectado (segundos)
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+_END = object()
+
+
+async def stream_until_disconnect(
+    request,
+    generator: AsyncIterator[bytes],
+    ctx: RequestContext,
+    poll_interval: float = DISCONNECT_POLL_SECONDS
+) -> AsyncIterator[bytes]:
+    """Reenvía los frames de `generator` y lo cancela si `request` se desconecta."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+
+    async def _produce():
+        async for frame in generator:
+            await queue.put(frame)
+        await queue.put(_END)
+
+    producer = asyncio.create_task(_produce())
+    abandoned = False
+    loop = asyncio.get_running_loop()
+    last_check = loop.time()
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                frame = None
+                if producer.done() and queue.empty():
+                    await producer  # propaga la excepción del generador, si la hubo
+                    return
+
+            if frame is _END:
+                return
+            if frame is not None:
+                yield frame
+
+            # Verificación periódica (no por frame) para no pagarla en cada token
+            if frame is None or loop.time() - last_check >= poll_interval:
+                last_check = loop.time()
+                if await request.is_disconnected():
+                    abandoned = True
+                    return
+    finally:
+        if not producer.done():
+            ctx.cancelled = True
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+        await generator.aclose()
+        if abandoned or ctx.cancelled:
+            _log_abandoned(ctx)
+
+
+def _log_abandoned(ctx: RequestContext):
+    ctx.cancelled = True
+    logger.info(f"Request {ctx.request_id} abandonado por el cliente; trabajo evitado: {ctx.saved_work()}")
@@ -1,19 +1,122 @@
 import json
-from typing import Any, AsyncIterator, Dict, Optional
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 import datetime
 
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+# Ventana de agrupación de tokens `answer` (0 desactiva cada criterio)
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "20"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "64"))
+
+DONE_FRAME = b"event: done\ndata: {}\n\n"
+
+
+def _timestamp() -> str:
+    """Sello de tiempo UTC sin zona (mismo formato que datetime.utcnow().isoformat())."""
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None).isoformat()
+
+
 def _encode(data: Any) -> str:
     """Codifica el dato como JSON válido para SSE."""
     if isinstance(data, str):
-        return json.dumps({"content": data, "timestamp": datetime.datetime.utcnow().isoformat()})
+        return json.dumps({"content": data, "timestamp": _timestamp()})
     try:
         payload = dict(data)
-        payload["timestamp"] = datetime.datetime.utcnow().isoformat()
+        payload["timestamp"] = _timestamp()
         return json.dumps(payload, ensure_ascii=False)
     except Exception:
-        return json.dumps({"content": str(data), "timestamp": datetime.datetime.utcnow().isoformat()})
+        return json.dumps({"content": str(data), "timestamp": _timestamp()})
+
+
+# ==========================
+# FRAMES PRE-CODIFICADOS
+# ==========================
+def format_event(event_type: str, data: Any) -> bytes:
+    """Devuelve el evento SSE completo (event + data) como un único frame de bytes."""
+    return f"event: {event_type}\ndata: {_encode(data)}\n\n".encode("utf-8")
+
+
+def format_answer(content: str) -> bytes:
+    """Camino rápido para tokens `answer`: sin dict intermedio."""
+    return (
+        'event: answer\ndata: {"content": '
+        + json.dumps(content, ensure_ascii=False)
+        + ', "timestamp": "' + _timestamp() + '"}\n\n'
+    ).encode("utf-8")
+
+
+def format_error(message: str, code: Optional[int] = None) -> bytes:
+    """Frame de error estándar."""
+    error_data: Dict[str, Any] = {"error": message}
+    if code:
+        error_data["code"] = code
+    return format_event("error", error_data)
+
+
+class AnswerCoalescer:
+    """
+    Agrupa tokens `answer` consecutivos en un solo frame.
+
+    El primer token de la respuesta sale de inmediato (no retrasa el TTFT).
+    Después, `push()` devuelve un frame cuando el buffer supera `max_bytes` o
+    cuando el primer token pendiente lleva más de `window_ms`; en otro caso
+    devuelve None. Como `push()` solo corre al llegar un token, quien produce
+    debe esperar el siguiente como mucho `time_left()` segundos y llamar a
+    `flush()` si vence (ver streaming._astream_with_deadline). Antes de emitir
+    cualquier otro evento (y al terminar) hay que llamar a `flush()` para no
+    perder ni reordenar tokens. Con ambos límites en 0 cada token sale en su
+    propio frame.
+    """
+
+    def __init__(self, window_ms: float = SSE_COALESCE_MS, max_bytes: int = SSE_COALESCE_BYTES):
+        self.window = window_ms / 1000.0
+        self.max_bytes = max_bytes
+        self._parts: List[str] = []
+        self._size = 0
+        self._since = 0.0
+        self._first_sent = False
+
+    def push(self, token: str) -> Optional[bytes]:
+        if not token:
+            return None
+        if not self._first_sent or (self.window <= 0 and self.max_bytes <= 0):
+            self._first_sent = True
+            return format_answer(token)
+
+        if not self._parts:
+            self._since = time.monotonic()
+        self._parts.append(token)
+        self._size += len(token.encode("utf-8"))
+
+        if self.max_bytes > 0 and self._size >= self.max_bytes:
+            return self.flush()
+        if self.window > 0 and time.monotonic() - self._since >= self.window:
+            return self.flush()
+        return None
+
+    def time_left(self) -> Optional[float]:
+        """Segundos hasta que vence la ventana de lo pendiente (None si no hay nada o no hay ventana)."""
+        if not self._parts or self.window <= 0:
+            return None
+        return max(0.0, self._since + self.window - time.monotonic())
+
+    def flush(self) -> Optional[bytes]:
+        if not self._parts:
+            return None
+        content = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return format_answer(content)
 
 
+# ==========================
+# API ANTERIOR (async generators)
+# ==========================
+# Se conserva por compatibilidad y como referencia del benchmark
+# (benchmarks/sse_encoder_bench.py). El streaming usa los frames de arriba.
 async def send_event(event_type: str, data: Any) -> AsyncIterator[str]:
     """Genera un evento SSE con tipo y datos."""
     yield f"event: {event_type}\n"
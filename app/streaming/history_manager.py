@@ -0,0 +1,247 @@
+# app/streaming/history_manager.py
+
+"""
+Presupuesto de tokens para el historial que se envía al LLM.
+
+Sin límite, el prompt crece con cada turno del cliente y con cada
+ToolMessage, y con él la latencia y el costo. HistoryManager:
+
+    - recorta cada salida de herramienta a TOOL_OUTPUT_MAX_TOKENS;
+    - al construir el historial conserva los turnos más recientes que caben
+      en HISTORY_TOKEN_BUDGET y condensa los más viejos en un resumen
+      extractivo (sin llamar al LLM);
+    - entre iteraciones, si el historial supera el presupuesto, reduce las
+      salidas de herramientas de iteraciones anteriores a un extracto corto
+      (las de la última iteración quedan completas);
+    - lleva la cuenta de los tokens ahorrados por request.
+
+Los tokens se cuentan con tiktoken (codificación del modelo del agente); si
+la codificación no está disponible se estima con len(texto) / 4.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage
+)
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "16000"))
+# Turnos recientes (mensajes del cliente) que nunca se descartan
+HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", "4"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "400"))
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "2000"))
+TOOL_OUTPUT_SUMMARY_TOKENS = int(os.getenv("TOOL_OUTPUT_SUMMARY_TOKENS", "200"))
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-4o")
+
+# Tokens fijos por mensaje en el formato de chat de OpenAI
+_MESSAGE_OVERHEAD = 4
+# Tokens por mensaje del cliente que entran al resumen de turnos descartados
+_SUMMARY_LINE_TOKENS = 40
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+
+# ==========================
+# CONTEO DE TOKENS
+# ==========================
+def get_encoder():
+    """Codificación tiktoken del modelo (se carga una vez; None si no está disponible)."""
+    global _encoder, _encoder_loaded
+    if _encoder_loaded:
+        return _encoder
+    with _encoder_lock:
+        if not _encoder_loaded:
+            try:
+                import tiktoken
+                _encoder = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+            except Exception as e:
+                logger.warning(f"tiktoken no disponible ({e}); se estimarán los tokens por longitud.")
+                _encoder = None
+            _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoder = get_encoder()
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Conserva el inicio de `text` hasta `max_tokens` y marca lo omitido."""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    encoder = get_encoder()
+    if encoder is None:
+        head = text[:max_tokens * 4]
+    else:
+        head = encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    return f"{head}\n[... {total - max_tokens} tokens omitidos ...]"
+
+
+def _content_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, ensure_ascii=False, default=str)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    tokens = _MESSAGE_OVERHEAD + count_tokens(_content_text(message))
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        tokens += count_tokens(json.dumps(
+            [{"name": c.get("name"), "args": c.get("args")} for c in tool_calls],
+            ensure_ascii=False,
+            default=str
+        ))
+    return tokens
+
+
+def history_tokens(messages: List[BaseMessage]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+# ==========================
+# GESTOR POR REQUEST
+# ==========================
+class HistoryManager:
+    def __init__(
+        self,
+        budget: int = HISTORY_TOKEN_BUDGET,
+        keep_messages: int = HISTORY_KEEP_MESSAGES,
+        tool_output_max_tokens: int = TOOL_OUTPUT_MAX_TOKENS,
+        tool_summary_tokens: int = TOOL_OUTPUT_SUMMARY_TOKENS
+    ):
+        self.budget = budget
+        self.keep_messages = keep_messages
+        self.tool_output_max_tokens = tool_output_max_tokens
+        self.tool_summary_tokens = tool_summary_tokens
+        self.tokens_saved = 0
+        self.dropped_messages = 0
+        self.compacted_tool_outputs = 0
+        self.last_prompt_tokens = 0
+        self._compacted_ids = set()
+
+    # ---------- construcción ----------
+    def build(self, system_prompt: str, message_history: List[Dict], question: str) -> List[BaseMessage]:
+        """Historial inicial: prompt de sistema + turnos que caben en el presupuesto + pregunta."""
+        turns: List[BaseMessage] = []
+        for msg in message_history:
+            if msg.get("role") == "user":
+                turns.append(HumanMessage(content=msg["content"]))
+            elif msg.get("role") in ["agent", "assistant"]:
+                turns.append(AIMessage(content=msg["content"]))
+
+        system = SystemMessage(content=system_prompt)
+        current = HumanMessage(content=question)
+        fixed = message_tokens(system) + message_tokens(current)
+
+        # Se conservan los turnos más recientes mientras quepan; si no caben
+        # todos, se reserva espacio para el resumen de los descartados
+        limit = self.budget
+        if fixed + history_tokens(turns) > limit:
+            limit -= HISTORY_SUMMARY_TOKENS
+
+        kept: List[BaseMessage] = []
+        used = fixed
+        for index, message in enumerate(reversed(turns)):
+            tokens = message_tokens(message)
+            if index >= self.keep_messages and used + tokens > limit:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+
+        dropped = turns[:len(turns) - len(kept)]
+        chat_history: List[BaseMessage] = [system]
+        if dropped:
+            summary = self._summarize(dropped)
+            chat_history.append(summary)
+            self.dropped_messages = len(dropped)
+            self.tokens_saved += max(0, history_tokens(dropped) - message_tokens(summary))
+        chat_history.extend(kept)
+        chat_history.append(current)
+
+        self.last_prompt_tokens = history_tokens(chat_history)
+        return chat_history
+
+    def _summarize(self, messages: List[BaseMessage]) -> SystemMessage:
+        """Resumen extractivo de los turnos descartados: el inicio de cada mensaje."""
+        lines = []
+        for message in messages:
+            role = "Usuario" if isinstance(message, HumanMessage) else "Asistente"
+            text = " ".join(_content_text(message).split())
+            lines.append(f"- {role}: {truncate_to_tokens(text, _SUMMARY_LINE_TOKENS)}")
+        body = truncate_to_tokens("\n".join(lines), HISTORY_SUMMARY_TOKENS)
+        return SystemMessage(content=f"Resumen de turnos anteriores de la conversación:\n{body}")
+
+    # ---------- herramientas ----------
+    def tool_message(self, result: Any, tool_call_id: str) -> ToolMessage:
+        """ToolMessage con la salida de la herramienta recortada a tool_output_max_tokens."""
+        content = str(result)
+        truncated = truncate_to_tokens(content, self.tool_output_max_tokens)
+        if truncated is not content:
+            self.tokens_saved += max(0, count_tokens(content) - count_tokens(truncated))
+        return ToolMessage(content=truncated, tool_call_id=tool_call_id)
+
+    def compact(self, chat_history: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Antes de cada llamada al LLM: si el historial supera el presupuesto,
+        reduce a un extracto las salidas de herramientas de iteraciones
+        anteriores (todas salvo las que siguen al último AIMessage).
+        Modifica la lista en sitio y la devuelve.
+        """
+        total = history_tokens(chat_history)
+        if total > self.budget:
+            last_ai = max(
+                (i for i, m in enumerate(chat_history) if isinstance(m, AIMessage)),
+                default=len(chat_history)
+            )
+            for i, message in enumerate(chat_history[:last_ai]):
+                if total <= self.budget:
+                    break
+                if not isinstance(message, ToolMessage) or message.tool_call_id in self._compacted_ids:
+                    continue
+                before = message_tokens(message)
+                short = ToolMessage(
+                    content=truncate_to_tokens(_content_text(message), self.tool_summary_tokens),
+                    tool_call_id=message.tool_call_id
+                )
+                after = message_tokens(short)
+                if after < before:
+                    chat_history[i] = short
+                    total -= before - after
+                    self.tokens_saved += before - after
+                    self.compacted_tool_outputs += 1
+                self._compacted_ids.add(message.tool_call_id)
+
+        self.last_prompt_tokens = total
+        return chat_history
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.last_prompt_tokens,
+            "tokens_saved": self.tokens_saved,
+            "dropped_messages": self.dropped_messages,
+            "compacted_tool_outputs": self.compacted_tool_outputs,
+        }
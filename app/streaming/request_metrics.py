@@ -0,0 +1,94 @@
+# app/streaming/request_metrics.py
+
+"""
+Métricas a nivel de request para /ask.
+
+`with_request_metrics()` envuelve el stream completo (incluida la caché de
+respuestas), así que mide lo que ve el cliente:
+    - TTFT: tiempo hasta el primer frame `answer`;
+    - duración total y resultado (completed, failed, cancelled, cache_hit).
+
+Con `emit_event=True` envía un evento SSE `metrics` justo antes de `done`
+con el resumen del request (ver RequestContext.metrics_summary()).
+
+También abre el span raíz `request` de la traza (ver app/core/tracing.py).
+"""
+
+import logging
+import os
+from typing import AsyncIterator
+
+from app.core.metrics import (
+    ITERATIONS,
+    REGISTRY,
+    REQUEST_SECONDS,
+    REQUESTS,
+    TTFT_SECONDS
+)
+from app.core.request_context import RequestContext
+from app.core.tracing import span
+from app.streaming.answer_cache import ANSWER_CACHE
+from app.streaming.event_handler import DONE_FRAME, format_event
+from app.streaming.tool_cache import TOOL_CACHE
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+# Valor por defecto de AskRequest.include_metrics
+SSE_METRICS_EVENT = os.getenv("SSE_METRICS_EVENT", "0") == "1"
+
+_ANSWER_PREFIX = b"event: answer\n"
+
+REGISTRY.register_collector("kaana_answer_cache", ANSWER_CACHE.stats)
+REGISTRY.register_collector("kaana_tool_cache", TOOL_CACHE.stats)
+
+
+def _outcome(ctx: RequestContext) -> str:
+    if ctx.cancelled:
+        return "cancelled"
+    if ctx.failed:
+        return "failed"
+    if ctx.answer_cache == "hit":
+        return "cache_hit"
+    return "completed"
+
+
+def observe_request(ctx: RequestContext):
+    outcome = _outcome(ctx)
+    REQUESTS.inc(outcome=outcome)
+    REQUEST_SECONDS.observe(ctx.elapsed_ms / 1000, outcome=outcome)
+    if ctx.ttft_ms is not None:
+        TTFT_SECONDS.observe(ctx.ttft_ms / 1000, cache="hit" if ctx.answer_cache == "hit" else "miss")
+    if ctx.iterations:
+        ITERATIONS.observe(ctx.iterations)
+    logger.info(
+        f"[{ctx.request_id}] {outcome}: ttft={ctx.ttft_ms}ms total={ctx.elapsed_ms}ms "
+        f"iteraciones={ctx.iterations} tokens={ctx.prompt_tokens}+{ctx.completion_tokens}"
+    )
+
+
+async def with_request_metrics(
+    ctx: RequestContext,
+    generator: AsyncIterator[bytes],
+    emit_event: bool = SSE_METRICS_EVENT
+) -> AsyncIterator[bytes]:
+    with span("request", request_id=ctx.request_id, question=ctx.question) as root:
+        try:
+            async for frame in generator:
+                if ctx.ttft_ms is None and frame.startswith(_ANSWER_PREFIX):
+                    ctx.ttft_ms = ctx.elapsed_ms
+                if emit_event and frame == DONE_FRAME:
+                    yield format_event("metrics", ctx.metrics_summary())
+                yield frame
+        finally:
+            observe_request(ctx)
+            if root is not None:
+                root.set(
+                    outcome=_outcome(ctx),
+                    ttft_ms=ctx.ttft_ms,
+                    iterations=ctx.iterations,
+                    prompt_tokens=ctx.prompt_tokens,
+                    completion_tokens=ctx.completion_tokens,
+                )
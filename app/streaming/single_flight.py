@@ -0,0 +1,191 @@
+# app/streaming/single_flight.py
+
+"""
+Single-flight para preguntas idénticas simultáneas.
+
+Cuando muchos clientes envían la misma primera pregunta a la vez (un
+boletín, un aviso de recepción), solo el primero ejecuta el agente. Los
+demás se suscriben a su stream: reciben los frames ya emitidos (replay) y
+luego la cola en vivo. N requests idénticos cuestan un solo run.
+
+Clave: pregunta normalizada + PROMPT_VERSION, solo con message_history
+vacío (con historial la respuesta depende de la conversación).
+
+El run corre en una tarea propia con su propio RequestContext, no atado a
+ningún cliente: si el primero se desconecta los demás siguen recibiendo y
+el run termina normalmente (la caché de respuestas guarda el resultado).
+Al terminar, el resultado del run (fallo, respuesta, tokens, iteraciones)
+se copia al contexto de cada suscriptor. Solo cuando se van todos los
+suscriptores el run se marca cancelado y se cancela (igual que un /ask
+abandonado).
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.core.metrics import REGISTRY, SINGLE_FLIGHT
+from app.core.request_context import RequestContext
+from app.prompt.enhanced_prompt import PROMPT_VERSION
+from app.streaming.answer_cache import normalize_question
+from app.streaming.event_handler import DONE_FRAME
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+
+
+# Campos del contexto del run que se copian a cada suscriptor
+_OUTCOME_FIELDS = (
+    "failed", "answer_cache", "live_data_used", "max_iterations", "iterations", "llm_calls",
+    "tool_calls_started", "tool_calls_completed", "tool_cache_hits", "prompt_tokens",
+    "completion_tokens", "history",
+)
+_OUTCOME_LISTS = ("answer_parts", "tools_used", "iteration_timings", "tool_timings")
+
+
+class _Flight:
+    def __init__(self, key: Tuple[str, str], leader: RequestContext):
+        self.key = key
+        self.request_id = leader.request_id  # request que inició el run
+        # Contexto propio del run: no se marca cancelado si se va solo el que lo inició
+        self.ctx = RequestContext(request_id=leader.request_id, question=leader.question)
+        self.frames: List[bytes] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+
+    def publish(self, frame: bytes):
+        self.frames.append(frame)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.finished = True
+        self.error = error
+        self._wake()
+
+    def copy_outcome(self, ctx: RequestContext):
+        """Copia el resultado del run al contexto de un suscriptor."""
+        for name in _OUTCOME_FIELDS:
+            setattr(ctx, name, getattr(self.ctx, name))
+        for name in _OUTCOME_LISTS:
+            setattr(ctx, name, list(getattr(self.ctx, name)))
+
+    def _wake(self):
+        # cada cambio despierta a los que esperan y deja un Event nuevo para la siguiente espera
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(f.subscribers for f in self._flights.values()),
+        }
+
+    async def _run(self, flight: _Flight, run: Callable[[RequestContext], AsyncIterator[bytes]]):
+        error = None
+        try:
+            async for frame in run(flight.ctx):
+                flight.publish(frame)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            logger.error(f"Single-flight {flight.request_id}: el run falló: {e}")
+            error = e
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight.finish(error)
+
+    async def stream(
+        self,
+        key: Tuple[str, str],
+        ctx: RequestContext,
+        run: Callable[[RequestContext], AsyncIterator[bytes]]
+    ) -> AsyncIterator[bytes]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key, ctx)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(flight, run))
+            ctx.single_flight = "leader"
+        else:
+            ctx.single_flight = "follower"
+            logger.info(
+                f"[{ctx.request_id}] Pregunta idéntica en curso: se une al run {flight.request_id} "
+                f"({len(flight.frames)} frames ya emitidos)"
+            )
+        SINGLE_FLIGHT.inc(role=ctx.single_flight)
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = flight.changed
+                # replay de lo ya emitido y luego la cola en vivo
+                while index < len(flight.frames):
+                    frame = flight.frames[index]
+                    index += 1
+                    if frame == DONE_FRAME:
+                        # el evento `metrics` sale justo antes de `done`: que vea el resultado
+                        flight.copy_outcome(ctx)
+                    yield frame
+                if flight.finished:
+                    break
+                await changed.wait()
+
+            flight.copy_outcome(ctx)
+            if isinstance(flight.error, Exception):
+                ctx.failed = True
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.finished and flight.task is not None:
+                # ya no queda nadie escuchando: se cancela el run
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.ctx.cancelled = True
+                flight.task.cancel()
+
+
+SINGLE_FLIGHT_RUNS = SingleFlight()
+REGISTRY.register_collector("kaana_single_flight", SINGLE_FLIGHT_RUNS.stats)
+
+
+def single_flight_key(question: str) -> Tuple[str, str]:
+    return normalize_question(question), PROMPT_VERSION
+
+
+async def with_single_flight(
+    question: str,
+    message_history: List[Dict],
+    ctx: RequestContext,
+    run: Callable[[RequestContext], AsyncIterator[bytes]],
+    flights: SingleFlight = SINGLE_FLIGHT_RUNS
+) -> AsyncIterator[bytes]:
+    """
+    Envuelve `run(ctx_del_run)` para que preguntas idénticas simultáneas
+    compartan un solo run. Sin single-flight, `run` recibe el propio `ctx`.
+    """
+    if not SINGLE_FLIGHT_ENABLED or message_history or not question.strip():
+        async for frame in run(ctx):
+            yield frame
+        return
+
+    async for frame in flights.stream(single_flight_key(question), ctx, run):
+        yield frame
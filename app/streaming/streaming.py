@@ -1,27 +1,36 @@
 # app/streaming/streaming.py
 
+import asyncio
 import logging
 import json
-from typing import AsyncIterator, List, Dict, Any
+import time
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
-from langchain_core.messages import (
-    HumanMessage,
-    AIMessage,
-    SystemMessage,
-    ToolMessage
-)
+from langchain_core.messages import HumanMessage
 
 from app.core.llm_state import LLM
+from app.core.metrics import (
+    LLM_SECONDS,
+    LLM_TTFT_SECONDS,
+    PROMPT_TOKENS,
+    TOKENS,
+    TOOL_PHASE_SECONDS
+)
+from app.core.request_context import RequestContext, set_current
+from app.core.tracing import record_span, span
 from app.agent_tools.tool_getter import get_agent_tools
 from app.streaming.lazy_loading import bind_tools
-from app.streaming.tool_execution import execute_tool
+from app.streaming.tool_execution import execute_tool_calls
+from app.streaming.tool_executors import close_process_session
+from app.streaming.history_manager import HistoryManager, count_tokens
 from app.utilities.photo_uploader import upload_first_photo_found
 from app.prompt.enhanced_prompt import get_enhanced_prompt
 
 from app.streaming.event_handler import (
-    send_event,
-    send_done,
-    send_error
+    AnswerCoalescer,
+    DONE_FRAME,
+    format_answer,
+    format_event
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -33,167 +42,306 @@ llm_with_tools = bind_tools(tools, force_rebind=False)
 tools_map = {t.name: t for t in tools}
 
 
+def _record_llm_call(ctx: RequestContext, phase: str, response, started: float,
+                     first_chunk_at: Optional[float], estimated_prompt_tokens: int) -> Dict[str, Any]:
+    """
+    Registra una llamada al LLM en las métricas y como span `llm_call`. Usa
+    usage_metadata (stream_usage) si el proveedor lo envía; si no, estima los
+    tokens con tiktoken.
+    """
+    elapsed = time.perf_counter() - started
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens") or estimated_prompt_tokens
+    completion_tokens = usage.get("output_tokens")
+    if completion_tokens is None:
+        completion_tokens = count_tokens(str(getattr(response, "content", "") or ""))
+        for call in getattr(response, "tool_calls", None) or []:
+            completion_tokens += count_tokens(json.dumps(call.get("args", {}), ensure_ascii=False))
+
+    LLM_SECONDS.observe(elapsed, phase=phase)
+    if first_chunk_at is not None:
+        LLM_TTFT_SECONDS.observe(first_chunk_at - started, phase=phase)
+    PROMPT_TOKENS.observe(prompt_tokens, phase=phase)
+    TOKENS.inc(prompt_tokens, kind="prompt")
+    TOKENS.inc(completion_tokens, kind="completion")
+    ctx.prompt_tokens += prompt_tokens
+    ctx.completion_tokens += completion_tokens
+    record_span(
+        "llm_call", "llm", started,
+        phase=phase,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        first_chunk_ms=round((first_chunk_at - started) * 1000, 2) if first_chunk_at else None,
+        tool_calls=len(getattr(response, "tool_calls", None) or []),
+    )
+
+    return {
+        "llm_ms": round(elapsed * 1000, 2),
+        "llm_first_chunk_ms": round((first_chunk_at - started) * 1000, 2) if first_chunk_at else None,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    }
+
+
+_STREAM_END = object()
+
+
+async def _astream_with_deadline(stream: AsyncIterator[Any], coalescer: AnswerCoalescer
+                                 ) -> AsyncIterator[Tuple[Any, Optional[bytes]]]:
+    """
+    Recorre `stream` entregando (chunk, None). Si hay tokens pendientes en el
+    coalescer y su ventana vence antes del siguiente chunk, entrega (None, frame)
+    con lo pendiente: así una pausa del modelo (p. ej. antes de un tool call)
+    no retiene tokens ya recibidos.
+
+    El stream se consume en una tarea aparte que llena una cola; esperar la
+    cola con timeout no cancela el stream del modelo.
+    """
+    if coalescer.window <= 0:
+        async for chunk in stream:
+            yield chunk, None
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in stream:
+                queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        queue.put_nowait(_STREAM_END)
+
+    producer = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), coalescer.time_left())
+            except asyncio.TimeoutError:
+                yield None, coalescer.flush()
+                continue
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item, None
+    finally:
+        producer.cancel()
+
+
 async def ask_streaming(
     question: str,
     message_history: List[Dict] = [],
-    max_iterations: int = 8
-) -> AsyncIterator[str]:
+    max_iterations: int = 8,
+    ctx: Optional[RequestContext] = None
+) -> AsyncIterator[bytes]:
+
+    ctx = ctx or RequestContext(question=question)
+    ctx.max_iterations = max_iterations
+    set_current(ctx)
+    history: Optional[HistoryManager] = None
 
     try:
-        logger.info(f"Starting REAL streaming for question: {question[:60]}")
+        logger.info(f"[{ctx.request_id}] Starting REAL streaming for question: {question[:60]}")
 
         if not question.strip():
-            async for c in send_event("answer", "Por favor proporciona una pregunta válida."):
-                yield c
-            async for c in send_done():
-                yield c
+            yield format_event("answer", "Por favor proporciona una pregunta válida.")
+            yield DONE_FRAME
             return
 
         prompt = get_enhanced_prompt(question, bool(tools))
 
         # =======================
-        # Historia EXACTA original
+        # Historia con presupuesto de tokens (ver history_manager.py)
         # =======================
-        chat_history = [SystemMessage(content=prompt)]
-
-        for msg in message_history:
-            if msg.get("role") == "user":
-                chat_history.append(HumanMessage(content=msg["content"]))
-            elif msg.get("role") in ["agent", "assistant"]:
-                chat_history.append(AIMessage(content=msg["content"]))
-
-        chat_history.append(HumanMessage(content=question))
+        history = HistoryManager()
+        chat_history = history.build(prompt, message_history, question)
 
         tool_log: List[Dict[str, Any]] = []
         url_image = None
+        coalescer = AnswerCoalescer()
 
         # ========================
         # LOOP PRINCIPAL ReAct
         # ========================
         for iteration in range(max_iterations):
-            logger.info(f"Iteration {iteration+1}/{max_iterations}")
-
-            try:
-                # invoke() EXACTO como el agente original
-                response = llm_with_tools.invoke(chat_history)
-                tool_calls = getattr(response, "tool_calls", None)
-
-                # ========================
-                # SIN TOOL CALLS → FINAL
-                # ========================
-                if not tool_calls:
-                    # Buscar imagen opcional
-                    try:
-                        url_image = upload_first_photo_found()
-                    except Exception as e:
-                        logger.error(f"Error buscando imágenes: {e}")
-
-                    # STREAMING REAL DEL LLM
-                    async for chunk in llm_with_tools.astream(chat_history):
-                        if hasattr(chunk, "content") and chunk.content:
-                            async for c in send_event("answer", {"content": chunk.content}):
-                                yield c
-
-                    if url_image:
-                        async for c in send_event("answer", {"content": f"![image]({url_image})"}):
-                            yield c
-
-                    if tool_log:
-                        async for c in send_event("tool_log", tool_log):
-                            yield c
-
-                    async for c in send_done():
-                        yield c
-                    return
-
-                # ==========================================
-                # HAY TOOL CALLS
-                # ==========================================
-                chat_history.append(response)
-
-                for tool_call in tool_calls:
-                    tool_name = tool_call.get("name")
-                    tool_args = tool_call.get("args", {})
-                    tool_id = tool_call.get("id")
-
-                    # log interno
-                    tool_log.append({
-                        "iteration": iteration + 1,
-                        "tool_name": tool_name,
-                        "tool_args": tool_args
-                    })
-
-                    # Evento SSE: inicio de herramienta
-                    async for c in send_event("tool_usage", f"Iniciando herramienta: {tool_name}"):
-                        yield c
-
-                    # Ejecutar herramienta (igual que antes)
-                    tool = tools_map.get(tool_name)
-
-                    if tool is None:
-                        error_msg = f"Herramienta '{tool_name}' no encontrada"
-                        chat_history.append(ToolMessage(content=error_msg, tool_call_id=tool_id))
-                        async for c in send_event("tool_usage", error_msg):
-                            yield c
-                        continue
-
-                    result = await execute_tool(
-                        tool,
-                        tool_name,
-                        tool_args,
+            logger.info(f"[{ctx.request_id}] Iteration {iteration+1}/{max_iterations}")
+            ctx.iterations = iteration + 1
+
+            with span("iteration", iteration=iteration + 1):
+                try:
+                    # =====================================================
+                    # Una sola llamada en streaming por iteración: el
+                    # contenido se reenvía como `answer` al llegar y los
+                    # tool_call_chunks se acumulan en el mensaje agregado.
+                    # =====================================================
+                    response = None
+                    answer_start = len(ctx.answer_parts)
+                    ctx.llm_calls += 1
+                    history.compact(chat_history)
+                    llm_started = time.perf_counter()
+                    first_chunk_at = None
+                    async for chunk, pending in _astream_with_deadline(llm_with_tools.astream(chat_history), coalescer):
+                        if pending:
+                            yield pending
+                            continue
+                        if first_chunk_at is None:
+                            first_chunk_at = time.perf_counter()
+                        response = chunk if response is None else response + chunk
+                        if chunk.content:
+                            ctx.answer_parts.append(chunk.content)
+                            frame = coalescer.push(chunk.content)
+                            if frame:
+                                yield frame
+
+                    frame = coalescer.flush()
+                    if frame:
+                        yield frame
+
+                    timing = {"iteration": iteration + 1}
+                    timing.update(_record_llm_call(
+                        ctx, "iteration", response, llm_started, first_chunk_at, history.last_prompt_tokens
+                    ))
+                    ctx.iteration_timings.append(timing)
+
+                    tool_calls = getattr(response, "tool_calls", None) if response is not None else None
+
+                    # ========================
+                    # SIN TOOL CALLS → FINAL
+                    # ========================
+                    if not tool_calls:
+                        # Buscar imagen opcional (I/O bloqueante → hilo aparte)
+                        try:
+                            url_image = await asyncio.to_thread(upload_first_photo_found)
+                        except Exception as e:
+                            logger.error(f"Error buscando imágenes: {e}")
+
+                        if url_image:
+                            ctx.answer_parts.append(f"![image]({url_image})")
+                            yield format_answer(f"![image]({url_image})")
+
+                        if tool_log:
+                            yield format_event("tool_log", tool_log)
+
+                        yield DONE_FRAME
+                        return
+
+                    # ==========================================
+                    # HAY TOOL CALLS
+                    # ==========================================
+                    # El texto que acompañó a los tool calls ("Déjame revisar...") no es
+                    # parte de la respuesta final: fuera de ctx.answer (caché de respuestas)
+                    del ctx.answer_parts[answer_start:]
+                    chat_history.append(response)
+
+                    for tool_call in tool_calls:
+                        tool_name = tool_call.get("name")
+
+                        # log interno
+                        tool_log.append({
+                            "iteration": iteration + 1,
+                            "tool_name": tool_name,
+                            "tool_args": tool_call.get("args", {})
+                        })
+
+                        # Evento SSE: inicio de herramienta
+                        yield format_event("tool_usage", f"Iniciando herramienta: {tool_name}")
+
+                    # Ejecutar herramientas en paralelo; los eventos salen según terminan
+                    results: Dict[int, Any] = {}
+                    tools_started = time.perf_counter()
+                    async for index, tool_call, result in execute_tool_calls(
+                        tool_calls,
+                        tools_map,
                         iteration + 1,
                         tool_log
-                    )
+                    ):
+                        results[index] = result
+                        tool_name = tool_call.get("name")
 
-                    # agregar resultado a la historia
-                    chat_history.append(
-                        ToolMessage(content=str(result), tool_call_id=tool_id)
-                    )
+                        if tool_name not in tools_map:
+                            yield format_event("tool_usage", result)
+                            continue
 
-                    # evento SSE: completado
-                    async for c in send_event("tool_usage", f"Completado: {tool_name}"):
-                        yield c
+                        # evento SSE: completado
+                        yield format_event("tool_usage", f"Completado: {tool_name}")
 
-            except Exception as err:
-                logger.error(f"Error in iteration: {err}")
+                    tool_phase = time.perf_counter() - tools_started
+                    TOOL_PHASE_SECONDS.observe(tool_phase)
+                    timing["tool_ms"] = round(tool_phase * 1000, 2)
 
-                async for c in send_event(
-                    "answer",
-                    {"content": "Ocurrió un error procesando tu consulta."}
-                ):
-                    yield c
+                    # agregar resultados a la historia en el orden original de tool_call_id
+                    for index, tool_call in enumerate(tool_calls):
+                        chat_history.append(history.tool_message(results[index], tool_call.get("id")))
 
-                async for c in send_done():
-                    yield c
-                return
+                except asyncio.CancelledError:
+                    logger.info(f"[{ctx.request_id}] Streaming cancelado durante la iteración {iteration+1}.")
+                    raise
+
+                except Exception as err:
+                    logger.error(f"Error in iteration: {err}")
+                    ctx.failed = True
+
+                    frame = coalescer.flush()
+                    if frame:
+                        yield frame
+
+                    yield format_answer("Ocurrió un error procesando tu consulta.")
+                    yield DONE_FRAME
+                    return
 
         # ================================
         # LÍMITE DE ITERACIONES
         # ================================
-        final_prompt = chat_history + [
+        final_prompt = history.compact(chat_history) + [
             HumanMessage(content="Proporciona una respuesta final basada en todo lo anterior.")
         ]
 
-        async for chunk in llm_with_tools.astream(final_prompt):
+        ctx.llm_calls += 1
+        llm_started = time.perf_counter()
+        first_chunk_at = None
+        response = None
+        async for chunk, pending in _astream_with_deadline(llm_with_tools.astream(final_prompt), coalescer):
+            if pending:
+                yield pending
+                continue
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            response = chunk if response is None else response + chunk
             if hasattr(chunk, "content") and chunk.content:
-                async for c in send_event("answer", {"content": chunk.content}):
-                    yield c
+                ctx.answer_parts.append(chunk.content)
+                frame = coalescer.push(chunk.content)
+                if frame:
+                    yield frame
+
+        frame = coalescer.flush()
+        if frame:
+            yield frame
+
+        final_timing = {"iteration": "final"}
+        final_timing.update(_record_llm_call(
+            ctx, "final", response, llm_started, first_chunk_at, history.last_prompt_tokens
+        ))
+        ctx.iteration_timings.append(final_timing)
 
         if tool_log:
-            async for c in send_event("tool_log", tool_log):
-                yield c
+            yield format_event("tool_log", tool_log)
 
-        async for c in send_done():
-            yield c
+        yield DONE_FRAME
 
     except Exception as critical:
         logger.error(f"Critical error: {critical}")
-
-        async for c in send_event(
-            "answer",
-            {"content": "Error crítico inesperado. Intenta nuevamente."}
-        ):
-            yield c
-
-        async for c in send_done():
-            yield c
+        ctx.failed = True
+
+        yield format_answer("Error crítico inesperado. Intenta nuevamente.")
+        yield DONE_FRAME
+
+    finally:
+        # el proceso del sandbox de este request (variables del REPL) ya no se usa
+        close_process_session(ctx.request_id)
+        if history is not None:
+            ctx.history = history.report()
+            logger.info(
+                f"[{ctx.request_id}] Historial: {ctx.history['prompt_tokens']} tokens en el último prompt, "
+                f"{ctx.history['tokens_saved']} ahorrados"
+            )
@@ -0,0 +1,186 @@
+# app/streaming/tool_cache.py
+
+"""
+Memoización de resultados de herramientas.
+
+La clave es el nombre de la herramienta + sus argumentos normalizados. Cada
+herramienta declara su política en `tool.metadata["cache"]`:
+
+    {"policy": "index"}                          hasta que cambie la generación
+                                                 del índice RAG (reindexación)
+    {"policy": "ttl", "ttl": 10800}              durante `ttl` segundos
+    {"policy": "watermark", "watermark": fn}     hasta que cambie fn() (marca de
+                                                 agua de los datos, p. ej. max(loaded_at))
+
+Opcional: "casefold": True para comparar los argumentos de texto sin
+mayúsculas (consultas en lenguaje natural; no para SQL).
+
+Sin "cache" la herramienta no se memoiza (p. ej. python_sandbox).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "1") == "1"
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+# Cada cuánto se vuelve a consultar una marca de agua (segundos)
+WATERMARK_CHECK_SECONDS = float(os.getenv("WATERMARK_CHECK_SECONDS", "60"))
+
+_MISSING = object()
+
+
+def _normalize(value: Any, casefold: bool) -> Any:
+    if isinstance(value, str):
+        value = re.sub(r"\s+", " ", value).strip()
+        return value.casefold() if casefold else value
+    if isinstance(value, dict):
+        return {k: _normalize(v, casefold) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v, casefold) for v in value]
+    return value
+
+
+def make_key(tool_name: str, tool_args: Dict[str, Any], casefold: bool = False) -> str:
+    args = _normalize(tool_args or {}, casefold)
+    return tool_name + ":" + json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _index_generation() -> int:
+    try:
+        from app.rag.rag_store import get_index_generation
+        return get_index_generation()
+    except Exception:
+        return 0
+
+
+class ToolResultCache:
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float, Any]]" = OrderedDict()
+        self._watermarks: Dict[Callable, Tuple[Any, float]] = {}
+        self._watermark_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.per_tool: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def policy_of(tool) -> Optional[Dict[str, Any]]:
+        policy = (getattr(tool, "metadata", None) or {}).get("cache")
+        if not TOOL_CACHE_ENABLED or not policy or policy.get("policy") not in ("index", "ttl", "watermark"):
+            return None
+        return policy
+
+    # ---------- marcas de validez ----------
+    def _watermark(self, fn: Callable) -> Any:
+        """Valor actual de la marca de agua, consultado como mucho cada WATERMARK_CHECK_SECONDS."""
+        now = time.monotonic()
+        with self._watermark_lock:
+            cached = self._watermarks.get(fn)
+            if cached and now - cached[1] < WATERMARK_CHECK_SECONDS:
+                return cached[0]
+        value = fn()
+        with self._watermark_lock:
+            self._watermarks[fn] = (value, now)
+        return value
+
+    async def _stamp(self, policy: Dict[str, Any]) -> Any:
+        kind = policy["policy"]
+        if kind == "index":
+            return _index_generation()
+        if kind == "watermark":
+            return await asyncio.to_thread(self._watermark, policy["watermark"])
+        return None
+
+    # ---------- API ----------
+    async def get(self, tool, tool_args: Dict[str, Any]) -> Tuple[Any, Optional[str], Any]:
+        """
+        Devuelve (resultado | _MISSING, estado, marca) con estado "hit", "miss"
+        o None si la herramienta no se memoiza. En un miss, `marca` es la
+        marca de validez tomada antes de ejecutar la herramienta: hay que
+        pasársela a put() para no sellar con una marca nueva un resultado
+        calculado sobre datos anteriores.
+        """
+        policy = self.policy_of(tool)
+        if policy is None:
+            return _MISSING, None, _MISSING
+
+        stamp: Any = None
+        if policy["policy"] != "ttl":
+            try:
+                stamp = await self._stamp(policy)
+            except Exception as e:
+                logger.warning(f"No se pudo verificar la vigencia de {tool.name}: {e}")
+                stamp = _MISSING
+
+        key = make_key(tool.name, tool_args, policy.get("casefold", False))
+        entry = self._entries.get(key)
+        if entry is not None:
+            result, created_at, stored_stamp = entry
+            if policy["policy"] == "ttl":
+                fresh = time.monotonic() - created_at <= float(policy.get("ttl", 3600))
+            else:
+                fresh = stamp is not _MISSING and stored_stamp == stamp
+            if fresh:
+                self._entries.move_to_end(key)
+                self._count(tool.name, "hit")
+                return result, "hit", stamp
+            self._entries.pop(key, None)
+
+        self._count(tool.name, "miss")
+        return _MISSING, "miss", stamp
+
+    async def put(self, tool, tool_args: Dict[str, Any], result: Any, stamp: Any):
+        """Guarda `result` con la marca que devolvió get() antes de ejecutar la herramienta."""
+        policy = self.policy_of(tool)
+        if policy is None or stamp is _MISSING:
+            return
+        # Las herramientas SQL devuelven los errores como texto: no se memoizan
+        if isinstance(result, str) and result.startswith("Error"):
+            return
+
+        key = make_key(tool.name, tool_args, policy.get("casefold", False))
+        self._entries[key] = (result, time.monotonic(), stamp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, tool_name: str, status: str):
+        if status == "hit":
+            self.hits += 1
+        else:
+            self.misses += 1
+        counters = self.per_tool.setdefault(tool_name, {"hit": 0, "miss": 0})
+        counters[status] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._watermarks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "per_tool": self.per_tool,
+        }
+
+
+TOOL_CACHE = ToolResultCache()
+
+
+def is_miss(value: Any) -> bool:
+    return value is _MISSING
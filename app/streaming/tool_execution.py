@@ -1,10 +1,69 @@
 # app/streaming/tool_execution.py
 
+import asyncio
+import logging
+import os
+import time
+
+from app.core.metrics import TOOL_CALLS, TOOL_SECONDS
+from app.core.request_context import get_current
+from app.core.tracing import current_span, span
+from app.streaming.tool_executors import run_tool
+from app.streaming.tool_cache import TOOL_CACHE, is_miss
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+# Máximo de herramientas ejecutándose a la vez dentro de una iteración
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+# Tiempo máximo por herramienta (segundos)
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+
+
+def _record_tool_metrics(tool_name, iteration, status, started, execution="", cache=None):
+    """Registra la llamada en las métricas globales y en el contexto del request."""
+    elapsed = time.perf_counter() - started
+    TOOL_CALLS.inc(tool=tool_name, status=status)
+    TOOL_SECONDS.observe(elapsed, tool=tool_name, execution=execution or "unknown")
+    ctx = get_current()
+    if ctx is not None:
+        entry = {"iteration": iteration, "tool": tool_name, "status": status, "ms": round(elapsed * 1000, 2)}
+        if execution:
+            entry["execution"] = execution
+        if cache:
+            entry["cache"] = cache
+        ctx.tool_timings.append(entry)
+
+
 async def execute_tool(tool, tool_name, tool_args, iteration, tool_log):
     """
     Ejecuta una herramienta LangChain (async o sync) y registra su uso en tool_log,
     siguiendo el modelo del código 1.
+
+    Nunca bloquea el event loop: la herramienta corre según su política
+    (async, pool de hilos o proceso aparte, ver tool_executors.py) y la
+    espera es cancelable.
+
+    Si la herramienta declara metadata["cache"] (ver tool_cache.py), una
+    llamada repetida con los mismos argumentos se sirve desde memoria sin
+    pasar por el ejecutor; el estado ("hit" / "miss") queda en tool_log.
+
+    Cada llamada es un span `tool_call`; los spans del retriever, embeddings
+    o SQL que abra la herramienta cuelgan de él.
     """
+    with span("tool_call", "tool", tool=tool_name, iteration=iteration, args=tool_args):
+        return await _execute_tool(tool, tool_name, tool_args, iteration, tool_log)
+
+
+async def _execute_tool(tool, tool_name, tool_args, iteration, tool_log):
+    ctx = get_current()
+    if ctx is not None:
+        ctx.tool_calls_started += 1
+        ctx.tools_used.append(tool_name)
+        if (getattr(tool, "metadata", None) or {}).get("live_data"):
+            ctx.live_data_used = True
 
     # Registrar inicio de uso de la herramienta
     tool_log.append({
@@ -14,37 +73,47 @@ async def execute_tool(tool, tool_name, tool_args, iteration, tool_log):
         "status": "started"
     })
 
+    started = time.perf_counter()
     try:
-        # ==========================
-        # Ejecución async
-        # ==========================
-        if hasattr(tool, "ainvoke"):
-            result = await tool.ainvoke(tool_args)
-
-        # ==========================
-        # Ejecución sync
-        # ==========================
-        elif hasattr(tool, "run"):
-            # tool.run puede aceptar cadenas, un valor o kwargs
-            if len(tool_args) == 0:
-                result = tool.run("")
-            elif len(tool_args) == 1:
-                result = tool.run(list(tool_args.values())[0])
-            else:
-                result = tool.run(**tool_args)
-
-        # ==========================
-        # Sin método conocido
-        # ==========================
+        cached, cache_status, cache_stamp = await TOOL_CACHE.get(tool, tool_args)
+
+        if not is_miss(cached):
+            result = cached
+            timings = {
+                "execution": "cache",
+                "queue_wait_ms": 0.0,
+                "run_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            if ctx is not None:
+                ctx.tool_cache_hits += 1
+        elif hasattr(tool, "ainvoke") or hasattr(tool, "run"):
+            result, timings = await run_tool(tool, tool_args)
+            if cache_status is not None:
+                await TOOL_CACHE.put(tool, tool_args, result, cache_stamp)
         else:
-            result = f"Tool '{tool_name}' no tiene un método ejecutable."
+            result, timings = f"Tool '{tool_name}' no tiene un método ejecutable.", {}
+
+        if timings:
+            logger.info(
+                f"Tool {tool_name} [{timings['execution']}] "
+                f"cola={timings['queue_wait_ms']}ms ejecución={timings['run_ms']}ms"
+            )
+
+        if ctx is not None:
+            ctx.tool_calls_completed += 1
+        _record_tool_metrics(tool_name, iteration, "completed", started, timings.get("execution", ""), cache_status)
+        tool_span = current_span()
+        if tool_span is not None:
+            tool_span.set(**timings, **({"cache": cache_status} if cache_status else {}))
 
         # Registrar éxito
         tool_log.append({
             "iteration": iteration,
             "tool_name": tool_name,
             "tool_args": tool_args,
-            "status": "completed"
+            "status": "completed",
+            **timings,
+            **({"cache": cache_status} if cache_status else {})
         })
 
         return result
@@ -58,5 +127,71 @@ async def execute_tool(tool, tool_name, tool_args, iteration, tool_log):
             "status": "error",
             "error": str(err)
         })
+        _record_tool_metrics(tool_name, iteration, "error", started)
+        tool_span = current_span()
+        if tool_span is not None:
+            tool_span.set(error=str(err))
+            tool_span.status = "error"
 
         return f"Error ejecutando '{tool_name}': {err}"
+
+
+async def execute_tool_calls(
+    tool_calls,
+    tools_map,
+    iteration,
+    tool_log,
+    max_concurrency: int = TOOL_MAX_CONCURRENCY,
+    timeout: float = TOOL_TIMEOUT_SECONDS
+):
+    """
+    Ejecuta en paralelo los tool_calls de una misma iteración.
+
+    Async generator que produce (index, tool_call, result) a medida que cada
+    herramienta termina, no en el orden original; `index` es la posición en
+    `tool_calls` para que el llamador reconstruya el orden de los ToolMessage.
+    La concurrencia se limita con un semáforo y cada herramienta tiene su
+    propio timeout. Si el consumidor se cancela (p. ej. el cliente se
+    desconectó), las tareas pendientes se cancelan.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(index, tool_call):
+        tool_name = tool_call.get("name")
+        tool_args = tool_call.get("args", {})
+        tool = tools_map.get(tool_name)
+
+        if tool is None:
+            return index, tool_call, f"Herramienta '{tool_name}' no encontrada"
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    execute_tool(tool, tool_name, tool_args, iteration, tool_log),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                tool_log.append({
+                    "iteration": iteration,
+                    "tool_name": tool_name,
+                    "tool_args": tool_args,
+                    "status": "timeout",
+                    "error": f"Sin respuesta tras {timeout}s"
+                })
+                _record_tool_metrics(tool_name, iteration, "timeout", started)
+                result = f"Tiempo agotado ejecutando '{tool_name}' ({timeout}s)"
+
+        return index, tool_call, result
+
+    tasks = [asyncio.create_task(_run(i, tc)) for i, tc in enumerate(tool_calls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        ctx = get_current()
+        if pending and ctx is not None:
+            ctx.tool_calls_cancelled += len(pending)
@@ -0,0 +1,353 @@
+# app/streaming/tool_executors.py
+
+"""
+Capa de ejecutores para herramientas.
+
+Cada herramienta declara cómo debe ejecutarse con `tool.metadata["execution"]`:
+    - "async"   : corre en el event loop (ainvoke nativo, p. ej. TavilySearch).
+    - "thread"  : pool de hilos acotado, para herramientas sync de I/O
+                  (SQLDatabaseToolkit, retriever, etc.).
+    - "process" : proceso aparte, para herramientas de CPU como python_sandbox.
+                  Requiere que `tool.func` sea una función de módulo (picklable).
+                  Dentro de un request las llamadas van al mismo proceso, que
+                  conserva su estado (variables del REPL) hasta que el request
+                  termina.
+
+Si no se declara, se infiere: "async" si la herramienta trae una corrutina
+(`tool.coroutine`, p. ej. Tool/StructuredTool con coroutine=...), "thread"
+en otro caso.
+
+Cada llamada devuelve también los tiempos de espera en cola y de ejecución.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.request_context import get_current
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+TOOL_THREAD_WORKERS = int(os.getenv("TOOL_THREAD_WORKERS", "8"))
+TOOL_PROCESS_WORKERS = int(os.getenv("TOOL_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Módulos precargados en el forkserver para que cada proceso arranque en caliente
+TOOL_PROCESS_PRELOAD = [
+    "app.agent_tools.sandbox_tool",
+    "langchain_experimental.utilities",
+    "pandas",
+    "numpy",
+    "matplotlib.pyplot",
+]
+# Cada cuánto el hilo que espera la respuesta de un proceso mira si hay que dejar de esperar
+_PROCESS_POLL_SECONDS = 0.1
+
+EXECUTION_POLICIES = ("async", "thread", "process")
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_lane: Optional["ProcessLane"] = None
+
+
+# ==========================
+# POLÍTICA POR HERRAMIENTA
+# ==========================
+def get_execution_policy(tool) -> str:
+    """Devuelve la política declarada por la herramienta o la infiere."""
+    metadata = getattr(tool, "metadata", None) or {}
+    policy = metadata.get("execution")
+    if policy in EXECUTION_POLICIES:
+        if policy == "process" and not callable(getattr(tool, "func", None)):
+            logger.warning(f"'{tool.name}' declara 'process' pero no expone func; se usa 'thread'.")
+            return "thread"
+        return policy
+
+    # Tool/StructuredTool redefinen _arun aunque no tengan corrutina (caen a
+    # run_in_executor del pool por defecto): solo cuenta `coroutine`
+    if getattr(tool, "coroutine", None) is not None:
+        return "async"
+    if not hasattr(tool, "invoke") and not hasattr(tool, "run"):
+        return "async"
+    return "thread"
+
+
+def split_tool_args(tool_args: Dict[str, Any]) -> Tuple[tuple, dict]:
+    """
+    Convierte los args del LLM en (args, kwargs) para llamar a una función sync.
+    Misma convención que tool.run: sin args → "", un arg → posicional, varios → kwargs.
+    """
+    if len(tool_args) == 0:
+        return ("",), {}
+    if len(tool_args) == 1:
+        return (list(tool_args.values())[0],), {}
+    return (), dict(tool_args)
+
+
+# ==========================
+# POOL DE HILOS (I/O)
+# ==========================
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=max(1, TOOL_THREAD_WORKERS),
+            thread_name_prefix="tool-io"
+        )
+    return _thread_pool
+
+
+def _timed_call(func, args, kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, started, time.perf_counter()
+
+
+async def run_in_thread(func, *args, **kwargs) -> Tuple[Any, Dict[str, float]]:
+    """Ejecuta `func` en el pool de hilos acotado. Devuelve (resultado, tiempos)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+    result, started, finished = await loop.run_in_executor(
+        _get_thread_pool(),
+        functools.partial(ctx.run, _timed_call, func, args, kwargs)
+    )
+    return result, {
+        "queue_wait_ms": round((started - submitted) * 1000, 2),
+        "run_ms": round((finished - started) * 1000, 2),
+    }
+
+
+# ==========================
+# PROCESOS (CPU)
+# ==========================
+def _worker_loop(conn):
+    """
+    Punto de entrada del proceso hijo: ejecuta las llamadas que llegan por
+    `conn` en orden y responde (ok, valor, segundos) a cada una. El estado
+    del proceso (p. ej. el REPL del sandbox) se conserva entre llamadas.
+    """
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        func, args, kwargs = message
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            conn.send((True, result, time.perf_counter() - started))
+        except Exception as err:
+            conn.send((False, f"{type(err).__name__}: {err}", time.perf_counter() - started))
+    conn.close()
+
+
+def _receive(conn, proc, stop: threading.Event):
+    """recv() con poll: deja de esperar si el hijo muere o si se pide con `stop`."""
+    while not stop.is_set():
+        if conn.poll(_PROCESS_POLL_SECONDS):
+            return conn.recv()
+        if not proc.is_alive() and not conn.poll():
+            raise EOFError
+    raise EOFError
+
+
+class _Worker:
+    """Un proceso hijo y su pipe; atiende una llamada a la vez."""
+
+    def __init__(self, mp_ctx):
+        self.conn, child_conn = mp_ctx.Pipe(duplex=True)
+        self.proc = mp_ctx.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        self.proc.start()
+        child_conn.close()
+        self.lock = asyncio.Lock()
+        self.broken = False
+
+    async def call(self, func, args, kwargs) -> Tuple[bool, Any, float]:
+        try:
+            self.conn.send((func, args, kwargs))
+        except (OSError, ValueError):
+            self.broken = True
+            raise RuntimeError(f"El proceso de la herramienta no está disponible (exitcode={self.proc.exitcode})")
+        stop = threading.Event()
+        reader = asyncio.ensure_future(asyncio.to_thread(_receive, self.conn, self.proc, stop))
+        try:
+            return await asyncio.shield(reader)
+        except (EOFError, OSError):
+            self.broken = True
+            raise RuntimeError(f"El proceso de la herramienta terminó sin respuesta (exitcode={self.proc.exitcode})")
+        except BaseException:
+            # cancelación o timeout: se termina el proceso; el pipe se cierra cuando el
+            # hilo lector deja de usarlo (a lo sumo _PROCESS_POLL_SECONDS después)
+            stop.set()
+            self.broken = True
+            self.close(reader)
+            raise
+
+    def close(self, reader: Optional[asyncio.Future] = None):
+        """Termina el proceso (sin bloquear) y cierra el pipe cuando nadie lo lee."""
+        if self.proc.is_alive():
+            if self.broken:
+                self.proc.terminate()
+            else:
+                try:
+                    self.conn.send(None)  # sale al terminar la llamada en curso
+                except (OSError, ValueError):
+                    self.proc.terminate()
+        if reader is not None:
+            reader.add_done_callback(self._close_pipe)
+        else:
+            self.conn.close()
+
+    def _close_pipe(self, reader: asyncio.Future):
+        if not reader.cancelled():
+            reader.exception()  # el EOFError del lector tras `stop` es esperado
+        self.conn.close()
+
+
+class ProcessLane:
+    """
+    Ejecuta llamadas CPU-bound en procesos hijos, con a lo sumo `max_workers`
+    ejecutándose a la vez. Los procesos se crean con fork desde un forkserver
+    con los módulos pesados precargados, así que el GIL del servidor queda
+    libre y una ejecución descontrolada se puede terminar sin afectar a las
+    demás.
+
+    Con `session` (el id del request) las llamadas de la sesión van a un
+    mismo proceso, una tras otra, que conserva su estado hasta close_session().
+    Sin `session` cada llamada usa un proceso propio. Si una llamada se
+    cancela (desconexión, timeout) su proceso se termina y la sesión pierde
+    el estado.
+    """
+
+    def __init__(self, max_workers: int, preload=None):
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if preload and self._ctx.get_start_method() == "forkserver":
+            self._ctx.set_forkserver_preload(list(preload))
+        self._max_workers = max(1, max_workers)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._sessions: Dict[str, _Worker] = {}
+
+    def _worker(self, session: Optional[str]) -> Tuple[_Worker, float]:
+        """Proceso de la sesión (o uno nuevo) y los segundos que tomó crearlo."""
+        worker = self._sessions.get(session) if session is not None else None
+        if worker is not None and not worker.broken:
+            return worker, 0.0
+        started = time.perf_counter()
+        worker = _Worker(self._ctx)
+        if session is not None:
+            self._sessions[session] = worker
+        return worker, time.perf_counter() - started
+
+    async def run(self, func, args: tuple = (), kwargs: Optional[dict] = None,
+                  session: Optional[str] = None) -> Tuple[Any, Dict[str, float]]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_workers)
+
+        submitted = time.perf_counter()
+        worker, spawn_s = self._worker(session)
+        try:
+            # las llamadas de una sesión van en orden; el hueco se toma recién al ejecutar
+            async with worker.lock:
+                if worker.broken:  # la llamada anterior de la sesión se canceló
+                    worker, respawn_s = self._worker(session)
+                    spawn_s += respawn_s
+                async with self._slots:
+                    started = time.perf_counter()
+                    ok, payload, run_s = await worker.call(func, args, kwargs or {})
+        finally:
+            if session is None or worker.broken:
+                if session is not None and self._sessions.get(session) is worker:
+                    del self._sessions[session]
+                worker.close()
+
+        finished = time.perf_counter()
+        if not ok:
+            raise RuntimeError(payload)
+        return payload, {
+            "queue_wait_ms": round((started - submitted - spawn_s) * 1000, 2),
+            "run_ms": round(run_s * 1000, 2),
+            "spawn_ms": round((spawn_s + (finished - started) - run_s) * 1000, 2),
+        }
+
+    def close_session(self, session: str):
+        worker = self._sessions.pop(session, None)
+        if worker is not None:
+            worker.close()
+
+    def close_all(self):
+        for session in list(self._sessions):
+            self.close_session(session)
+
+
+def _get_process_lane() -> ProcessLane:
+    global _process_lane
+    if _process_lane is None:
+        _process_lane = ProcessLane(TOOL_PROCESS_WORKERS, preload=TOOL_PROCESS_PRELOAD)
+    return _process_lane
+
+
+async def run_in_process(func, *args, session: Optional[str] = None, **kwargs) -> Tuple[Any, Dict[str, float]]:
+    """
+    Ejecuta `func` (función de módulo) en un proceso aparte; con `session`, en
+    el proceso de esa sesión. Devuelve (resultado, tiempos).
+    """
+    return await _get_process_lane().run(func, args, kwargs, session=session)
+
+
+def close_process_session(session: str):
+    """Termina el proceso de la sesión `session` (si tiene uno). Se llama al terminar el request."""
+    if _process_lane is not None:
+        _process_lane.close_session(session)
+
+
+# ==========================
+# DESPACHO
+# ==========================
+async def run_tool(tool, tool_args: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Ejecuta la herramienta según su política.
+    Devuelve (resultado, tiempos) con `execution`, `queue_wait_ms` y `run_ms`.
+    """
+    policy = get_execution_policy(tool)
+
+    if policy == "async":
+        started = time.perf_counter()
+        result = await tool.ainvoke(tool_args)
+        timings = {"queue_wait_ms": 0.0, "run_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    elif policy == "process":
+        args, kwargs = split_tool_args(tool_args)
+        ctx = get_current()
+        result, timings = await _get_process_lane().run(
+            tool.func, args, kwargs, session=ctx.request_id if ctx is not None else None
+        )
+
+    elif hasattr(tool, "invoke"):
+        result, timings = await run_in_thread(tool.invoke, tool_args)
+
+    else:
+        args, kwargs = split_tool_args(tool_args)
+        result, timings = await run_in_thread(tool.run, *args, **kwargs)
+
+    return result, {"execution": policy, **timings}
+
+
+def shutdown_executors():
+    """Libera el pool de hilos y los procesos de sesión (se llama al cerrar la app)."""
+    global _thread_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_lane is not None:
+        _process_lane.close_all()
@@ -0,0 +1,83 @@
+# benchmarks/concurrency_check.py
+"""
+Comprueba que N streams /ask en paralelo terminan en ~el tiempo de uno.
+
+Usa los proveedores locales falsos (FAKE_PROVIDERS=1, sin red) con la
+latencia por token simulada con asyncio.sleep. Si algo en el camino del LLM bloquea el event loop, los
+streams se serializan y el cociente paralelo/único crece hacia N.
+
+Sale con código 1 si el cociente supera --max-ratio, o si el stream único
+dura tan poco que la medición no prueba nada (p. ej. el agente respondió sin
+pasar por el LLM), así sirve como comprobación en CI.
+
+Uso:
+    uv run python -m benchmarks.concurrency_check --streams 10
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Tuple
+
+_MIN_TOKENS = 5
+
+
+async def _one_stream(client) -> float:
+    start = time.perf_counter()
+    async with client.stream("POST", "/ask", json={"question": "Hola", "message_history": []}) as resp:
+        resp.raise_for_status()
+        async for _ in resp.aiter_bytes():
+            pass
+    return time.perf_counter() - start
+
+
+async def run(streams: int, token_delay: float) -> Tuple[float, float]:
+    os.environ["FAKE_PROVIDERS"] = "1"
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(1 / token_delay)
+    # La caché de respuestas ocultaría la medición
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+    # Todas las preguntas son iguales: el single-flight las uniría en un solo run
+    os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "0")
+
+    import httpx
+    import main
+    import app.streaming.streaming as streaming
+
+    streaming.upload_first_photo_found = lambda: None
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://local") as client:
+        single = await _one_stream(client)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[_one_stream(client) for _ in range(streams)])
+        parallel = time.perf_counter() - start
+
+    ratio = parallel / single
+    print(f"1 stream: {single:.3f}s | {streams} streams en paralelo: {parallel:.3f}s | cociente: {ratio:.2f}")
+    return single, ratio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=10)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--max-ratio", type=float, default=1.5,
+                        help="Cociente máximo paralelo/único aceptado")
+    args = parser.parse_args()
+
+    single, ratio = asyncio.run(run(args.streams, args.token_delay))
+    # Con menos de unos pocos tokens la latencia simulada no domina y el cociente no dice nada
+    if single < _MIN_TOKENS * args.token_delay:
+        print(f"FALLO: el stream único duró {single:.3f}s, demasiado poco para medir la concurrencia.")
+        sys.exit(1)
+    if ratio > args.max_ratio:
+        print(f"FALLO: los streams se están serializando (cociente > {args.max_ratio}).")
+        sys.exit(1)
+    print("OK: los streams corren concurrentemente.")
+
+
+if __name__ == "__main__":
+    main()
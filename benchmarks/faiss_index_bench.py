@@ -0,0 +1,179 @@
+# benchmarks/faiss_index_bench.py
+"""
+Benchmark de tipos de índice FAISS: recall@k frente a búsqueda exacta,
+latencia por consulta y memoria.
+
+Para cada tipo (app/core/vector_index.py) y cada valor del parámetro de
+búsqueda (nprobe en IVF, efSearch en HNSW) mide:
+    - recall@k : fracción de los k vecinos exactos (IndexFlatL2) que devuelve
+    - p50/p95  : latencia de una consulta (de a una, como el retriever)
+    - qps      : consultas por segundo con esa latencia
+    - memoria  : tamaño del índice serializado (y relación con flat)
+    - build    : tiempo de entrenamiento + inserción (con todos los hilos)
+
+Los vectores son sintéticos (clusters gaussianos normalizados, dimensión de
+embed-multilingual-light-v3.0) o los de un índice existente (--index-dir,
+p. ej. una versión de app/data/hotel_context_faiss_index/versions/). Las
+consultas son vectores del corpus con ruido, que no están en el índice.
+
+Uso:
+    uv run python -m benchmarks.faiss_index_bench --vectors 200000
+    uv run python -m benchmarks.faiss_index_bench --types flat,hnsw --ef-search 16,64,256
+    uv run python -m benchmarks.faiss_index_bench --index-dir app/data/hotel_context_faiss_index/versions/<id>
+"""
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.core.vector_index import INDEX_TYPES, build_index, configure_search, memory_bytes
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def index_vectors(index_dir: Path) -> np.ndarray:
+    index = faiss.read_index(str(index_dir / "index.faiss"))
+    if not isinstance(index, faiss.IndexFlat):
+        raise SystemExit(f"{index_dir} no es un índice flat ({type(index).__name__}); usa una versión flat")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.choice(len(vectors), size=count, replace=len(vectors) < count)]
+    noisy = picked + 0.1 * rng.standard_normal(picked.shape).astype(np.float32)
+    return np.ascontiguousarray(noisy / np.linalg.norm(noisy, axis=1, keepdims=True), dtype=np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found[i] = ids[0]
+    mean_ms = sum(latencies) / len(latencies)
+    return {
+        "recall": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "qps": round(1000 / mean_ms, 1) if mean_ms else 0.0,
+    }
+
+
+def sweep_values(index, nprobes, ef_searches):
+    """(nombre del parámetro, valores) que tiene sentido barrer para este índice."""
+    try:
+        nlist = faiss.extract_index_ivf(index).nlist
+        return "nprobe", [n for n in nprobes if n <= nlist] or [nlist]
+    except RuntimeError:
+        pass
+    if hasattr(index, "hnsw"):
+        return "efSearch", ef_searches
+    return None, [None]
+
+
+def _ints(text: str):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="tipos a comparar, separados por coma")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200, help="clusters de los vectores sintéticos")
+    parser.add_argument("--index-dir", type=Path, help="usar los vectores de un índice flat existente")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,16,64", help="valores de nprobe (IVF)")
+    parser.add_argument("--ef-search", default="16,64,256", help="valores de efSearch (HNSW)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="hilos de FAISS en las consultas (1 = latencia por consulta estable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", type=Path, help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    build_threads = faiss.omp_get_max_threads()
+    if args.index_dir:
+        vectors = index_vectors(args.index_dir)
+        source = str(args.index_dir)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, args.clusters, args.seed)
+        source = f"sintéticos ({args.clusters} clusters)"
+    queries = make_queries(vectors, args.queries, args.seed)
+    k = min(args.k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    flat_bytes = memory_bytes(exact)
+    print(f"{len(vectors):,} vectores × {vectors.shape[1]} dims ({source}), "
+          f"{len(queries):,} consultas, recall@{k}, {args.threads} hilo(s)\n")
+    header = (f"{'tipo':<9} {'índice':<20} {'parámetro':<13} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'qps':>9} {'MB':>8} {'vs flat':>8} {'build s':>8}")
+    print(header)
+    print("-" * len(header))
+
+    results = []
+    for index_type in [t for t in args.types.split(",") if t]:
+        # Entrenar e insertar con todos los hilos; las consultas con --threads
+        faiss.omp_set_num_threads(build_threads)
+        index, report = build_index(vectors, index_type, seed=args.seed)
+        faiss.omp_set_num_threads(args.threads)
+        name, values = sweep_values(index, _ints(args.nprobe), _ints(args.ef_search))
+        for value in values:
+            if name == "nprobe":
+                configure_search(index, nprobe=value)
+            elif name == "efSearch":
+                configure_search(index, ef_search=value)
+            row = {
+                "type": index_type,
+                "factory": report["factory"],
+                "param": name,
+                "value": value,
+                **measure(index, queries, truth, k),
+                "bytes": report["bytes"],
+                "compression": round(flat_bytes / report["bytes"], 2) if report["bytes"] else None,
+                "build_seconds": report["build_seconds"],
+            }
+            results.append(row)
+            param = f"{name}={value}" if name else "-"
+            print(f"{index_type:<9} {report['factory']:<20} {param:<13} {row['recall']:>7.3f} "
+                  f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['qps']:>9,.0f} "
+                  f"{row['bytes'] / 1e6:>8.1f} {row['compression']:>7.1f}x {row['build_seconds']:>8.2f}")
+
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps({
+            "vectors": len(vectors), "dim": int(vectors.shape[1]), "queries": len(queries), "k": k,
+            "source": source, "threads": args.threads, "results": results,
+        }, indent=2), encoding="utf-8")
+        print(f"\nResultados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
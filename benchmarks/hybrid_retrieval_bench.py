@@ -0,0 +1,166 @@
+# benchmarks/hybrid_retrieval_bench.py
+"""
+Benchmark de recuperación del contexto del hotel: vector, léxica (BM25),
+híbrida (RRF) e híbrida con camino rápido léxico.
+
+Indexa con rag_indexer un corpus sintético (una guía por edificio del resort,
+con las mismas secciones en todas: check-in, mascotas, spa, ...) en un
+directorio temporal, y para cada modo mide:
+    - recall@k : fracción de consultas cuya sección correcta está entre los k resultados
+    - mrr      : rango recíproco medio de la sección correcta
+    - p50/p95  : latencia de una búsqueda (incluye el embedding de la consulta)
+    - emb/q    : llamadas al proveedor de embeddings por consulta
+    - rápido   : fracción de consultas resueltas solo con el índice léxico
+
+Las consultas son de dos tipos: palabra clave ("mascotas Villa Coral") y
+pregunta ("¿puedo llevar a mi perro a Villa Coral?"). Por defecto usa los
+embeddings falsos con --embed-latency-ms de latencia (y sin caché de
+consultas, para que cada búsqueda pague su embedding); su recall vectorial
+no es representativo: con EMBEDDINGS_PROVIDER=cohere mide contra el
+proveedor real.
+
+Uso:
+    uv run python -m benchmarks.hybrid_retrieval_bench --buildings 40 --fast-path-score 4,6,8
+"""
+
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+
+TOPICS = [
+    ("Check-in", "El registro de llegada empieza a las {n}:00 en la recepción principal y la salida es antes de las 12:00.",
+     "¿a qué hora puedo llegar a {b}?"),
+    ("Mascotas", "Se admiten perros y gatos de hasta {n} kg con un cargo por noche; deben ir con correa en áreas comunes.",
+     "¿puedo llevar a mi perro a {b}?"),
+    ("Spa", "Masajes, temazcal y circuito de hidroterapia abiertos de 9 a {n} horas; reservar con un día de anticipación.",
+     "¿dónde me dan un masaje en {b}?"),
+    ("Restaurante", "Cocina yucateca y mariscos frescos; el desayuno buffet se sirve hasta las {n}:30.",
+     "¿hasta qué hora sirven el desayuno en {b}?"),
+    ("Piscina", "Alberca infinita climatizada con toallas incluidas y bar en el agua hasta las {n}:00.",
+     "¿la alberca de {b} está climatizada?"),
+    ("Traslados", "Transporte privado desde el aeropuerto de Cancún en {n} minutos; se coordina al confirmar la reserva.",
+     "¿cómo llego desde el aeropuerto a {b}?"),
+    ("Wifi", "Internet inalámbrico gratuito de {n} megas en habitaciones y lobby; la clave está en la tarjeta de bienvenida.",
+     "¿cuál es la clave del internet en {b}?"),
+    ("Buceo", "Excursiones al arrecife con instructor certificado, salidas a las {n}:00 desde el muelle.",
+     "¿hay salidas para bucear en el arrecife desde {b}?"),
+]
+PREFIXES = ["Villa", "Casa", "Torre", "Palapa", "Jardín"]
+PLACES = ["Coral", "Maya", "Ceiba", "Azul", "Ixchel", "Cenote", "Bacalar", "Selva", "Tulum", "Arrecife",
+          "Manglar", "Chaak"]
+
+
+def building_names(count: int):
+    names = [f"{prefix} {place}" for place in PLACES for prefix in PREFIXES]
+    if count > len(names):
+        raise SystemExit(f"--buildings admite hasta {len(names)}")
+    return names[:count]
+
+
+def make_corpus(buildings, seed: int):
+    """[(archivo, bytes)] y [(consulta, tipo, jerarquía esperada)]."""
+    rnd = random.Random(seed)
+    files, queries = [], []
+    for name in buildings:
+        lines = [f"# {name}"]
+        for topic, body, question in TOPICS:
+            lines += [f"## {topic}", f"En {name}: " + body.format(n=rnd.randint(6, 22)), ""]
+            expected = f"{name} > {topic}"
+            queries.append((f"{topic.lower()} {name}", "palabra clave", expected))
+            queries.append((question.format(b=name), "pregunta", expected))
+        files.append((f"{name.lower().replace(' ', '_')}.md", "\n".join(lines).encode("utf-8")))
+    return files, queries
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def evaluate(retriever, queries, provider_calls) -> dict:
+    latencies, hits, reciprocal, fast = [], 0, 0.0, 0
+    calls_before = provider_calls()
+    for query, _, expected in queries:
+        started = time.perf_counter()
+        docs, mode = retriever.search_with_mode(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranks = [i for i, d in enumerate(docs, start=1) if d.metadata.get("hierarchy") == expected]
+        if ranks:
+            hits += 1
+            reciprocal += 1 / ranks[0]
+        fast += mode == "fast_path"
+    n = len(queries)
+    return {
+        "recall": hits / n,
+        "mrr": reciprocal / n,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "emb_per_query": (provider_calls() - calls_before) / n,
+        "fast": fast / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=int, default=40, help="guías (archivos Markdown) del corpus")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--fast-path-score", default="4,6,8",
+                        help="umbrales BM25 del camino rápido a probar, separados por coma")
+    parser.add_argument("--fast-path-ratio", type=float, default=1.25)
+    parser.add_argument("--embed-latency-ms", type=float, default=80,
+                        help="latencia de los embeddings falsos por llamada")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hybrid_bench_")
+    os.environ["RAG_INDEX_DIR"] = os.path.join(workdir, "index")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite")
+    os.environ.setdefault("EMBEDDINGS_PROVIDER", "fake")
+    os.environ.setdefault("FAKE_EMBEDDINGS_LATENCY_MS", "0")  # el build no paga la latencia
+    os.environ["QUERY_EMBEDDING_CACHE_SIZE"] = "0"
+    os.environ["QUERY_EMBEDDING_BATCH_WAIT_MS"] = "0"
+
+    from app.core import embedding_service
+    from app.rag import index_versions, rag_indexer, rag_store
+    from app.rag.hybrid_retriever import make_retriever
+
+    files, queries = make_corpus(building_names(args.buildings), args.seed)
+    version, result = rag_indexer.build_index_version([c for _, c in files], [f for f, _ in files])
+    index_versions.activate(version)
+    vectorstore = rag_store.load_vectorstore()
+    inner = vectorstore.embedding_function
+    while hasattr(inner, "inner"):  # TracedEmbeddings → EmbeddingService → proveedor
+        inner = inner.inner
+    if hasattr(inner, "latency_ms"):
+        inner.latency_ms = args.embed_latency_ms
+
+    def provider_calls():
+        return embedding_service.stats().get("provider_calls", 0)
+
+    print(f"{len(files)} guías, {result['chunks_added']} chunks, {len(queries)} consultas "
+          f"({os.environ['EMBEDDINGS_PROVIDER']}), recall@{args.k}\n")
+    header = (f"{'modo':<22} {'consultas':<14} {'recall':>7} {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'emb/q':>6} {'rápido':>7}")
+    print(header)
+    print("-" * len(header))
+
+    configs = [("vector", {"mode": "vector"}), ("lexical", {"mode": "lexical"}), ("hybrid", {"mode": "hybrid"})]
+    for score in [float(s) for s in args.fast_path_score.split(",") if s]:
+        configs.append((f"hybrid+rápido≥{score:g}", {
+            "mode": "hybrid", "fast_path_score": score, "fast_path_ratio": args.fast_path_ratio,
+        }))
+    kinds = sorted({kind for _, kind, _ in queries})
+    for label, options in configs:
+        retriever = make_retriever(vectorstore, {"k": args.k}, **options)
+        for kind in kinds + ["todas"]:
+            subset = [q for q in queries if kind == "todas" or q[1] == kind]
+            row = evaluate(retriever, subset, provider_calls)
+            print(f"{label:<22} {kind:<14} {row['recall']:>7.3f} {row['mrr']:>6.3f} {row['p50_ms']:>8.2f} "
+                  f"{row['p95_ms']:>8.2f} {row['emb_per_query']:>6.2f} {row['fast']:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
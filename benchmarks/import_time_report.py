@@ -0,0 +1,90 @@
+# benchmarks/import_time_report.py
+"""
+Reporte del costo de arranque por módulo (similar a `python -X importtime`).
+
+Importa `main` (o el módulo indicado) en un subproceso con -X importtime,
+agrupa los tiempos y muestra:
+    - los módulos de la app (app.*, main) con su tiempo propio y acumulado,
+    - los paquetes de terceros más costosos (tiempo acumulado del paquete raíz).
+
+Uso:
+    uv run python -m benchmarks.import_time_report
+    uv run python -m benchmarks.import_time_report --module main --top 15 --json
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def collect(module: str):
+    """Devuelve [(módulo, self_us, cumulative_us, nivel)] en el orden reportado por Python."""
+    env = dict(os.environ)
+    env.setdefault("TOOL_WARMUP", "0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cum_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cum_us), len(indent) // 2))
+    if proc.returncode != 0:
+        print(proc.stderr.splitlines()[-1] if proc.stderr else "error al importar", file=sys.stderr)
+    return rows
+
+
+def summarize(rows, top: int):
+    total_us = sum(r[1] for r in rows)
+
+    own = [
+        {"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+        for name, s, c, _ in rows
+        if name == "main" or name.startswith("app.")
+    ]
+    own.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+
+    packages = defaultdict(int)
+    for name, s, _, _ in rows:
+        root = name.split(".")[0]
+        if root not in ("app", "main"):
+            packages[root] += s
+    third_party = sorted(
+        ({"package": k, "self_ms": v / 1000} for k, v in packages.items()),
+        key=lambda r: r["self_ms"], reverse=True
+    )[:top]
+
+    return {"total_ms": total_us / 1000, "modules": len(rows), "app_modules": own, "third_party": third_party}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Imprime el resultado como JSON")
+    args = parser.parse_args()
+
+    report = summarize(collect(args.module), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"import {args.module}: {report['total_ms']:.1f} ms en {report['modules']} módulos\n")
+    print(f"{'módulo de la app':<48}{'propio ms':>12}{'acumulado ms':>14}")
+    for r in report["app_modules"]:
+        print(f"{r['module']:<48}{r['self_ms']:>12.1f}{r['cumulative_ms']:>14.1f}")
+    print(f"\n{'paquete de terceros':<48}{'tiempo ms':>12}")
+    for r in report["third_party"]:
+        print(f"{r['package']:<48}{r['self_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+# benchmarks/load_test.py
+"""
+Prueba de carga de /ask con latencias por stream SSE.
+
+Lanza preguntas de un corpus contra /ask con concurrencia y tasa
+configurables, parsea los eventos SSE de cada respuesta y reporta:
+    - TTFB: tiempo hasta el primer byte del cuerpo;
+    - TTFT: tiempo hasta el primer evento `answer`;
+    - duración total del stream;
+    - eventos por segundo y tasa de error (HTTP != 200, evento `error`,
+      stream sin `done` o excepción de red);
+con p50/p95/p99. El resultado se guarda en JSON (benchmarks/results/) para
+comparar corridas entre commits con --compare.
+
+Sin --url levanta la app en el mismo proceso con los proveedores locales
+falsos (FAKE_PROVIDERS=1, ver app/core/fake_providers.py), servida por
+uvicorn en un hilo aparte en un puerto libre de 127.0.0.1: no necesita red
+ni claves, y el stream llega por HTTP real, así que TTFB y TTFT son
+comparables con los de un servidor desplegado (httpx.ASGITransport entrega
+el cuerpo entero de una vez). Con --url mide un servidor real (uvicorn).
+
+Modos de carga:
+    - lazo cerrado (por defecto): --concurrency usuarios virtuales que
+      envían una pregunta tras otra;
+    - lazo abierto (--rate N): N requests/s a intervalos fijos, con
+      --concurrency como máximo de streams abiertos. Las latencias se miden
+      desde el instante programado, así la espera por falta de hueco cuenta.
+
+Uso:
+    uv run python -m benchmarks.load_test --requests 200 --concurrency 20
+    uv run python -m benchmarks.load_test --rate 5 --duration 60 --url http://localhost:8001
+    uv run python -m benchmarks.load_test --compare benchmarks/results/<anterior>.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_QUESTIONS = Path(__file__).parent / "questions.txt"
+
+# Métricas que se comparan con --compare (menor es mejor salvo las marcadas)
+_COMPARED = [
+    ("ttfb_ms", "p50"), ("ttfb_ms", "p95"), ("ttfb_ms", "p99"),
+    ("ttft_ms", "p50"), ("ttft_ms", "p95"), ("ttft_ms", "p99"),
+    ("total_ms", "p50"), ("total_ms", "p95"), ("total_ms", "p99"),
+]
+_HIGHER_IS_BETTER = ["throughput_rps", "events_per_second"]
+
+
+# ==========================
+# SSE
+# ==========================
+class SSEParser:
+    """Parser incremental de SSE: feed() recibe bytes y devuelve los eventos completos (nombre, data)."""
+
+    def __init__(self):
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> List[Tuple[str, str]]:
+        self._buffer += chunk.replace(b"\r\n", b"\n")
+        events = []
+        while b"\n\n" in self._buffer:
+            block, self._buffer = self._buffer.split(b"\n\n", 1)
+            name, data = "message", []
+            for line in block.decode("utf-8", errors="replace").split("\n"):
+                if line.startswith(":"):
+                    continue  # comentario / keep-alive
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    name = value
+                elif field == "data":
+                    data.append(value)
+            if data or name != "message":
+                events.append((name, "\n".join(data)))
+        return events
+
+
+# ==========================
+# REQUESTS
+# ==========================
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+async def one_request(client, question: str, client_id: str, started: Optional[float] = None) -> Dict[str, Any]:
+    """Envía una pregunta y mide el stream. `started` es el instante programado (lazo abierto)."""
+    t0 = started if started is not None else time.perf_counter()
+    record: Dict[str, Any] = {
+        "question": question,
+        "status": None,
+        "ttfb_ms": None,
+        "ttft_ms": None,
+        "total_ms": None,
+        "events": 0,
+        "error": None,
+    }
+    try:
+        async with client.stream(
+            "POST",
+            "/ask",
+            json={"question": question, "message_history": []},
+            headers={"Accept": "text/event-stream", "X-Client-Id": client_id},
+        ) as resp:
+            record["status"] = resp.status_code
+            if resp.status_code != 200:
+                await resp.aread()
+                record["error"] = f"http_{resp.status_code}"
+            else:
+                parser = SSEParser()
+                done = False
+                async for chunk in resp.aiter_bytes():
+                    now = time.perf_counter()
+                    if record["ttfb_ms"] is None:
+                        record["ttfb_ms"] = _ms(now - t0)
+                    for name, data in parser.feed(chunk):
+                        record["events"] += 1
+                        if name == "answer" and record["ttft_ms"] is None:
+                            record["ttft_ms"] = _ms(now - t0)
+                        elif name == "error" and record["error"] is None:
+                            record["error"] = "sse_error"
+                        elif name == "done":
+                            done = True
+                if not done and record["error"] is None:
+                    record["error"] = "incomplete"
+    except Exception as e:
+        record["error"] = type(e).__name__
+    record["total_ms"] = _ms(time.perf_counter() - t0)
+    return record
+
+
+async def closed_loop(client, questions: List[str], args) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    counter = iter(range(sys.maxsize))
+
+    async def user(worker: int):
+        while True:
+            i = next(counter)
+            if deadline is None and i >= args.requests:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            results.append(await one_request(client, questions[i % len(questions)], f"load-{worker}"))
+
+    await asyncio.gather(*[user(w) for w in range(args.concurrency)])
+    return results
+
+
+async def open_loop(client, questions: List[str], args) -> List[Dict[str, Any]]:
+    slots = asyncio.Semaphore(args.concurrency)
+    interval = 1.0 / args.rate
+    total = int(args.duration * args.rate) if args.duration else args.requests
+    start = time.perf_counter()
+
+    async def send(i: int, scheduled: float):
+        async with slots:
+            return await one_request(client, questions[i % len(questions)], f"load-{i % args.concurrency}", scheduled)
+
+    tasks = []
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(i, scheduled)))
+    return list(await asyncio.gather(*tasks))
+
+
+# ==========================
+# RESUMEN
+# ==========================
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 por rango más cercano, más media y máximo."""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": ordered[-1],
+    }
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    ok = [r for r in results if r["error"] is None]
+    events = sum(r["events"] for r in results)
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors_by_type": dict(Counter(r["error"] for r in results if r["error"])),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 2) if wall_seconds else 0.0,
+        "events_per_second": round(events / wall_seconds, 1) if wall_seconds else 0.0,
+        "ttfb_ms": percentiles([r["ttfb_ms"] for r in ok if r["ttfb_ms"] is not None]),
+        "ttft_ms": percentiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]),
+        "total_ms": percentiles([r["total_ms"] for r in ok]),
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [
+        f"requests: {summary['requests']}  ok: {summary['ok']}  errores: {summary['errors']} "
+        f"({summary['error_rate'] * 100:.1f}%)  {summary['errors_by_type'] or ''}",
+        f"duración: {summary['wall_seconds']:.2f}s  throughput: {summary['throughput_rps']:.2f} req/s  "
+        f"eventos: {summary['events_per_second']:.1f}/s",
+        "",
+        f"{'':<10} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}",
+    ]
+    for metric in ("ttfb_ms", "ttft_ms", "total_ms"):
+        values = summary[metric]
+        cells = [f"{values[q]:>10.1f}" if values[q] is not None else f"{'-':>10}" for q in ("p50", "p95", "p99", "max")]
+        lines.append(f"{metric:<10} " + " ".join(cells))
+    return "\n".join(lines)
+
+
+def format_comparison(current: Dict[str, Any], previous: Dict[str, Any], label: str) -> str:
+    lines = [f"Comparación con {label}:", f"{'métrica':<16} {'antes':>10} {'ahora':>10} {'cambio':>9}"]
+
+    def row(name: str, before: Optional[float], after: Optional[float], higher_is_better: bool):
+        if before in (None, 0) or after is None:
+            return
+        change = (after - before) / before * 100
+        worse = change < 0 if higher_is_better else change > 0
+        flag = "  peor" if worse and abs(change) >= 5 else ""
+        lines.append(f"{name:<16} {before:>10.1f} {after:>10.1f} {change:>+8.1f}%{flag}")
+
+    for metric, q in _COMPARED:
+        row(f"{metric} {q}", previous.get(metric, {}).get(q), current[metric][q], False)
+    for metric in _HIGHER_IS_BETTER:
+        row(metric, previous.get(metric), current[metric], True)
+    row("error_rate %", previous.get("error_rate", 0) * 100, current["error_rate"] * 100, False)
+    return "\n".join(lines)
+
+
+# ==========================
+# EJECUCIÓN
+# ==========================
+def load_questions(path: Path, shuffle_seed: Optional[int]) -> List[str]:
+    questions = [
+        line.strip() for line in path.read_text(encoding="utf-8").splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
+    if not questions:
+        raise SystemExit(f"El corpus {path} no tiene preguntas.")
+    if shuffle_seed is not None:
+        random.Random(shuffle_seed).shuffle(questions)
+    return questions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except Exception:
+        return None
+
+
+def _local_app(token_delay: float, verbose: bool):
+    """La app en el mismo proceso con los proveedores falsos (sin red)."""
+    if not verbose:
+        # antes de importar main: su basicConfig(INFO) queda sin efecto
+        logging.basicConfig(level=logging.WARNING)
+    os.environ["FAKE_PROVIDERS"] = "1"
+    os.environ.setdefault("FAKE_LLM_TOKENS_PER_SECOND", str(1 / token_delay))
+    # La caché de respuestas ocultaría la latencia del agente; actívala con ANSWER_CACHE_ENABLED=1
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+    # Igual con single-flight: las preguntas repetidas compartirían una sola ejecución
+    os.environ.setdefault("SINGLE_FLIGHT_ENABLED", "0")
+
+    import main
+    import app.streaming.streaming as streaming
+
+    streaming.upload_first_photo_found = lambda: None
+    return main.app
+
+
+def _serve_local(app) -> Tuple[Any, threading.Thread, str]:
+    """Sirve `app` con uvicorn en un hilo aparte; devuelve (servidor, hilo, url base)."""
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="load-test-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("No se pudo levantar el servidor local")
+        time.sleep(0.05)
+    host, port = sock.getsockname()
+    return server, thread, f"http://{host}:{port}"
+
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+
+    questions = load_questions(args.questions, args.seed)
+    server = thread = None
+    if args.url:
+        base_url, target = args.url.rstrip("/"), args.url
+    else:
+        server, thread, base_url = _serve_local(_local_app(args.token_delay, args.verbose))
+        target = "local (proveedores falsos)"
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                     timeout=httpx.Timeout(args.timeout)) as client:
+            for _ in range(args.warmup):
+                await one_request(client, questions[0], "load-warmup")
+            start = time.perf_counter()
+            if args.rate:
+                results = await open_loop(client, questions, args)
+            else:
+                results = await closed_loop(client, questions, args)
+            wall = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await asyncio.to_thread(thread.join, 10)
+
+    config = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+              if k not in ("output", "compare", "verbose")}
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "label": args.label,
+            "target": target,
+            "config": config,
+        },
+        "summary": summarize(results, wall),
+        "requests": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Servidor a medir (p. ej. http://localhost:8001); sin él, app local con proveedores falsos")
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS, help="Corpus: una pregunta por línea")
+    parser.add_argument("--seed", type=int, default=None, help="Baraja el corpus con esta semilla")
+    parser.add_argument("--requests", type=int, default=100, help="Total de requests (si no se usa --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="Segundos de carga (en lugar de --requests)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Usuarios virtuales / streams abiertos máximos")
+    parser.add_argument("--rate", type=float, default=None, help="Requests/s en lazo abierto")
+    parser.add_argument("--warmup", type=int, default=1, help="Requests previos que no se miden")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Latencia por token del modelo falso (local)")
+    parser.add_argument("--label", default="", help="Etiqueta libre guardada en el resultado")
+    parser.add_argument("--output", type=Path, default=None, help="JSON de salida (por defecto benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON de una corrida anterior")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="Falla (exit 1) si se supera")
+    parser.add_argument("--verbose", action="store_true", help="Mantiene los logs INFO de la app local")
+    args = parser.parse_args()
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate debe ser mayor que 0")
+
+    report = asyncio.run(run(args))
+    summary = report["summary"]
+    print(f"\nObjetivo: {report['meta']['target']}  commit: {report['meta']['git_commit']}")
+    print(format_summary(summary))
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))
+        label = f"{args.compare.name} ({previous.get('meta', {}).get('git_commit')})"
+        print("\n" + format_comparison(summary, previous["summary"], label))
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"load_{stamp}_{report['meta']['git_commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nResultado guardado en {output}")
+
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        print(f"FALLO: tasa de error {summary['error_rate']:.2%} > {args.max_error_rate:.2%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/query_embedding_bench.py
+"""
+Benchmark de embeddings de consulta bajo concurrencia.
+
+Simula --streams streams de /ask que piden embed_query a la vez (como
+hotel_context_search y account_search) contra el proveedor falso con
+latencia inyectada, y compara:
+    - direct : una llamada al proveedor por consulta (cliente sin servicio)
+    - lru    : EmbeddingService con caché LRU, sin ventana de micro-batching
+    - batch  : EmbeddingService con caché LRU + micro-batching (configuración por defecto)
+
+Las consultas salen de un conjunto de --distinct preguntas con variantes de
+mayúsculas y espacios (las repeticiones entre huéspedes son habituales).
+Reporta llamadas al proveedor (total y por segundo), consultas por llamada y
+latencia p50/p95 de embed_query.
+
+Uso:
+    uv run python -m benchmarks.query_embedding_bench --streams 32 --latency-ms 80
+"""
+
+import argparse
+import math
+import random
+import threading
+import time
+
+from app.core.embedding_service import QUERY_EMBEDDING_BATCH_WAIT_MS, EmbeddingService
+from app.core.fake_providers import FakeEmbeddings
+
+TOPICS = ["horario del spa", "check-in", "política de mascotas", "desayuno incluido", "piscina",
+          "traslado al aeropuerto", "restaurante", "wifi", "late checkout", "tours de buceo"]
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    """Proveedor falso que cuenta las llamadas (round-trips)."""
+
+    def __init__(self, latency_ms: float):
+        super().__init__(latency_ms=latency_ms)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+        return super().embed_documents(texts)
+
+
+def make_queries(streams: int, per_stream: int, distinct: int, seed: int):
+    rnd = random.Random(seed)
+    pool = [f"¿{TOPICS[i % len(TOPICS)]} {i // len(TOPICS) or ''}?".replace(" ?", "?") for i in range(distinct)]
+    variants = [str.lower, str.upper, str.title, lambda q: f"  {q} "]
+    return [[rnd.choice(variants)(rnd.choice(pool)) for _ in range(per_stream)] for _ in range(streams)]
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def run(embeddings, provider: CountingEmbeddings, queries) -> dict:
+    latencies = []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(len(queries))
+
+    def stream(items):
+        start_gate.wait()
+        for query in items:
+            started = time.perf_counter()
+            embeddings.embed_query(query)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=stream, args=(items,)) for items in queries]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    total = sum(len(items) for items in queries)
+    return {
+        "queries": total,
+        "calls": provider.calls,
+        "calls_per_s": provider.calls / elapsed,
+        "queries_per_call": total / provider.calls if provider.calls else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=32, help="streams de /ask concurrentes")
+    parser.add_argument("--queries", type=int, default=20, help="consultas por stream")
+    parser.add_argument("--distinct", type=int, default=200, help="preguntas distintas")
+    parser.add_argument("--latency-ms", type=float, default=80, help="latencia del proveedor por llamada")
+    parser.add_argument("--wait-ms", type=float, default=QUERY_EMBEDDING_BATCH_WAIT_MS,
+                        help="ventana de micro-batching del modo batch")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queries = make_queries(args.streams, args.queries, args.distinct, args.seed)
+    print(f"{args.streams} streams × {args.queries} consultas ({args.distinct} distintas), "
+          f"proveedor con {args.latency_ms:g} ms por llamada\n")
+    header = f"{'modo':<7} {'llamadas':>9} {'llamadas/s':>11} {'consultas/llamada':>17} {'p50 ms':>8} {'p95 ms':>8} {'total s':>8}"
+    print(header)
+    print("-" * len(header))
+
+    modes = {
+        "direct": lambda p: p,
+        "lru": lambda p: EmbeddingService(p, "bench", wait_ms=0, max_batch=1, max_inflight=args.streams),
+        "batch": lambda p: EmbeddingService(p, "bench", wait_ms=args.wait_ms),
+    }
+    for mode, build in modes.items():
+        provider = CountingEmbeddings(args.latency_ms)
+        row = run(build(provider), provider, queries)
+        print(f"{mode:<7} {row['calls']:>9,} {row['calls_per_s']:>11,.1f} {row['queries_per_call']:>17.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
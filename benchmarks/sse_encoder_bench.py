@@ -0,0 +1,88 @@
+# benchmarks/sse_encoder_bench.py
+"""
+Micro-benchmark del codificador SSE.
+
+Compara, para el mismo flujo de tokens `answer`:
+    - legacy     : send_event() (async generator, dos strings por evento)
+    - frame      : format_answer() (un frame de bytes por token)
+    - coalesced  : AnswerCoalescer (frames agrupados por tiempo/tamaño)
+
+Reporta tokens procesados por segundo, frames emitidos y bytes enviados.
+
+Uso:
+    uv run python -m benchmarks.sse_encoder_bench --tokens 50000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from app.streaming.event_handler import AnswerCoalescer, format_answer, send_event
+
+WORDS = ["el", "hotel", "ofrece", "piscina", "spa", "restaurante", "vista", "al", "mar", "habitación",
+         "check-in", "15:00", "mascotas", "política", "desayuno", "incluido", "¿", "?", "á", "ñ"]
+
+
+def make_tokens(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [rnd.choice(WORDS) + " " for _ in range(n)]
+
+
+async def bench_legacy(tokens):
+    out = []
+    for tok in tokens:
+        async for c in send_event("answer", {"content": tok}):
+            out.append(c.encode("utf-8"))
+    # send_event produce dos strings por evento
+    return len(out) // 2, sum(len(b) for b in out)
+
+
+async def bench_frame(tokens):
+    out = [format_answer(tok) for tok in tokens]
+    return len(out), sum(len(b) for b in out)
+
+
+async def bench_coalesced(tokens, window_ms, max_bytes):
+    coalescer = AnswerCoalescer(window_ms=window_ms, max_bytes=max_bytes)
+    out = []
+    for tok in tokens:
+        frame = coalescer.push(tok)
+        if frame:
+            out.append(frame)
+    frame = coalescer.flush()
+    if frame:
+        out.append(frame)
+    return len(out), sum(len(b) for b in out)
+
+
+def _run(name, coro_factory, tokens, repeat):
+    best = float("inf")
+    frames = size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames, size = asyncio.run(coro_factory())
+        best = min(best, time.perf_counter() - start)
+    rate = len(tokens) / best
+    print(f"{name:<10} {rate:>14,.0f} tokens/s {frames:>10,} frames {size:>12,} bytes")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--window-ms", type=float, default=20)
+    parser.add_argument("--max-bytes", type=int, default=64)
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    print(f"{args.tokens:,} tokens, mejor de {args.repeat} corridas\n")
+    legacy = _run("legacy", lambda: bench_legacy(tokens), tokens, args.repeat)
+    frame = _run("frame", lambda: bench_frame(tokens), tokens, args.repeat)
+    coalesced = _run("coalesced", lambda: bench_coalesced(tokens, args.window_ms, args.max_bytes), tokens, args.repeat)
+    print(f"\nframe vs legacy: x{frame / legacy:.1f} | coalesced vs legacy: x{coalesced / legacy:.1f}")
+
+
+if __name__ == "__main__":
+    main()
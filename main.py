@@ -1,21 +1,37 @@
 # main.py
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Query, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 import uvicorn
 import json  # Para encoding JSON de tokens
 import logging
+import asyncio
+import os
 from app.streaming.streaming import ask_streaming
+from app.streaming.disconnect import stream_until_disconnect
+from app.streaming.answer_cache import with_answer_cache
+from app.streaming.single_flight import with_single_flight
+from app.streaming.request_metrics import SSE_METRICS_EVENT, with_request_metrics
+from app.streaming.admission import ADMISSION, AdmissionRejected, AdmittedStreamingResponse, client_key
+from app.core.metrics import REGISTRY
+from app.core.request_context import RequestContext
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Construir los backends de las herramientas al arrancar (0 → al primer uso)
+TOOL_WARMUP = os.getenv("TOOL_WARMUP", "1") == "1"
+
 def lifespan(app: FastAPI):
     @asynccontextmanager
     async def lifespan_context(app: FastAPI):
+        # los jobs de /contextrebuild y el rollback cambian el retriever
+        from app.rag.rebuild_jobs import REBUILD_JOBS
+        REBUILD_JOBS.on_swap = lambda r: setattr(app.state, "hotel_retriever", r)
+
         try: # rag retriever setup
             from app.rag.rag_store import get_retriever, set_global_retriever
             retriever = get_retriever(k=5)
@@ -25,7 +41,18 @@ def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"ERROR al configurar el retriever en lifespan: {e}")
 
+        if TOOL_WARMUP: # warm-up de herramientas perezosas
+            from app.streaming.streaming import tools
+            from app.agent_tools.tool_registry import warm_up_tools
+            await asyncio.to_thread(warm_up_tools, tools)
+            from app.streaming.history_manager import get_encoder
+            await asyncio.to_thread(get_encoder)  # codificación tiktoken del historial
+            logger.info("SUCCESS: Herramientas inicializadas en lifespan.")
+
         yield
+
+        from app.streaming.tool_executors import shutdown_executors
+        shutdown_executors()
     return lifespan_context(app)
 
 app = FastAPI(
@@ -35,48 +62,143 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+async def _job_response(job, wait: bool):
+    """202 con el id del job; con ?wait=true espera a que termine (scripts, CI)."""
+    if wait:
+        await asyncio.shield(job.task)  # si el cliente corta, el job sigue
+        return job.to_dict()
+    return JSONResponse(
+        {"job_id": job.job_id, "status": job.status, "status_url": f"/contextrebuild/jobs/{job.job_id}"},
+        status_code=202
+    )
+
+
 @app.put("/contextrebuild")
-async def update_vector_index(files: List[UploadFile] = File(...)):
+async def update_vector_index(
+    files: List[UploadFile] = File(...),
+    full: bool = True,  # los archivos subidos son todo el corpus: se borran los que falten
+    rebuild: bool = False,  # re-embeber todo desde cero
+    wait: bool = False  # esperar al job en lugar de responder 202
+):
+    try:
+        from app.rag.rebuild_jobs import REBUILD_JOBS
+
+        # Build en segundo plano sobre una versión nueva del índice; /ask sigue con la activa
+        job = await REBUILD_JOBS.submit_upload(files, rebuild=rebuild, full=full)
+        return await _job_response(job, wait)
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.delete("/contextrebuild")
+async def delete_from_vector_index(filenames: List[str] = Query(...), wait: bool = False):
     try:
-        from app.rag.rag_indexer import index_markdown_contents
-        from app.rag.rag_store import get_retriever, set_global_retriever
+        from app.rag.rebuild_jobs import REBUILD_JOBS
+
+        job = REBUILD_JOBS.submit_delete(filenames)
+        return await _job_response(job, wait)
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.get("/contextrebuild/jobs")
+async def list_rebuild_jobs():
+    from app.rag.rebuild_jobs import REBUILD_JOBS
+    return {"jobs": REBUILD_JOBS.list()}
 
-        file_contents = [await f.read() for f in files]
-        filenames = [f.filename for f in files]
 
-        result = index_markdown_contents(file_contents, filenames, rebuild=True)
-        logging.info("SUCCESS: Reindexación completada.")
+@app.get("/contextrebuild/jobs/{job_id}")
+async def get_rebuild_job(job_id: str):
+    """Estado y progreso (fase, hechos/total) de un job de reindexación."""
+    from app.rag.rebuild_jobs import REBUILD_JOBS
+    job = REBUILD_JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Job {job_id} no encontrado"}, status_code=404)
+    return job.to_dict()
 
-        retriever = get_retriever(k=3)
-        app.state.hotel_retriever = retriever
-        set_global_retriever(retriever)
-        logging.info("SUCCESS: Retriever global actualizado tras reindexar.")
 
-        return {"message": "Índice reconstruido y retriever actualizado.", "details": result}
+@app.get("/contextrebuild/versions")
+async def list_index_versions():
+    from app.rag import index_versions
+    return {"active": index_versions.current_version(), "versions": index_versions.list_versions()}
 
+
+@app.post("/contextrebuild/rollback")
+async def rollback_index(version: Optional[str] = None):
+    """Vuelve a `version` (por defecto, la anterior a la activa) sin re-embeber nada."""
+    from app.rag.index_versions import InvalidVersionId, UnknownVersion
+    try:
+        from app.rag.rebuild_jobs import REBUILD_JOBS
+        return await REBUILD_JOBS.rollback(version)
+    except InvalidVersionId as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except UnknownVersion as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
     except Exception as e:
         return {"error": str(e)}
 
 class AskRequest(BaseModel):
     question: str
     message_history: List[Dict] = []
+    include_metrics: bool = SSE_METRICS_EVENT  # evento SSE `metrics` antes de `done`
 
 @app.post("/ask")
-async def ask_endpoint(request: AskRequest):
-    generator = ask_streaming(request.question, request.message_history)
+async def ask_endpoint(request: AskRequest, http_request: Request):
+    # Control de admisión: espera en cola justa o rechazo rápido con Retry-After
+    try:
+        ticket = await ADMISSION.acquire(*client_key(http_request))
+    except AdmissionRejected as rejected:
+        return JSONResponse(
+            {"error": rejected.reason, "code": rejected.status_code},
+            status_code=rejected.status_code,
+            headers={"Retry-After": str(rejected.retry_after)}
+        )
+
+    ctx = RequestContext(question=request.question)
+    generator = stream_until_disconnect(
+        http_request,
+        with_request_metrics(
+            ctx,
+            with_single_flight(
+                request.question,
+                request.message_history,
+                ctx,
+                lambda run_ctx: with_answer_cache(
+                    request.question,
+                    request.message_history,
+                    run_ctx,
+                    lambda: ask_streaming(request.question, request.message_history, ctx=run_ctx)
+                )
+            ),
+            emit_event=request.include_metrics
+        ),
+        ctx
+    )
 
-    return StreamingResponse(
+    return AdmittedStreamingResponse(
         generator,
+        ticket=ticket,
         status_code=200,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache, no-transform",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
-            "Transfer-Encoding": "chunked"
+            "Transfer-Encoding": "chunked",
+            "X-Request-Id": ctx.request_id
         }
     )
 
 
+@app.get("/metrics")
+async def metrics_endpoint(format: str = "prometheus"):
+    """Métricas del proceso: texto Prometheus o JSON (?format=json) con p50/p95/p99 aproximados."""
+    if format == "json":
+        return REGISTRY.snapshot()
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)